@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, PrivateAttr
+from typing import Optional, Callable
 
 class AdminUser(BaseModel):
     username: str
@@ -7,6 +7,12 @@ class AdminUser(BaseModel):
     password_2fa: Optional[str] = None 
 
     fernet_key_salt: str
+    # Algoritmo y parámetros de derivación de la clave Fernet
+    # (core.seguridad.calibrate_kdf); None en usuarios anteriores: PBKDF2 480000
+    kdf_params: Optional[dict] = None
+    # Clave de datos de la bóveda cifrada con la clave derivada; None en
+    # usuarios anteriores (la bóveda está cifrada con la clave derivada)
+    wrapped_data_key: Optional[str] = None
 
 class Login(BaseModel):
     Nombre_user: str
@@ -23,6 +29,52 @@ class Account(BaseModel):  # Mejor nombre en inglés
     created_at: Optional[str] = None
     updated_at: Optional[str] = None
 
+    # Descifrado perezoso: la contraseña cifrada se guarda tal cual y solo se
+    # descifra (una vez) cuando se accede a `password`
+    _encrypted_password: Optional[str] = PrivateAttr(default=None)
+    _decryptor: Optional[Callable[[str], str]] = PrivateAttr(default=None)
+
+    @classmethod
+    def from_encrypted(cls, data: dict, decryptor: Callable[[str], str]) -> "Account":
+        """
+        Crea la cuenta sin descifrar la contraseña. `data` es el diccionario
+        guardado en disco (con la contraseña cifrada).
+        """
+        fields = {name: value for name, value in data.items()
+                  if name != 'password' and name in cls.model_fields}
+        account = cls.model_construct(**fields)
+        account._encrypted_password = data['password']
+        account._decryptor = decryptor
+        return account
+
+    def __getattr__(self, name):
+        if name == 'password' and self._decryptor is not None:
+            password = self._decryptor(self._encrypted_password)
+            self.cache_decrypted_password(password)
+            return password
+        return super().__getattr__(name)
+
+    def __setattr__(self, name, value):
+        if name == 'password':
+            # El texto cifrado guardado ya no corresponde a la contraseña
+            self._encrypted_password = None
+            self._decryptor = None
+        super().__setattr__(name, value)
+
+    def cache_decrypted_password(self, password: str):
+        """Guarda la contraseña ya descifrada sin invalidar el texto cifrado."""
+        self.__dict__['password'] = password
+
+    @property
+    def is_decrypted(self) -> bool:
+        """Indica si la contraseña en texto plano está en memoria."""
+        return 'password' in self.__dict__
+
+    @property
+    def encrypted_password(self) -> Optional[str]:
+        """Contraseña cifrada vigente, o None si hay que volver a cifrarla."""
+        return self._encrypted_password
+
 class TwoFactorCode(BaseModel):
     code: str
     created_at: float  # timestamp
@@ -1,18 +1,31 @@
 # Vista/home.py
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
+from tkinter import ttk, messagebox, scrolledtext, simpledialog
 import sys
 import os
 from datetime import datetime
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from core.account_manager import AccountManager
+from core.account_manager import AccountManager, DuplicatePlatformError
+from core.almacenamiento import has_pending_writes, last_write_error
+from core.consultas import AccountQuery
+from core.persistencia import PersistenceWorker
 from core.session import SessionManager
 from Modelo.models import AdminUser
 
+# Cuentas que se agregan a la lista cada vez que se llega al final
+ACCOUNTS_PAGE_SIZE = 200
+
+def create_account_manager(fernet_key: bytes, persistence_worker: PersistenceWorker = None) -> AccountManager:
+    """Gestor de cuentas con la configuración de almacenamiento de la aplicación"""
+    # Cifrado en serie: con bóvedas de uso normal un pool de procesos cuesta más de lo que ahorra
+    return AccountManager(fernet_key, journaled=True,
+                          persistence_worker=persistence_worker)
+
 class HomeWindow:
-    def __init__(self, admin_user: AdminUser, fernet_key: bytes):
+    def __init__(self, admin_user: AdminUser, fernet_key: bytes,
+                 session_manager: SessionManager = None):
         self.root = tk.Tk()
         self.root.title("Gestor de Contraseñas - Panel Principal")
         self.root.geometry("1000x700")
@@ -21,16 +34,32 @@ class HomeWindow:
         # Datos de sesión
         self.admin_user = admin_user
         self.fernet_key = fernet_key
-        self.session_manager = SessionManager()
-        self.session_manager.start_session(admin_user, fernet_key)
-        
-        # Gestor de cuentas
-        self.account_manager = AccountManager(fernet_key)
+        # La sesión la inicia el login (con el desbloqueo rápido preparado)
+        if session_manager is None:
+            session_manager = SessionManager()
+            session_manager.start_session(admin_user, fernet_key)
+        self.session_manager = session_manager
+        
+        # Gestor de cuentas (los guardados se hacen en un hilo aparte)
+        self.persistence_worker = PersistenceWorker()
+        self.failed_saves = []
+        # Se pone a True al bloquear la sesión (logout)
+        self.locked = False
+        self.account_manager = create_account_manager(fernet_key, self.persistence_worker)
         
         # Variables de control
         self.selected_account = None
         self.show_passwords = tk.BooleanVar(value=False)
         
+        # Paginación de la lista: orden elegido, consulta mostrada y cursor
+        # de la siguiente página
+        self.sort_key = "platform"
+        self.sort_descending = False
+        self.current_query = None
+        self.page_cursor = None
+        self.has_more_accounts = False
+        self.page_load_scheduled = False
+        
         # Configurar estilo
         self.setup_styles()
         
@@ -39,9 +68,16 @@ class HomeWindow:
         
         # Cargar cuentas
         self.refresh_accounts_list()
+        self.report_storage_errors()
         
         # Verificar sesión periódicamente
         self.check_session()
+        
+        # Recoger resultados de los guardados en segundo plano
+        self.check_persistence()
+        
+        # Escribir cambios pendientes al cerrar la ventana
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
     
     def setup_styles(self):
         """Configura los estilos de la aplicación"""
@@ -198,21 +234,23 @@ class HomeWindow:
         tree_frame.pack(fill='both', expand=True, padx=10, pady=(0, 10))
         
         # Scrollbar
-        scrollbar = ttk.Scrollbar(tree_frame)
-        scrollbar.pack(side='right', fill='y')
+        self.accounts_scrollbar = ttk.Scrollbar(tree_frame)
+        self.accounts_scrollbar.pack(side='right', fill='y')
         
-        # Treeview
+        # Treeview (las cuentas se agregan por páginas al desplazarse)
         self.accounts_tree = ttk.Treeview(tree_frame,
                                 columns=('Usuario', 'Categoría'),
                                 show='tree headings',
-                                yscrollcommand=scrollbar.set)
+                                yscrollcommand=self.on_tree_scroll)
         self.accounts_tree.pack(side='left', fill='both', expand=True)
-        scrollbar.config(command=self.accounts_tree.yview)
+        self.accounts_scrollbar.config(command=self.accounts_tree.yview)
         
-        # Configurar columnas
-        self.accounts_tree.heading('#0', text='Plataforma')
+        # Configurar columnas (clic en el encabezado para ordenar)
+        self.accounts_tree.heading('#0', text='Plataforma',
+                                   command=lambda: self.sort_accounts("platform"))
         self.accounts_tree.heading('Usuario', text='Usuario/Email')
-        self.accounts_tree.heading('Categoría', text='Categoría')
+        self.accounts_tree.heading('Categoría', text='Categoría',
+                                   command=lambda: self.sort_accounts("category"))
         
         self.accounts_tree.column('#0', width=150)
         self.accounts_tree.column('Usuario', width=150)
@@ -305,6 +343,14 @@ class HomeWindow:
                                     font=('Arial', 9))
         self.status_label.pack(side='left', padx=10, pady=5)
         
+        # Estado de los guardados
+        self.save_status_label = tk.Label(status_frame,
+                                         text="",
+                                         bg='#1a1a1a',
+                                         fg='#888',
+                                         font=('Arial', 9))
+        self.save_status_label.pack(side='left', padx=10, pady=5)
+        
         # Hora
         self.time_label = tk.Label(status_frame,
                                   text="",
@@ -340,26 +386,50 @@ class HomeWindow:
         for item in self.accounts_tree.get_children():
             self.accounts_tree.delete(item)
         
-        search_term = self.search_var.get().lower()
+        search_term = self.search_var.get()
         category_filter = self.category_var.get()
         
-        # Obtener cuentas filtradas
-        accounts = self.account_manager.accounts
-        
+        # Una consulta para búsqueda, categoría y orden (solo carga las categorías necesarias)
+        query = AccountQuery().matching(search_term).sorted_by(self.sort_key, self.sort_descending)
         if category_filter != "Todas":
-            accounts = [acc for acc in accounts if acc.category == category_filter]
+            query = query.in_categories(category_filter)
+        self.current_query = query
+        self.page_cursor = None
+        self.has_more_accounts = True
+        self.load_more_accounts()
+    
+    def load_more_accounts(self):
+        """Agrega a la lista la siguiente página de cuentas"""
+        self.page_load_scheduled = False
+        if not self.has_more_accounts:
+            return
         
-        if search_term:
-            accounts = [acc for acc in accounts 
-                       if search_term in acc.platform.lower() or 
-                          search_term in acc.email_or_username.lower()]
+        page = self.account_manager.query(self.current_query, ACCOUNTS_PAGE_SIZE, self.page_cursor)
+        self.page_cursor = page.next_cursor
+        self.has_more_accounts = page.next_cursor is not None
         
         # Agregar al árbol
-        for account in accounts:
+        for account in page.accounts:
             self.accounts_tree.insert('', 'end',
                                      text=account.platform,
                                      values=(account.email_or_username, account.category))
     
+    def on_tree_scroll(self, first, last):
+        """Mueve la barra y pide otra página al llegar al final de la lista"""
+        self.accounts_scrollbar.set(first, last)
+        if self.has_more_accounts and not self.page_load_scheduled and float(last) >= 1.0:
+            self.page_load_scheduled = True
+            self.root.after_idle(self.load_more_accounts)
+    
+    def sort_accounts(self, sort_key: str):
+        """Ordena la lista por la columna pulsada; otra pulsación invierte el orden"""
+        if self.sort_key == sort_key:
+            self.sort_descending = not self.sort_descending
+        else:
+            self.sort_key = sort_key
+            self.sort_descending = False
+        self.filter_accounts()
+    
     def on_account_select(self, event):
         """Maneja la selección de una cuenta"""
         selection = self.accounts_tree.selection()
@@ -370,13 +440,61 @@ class HomeWindow:
         item = self.accounts_tree.item(selection[0])
         platform = item['text']
         
-        self.selected_account = self.account_manager.get_account_by_platform(platform)
+        try:
+            self.selected_account = self.account_manager.get_account_by_platform(platform)
+        except DuplicatePlatformError as e:
+            # Elegir la fila seleccionada entre las cuentas repetidas
+            email, category = item['values'][:2]
+            position = next(
+                (i for i, acc in enumerate(e.accounts)
+                 if acc.email_or_username == str(email) and acc.category == str(category)),
+                0)
+            self.resolve_duplicate(platform, position, e)
+            return
         
         if self.selected_account:
             self.show_account_details()
             self.edit_btn.config(state='normal')
             self.delete_btn.config(state='normal')
     
+    def resolve_duplicate(self, platform: str, position: int, error: DuplicatePlatformError):
+        """Ofrece renombrar o eliminar una de las cuentas repetidas de una plataforma"""
+        account = error.accounts[position]
+        answer = messagebox.askyesnocancel(
+            "Plataforma duplicada",
+            f"{error}. Para editarlas cada cuenta necesita un nombre distinto.\n\n"
+            f"Cuenta seleccionada: {account.platform} ({account.email_or_username})\n\n"
+            "Sí: renombrarla · No: eliminarla · Cancelar: dejarla como está")
+        if answer is None:
+            return
+        
+        try:
+            if answer:
+                new_platform = simpledialog.askstring(
+                    "Renombrar cuenta", "Nuevo nombre de la plataforma:",
+                    initialvalue=f"{account.platform} ({account.email_or_username})",
+                    parent=self.root)
+                if not new_platform:
+                    return
+                self.account_manager.rename_duplicate(platform, position, new_platform)
+            else:
+                if not messagebox.askyesno(
+                        "Confirmar eliminación",
+                        f"¿Está seguro de eliminar la cuenta '{account.platform}' "
+                        f"de {account.email_or_username}?\n\nEsta acción no se puede deshacer."):
+                    return
+                self.account_manager.delete_duplicate(platform, position)
+        except ValueError as e:
+            messagebox.showerror("Error", f"No se pudo resolver la cuenta repetida: {str(e)}")
+            return
+        
+        self.selected_account = None
+        self.refresh_accounts_list()
+        self.account_details_frame.pack_forget()
+        self.no_selection_label.pack(expand=True)
+        self.edit_btn.config(state='disabled')
+        self.delete_btn.config(state='disabled')
+    
     def show_account_details(self):
         """Muestra los detalles de la cuenta seleccionada"""
         # Ocultar mensaje de no selección
@@ -432,6 +550,23 @@ class HomeWindow:
                         fg='white',
                         font=('Arial', 10, 'bold')).pack(side='left')
         
+        # Contraseña compartida con otras cuentas (por huella, sin descifrarlas)
+        try:
+            reused_in = self.account_manager.get_password_reuse(self.selected_account.platform)
+        except DuplicatePlatformError:
+            reused_in = []
+        if reused_in:
+            names = ", ".join(account.platform for account in reused_in[:5])
+            if len(reused_in) > 5:
+                names += f" y {len(reused_in) - 5} más"
+            tk.Label(self.account_details_frame,
+                    text=f"⚠️ Contraseña reutilizada en: {names}",
+                    bg='#252525',
+                    fg='#f0a500',
+                    font=('Arial', 9),
+                    wraplength=300,
+                    justify='left').pack(anchor='w', pady=(5, 0))
+        
         # Notas
         if self.selected_account.notes:
             notes_frame = tk.Frame(self.account_details_frame, bg='#252525')
@@ -473,10 +608,20 @@ class HomeWindow:
                         fg='#666',
                         font=('Arial', 8)).pack(anchor='w')
     
+    def get_selected_password(self):
+        """Obtiene la contraseña de la cuenta seleccionada (se descifra en el primer acceso)"""
+        try:
+            return self.selected_account.password
+        except Exception as e:
+            messagebox.showerror("Error", f"No se pudo descifrar la contraseña: {str(e)}")
+            return None
+    
     def toggle_password(self):
         """Alterna la visibilidad de la contraseña"""
         if self.password_label.cget('text').startswith('*'):
-            self.password_label.config(text=self.selected_account.password)
+            password = self.get_selected_password()
+            if password is not None:
+                self.password_label.config(text=password)
         else:
             self.password_label.config(text='*' * 12)
     
@@ -485,6 +630,10 @@ class HomeWindow:
         if not self.selected_account:
             return
         
+        password = self.get_selected_password()
+        if password is None:
+            return
+        
         # Crear ventana de diálogo
         dialog = tk.Toplevel(self.root)
         dialog.title("Contraseña")
@@ -518,13 +667,13 @@ class HomeWindow:
                                width=30,
                                relief='flat')
         password_text.pack(padx=10, pady=10)
-        password_text.insert('1.0', self.selected_account.password)
+        password_text.insert('1.0', password)
         password_text.config(state='disabled')
         
         # Botón copiar
         def copy_password():
             self.root.clipboard_clear()
-            self.root.clipboard_append(self.selected_account.password)
+            self.root.clipboard_append(password)
             messagebox.showinfo("Copiado", "Contraseña copiada al portapapeles", parent=dialog)
             dialog.destroy()
         
@@ -697,6 +846,10 @@ class HomeWindow:
         if not self.selected_account:
             return
         
+        current_password = self.get_selected_password()
+        if current_password is None:
+            return
+        
         dialog = tk.Toplevel(self.root)
         dialog.title("Editar Cuenta")
         dialog.geometry("500x550")
@@ -737,7 +890,7 @@ class HomeWindow:
         
         password_entry = ttk.Entry(pass_frame, font=('Arial', 11), width=30)
         password_entry.pack(side='left', fill='x', expand=True)
-        password_entry.insert(0, self.selected_account.password)
+        password_entry.insert(0, current_password)
         
         # Botón generar
         def generate_for_field():
@@ -806,6 +959,9 @@ class HomeWindow:
                     notes=notes
                 )
                 messagebox.showinfo("Éxito", "Cuenta actualizada correctamente", parent=dialog)
+                # El gestor entrega copias: volver a pedir la cuenta actualizada
+                self.selected_account = self.account_manager.get_account_by_platform(
+                    self.selected_account.platform)
                 self.refresh_accounts_list()
                 self.show_account_details()
                 dialog.destroy()
@@ -969,8 +1125,55 @@ class HomeWindow:
                                         for cat, count in summary['by_category'].items()])
             status_text += f" | {categories_text}"
         
+        reused = self.account_manager.reused_password_count
+        if reused:
+            status_text += f" | ⚠️ Contraseñas reutilizadas: {reused}"
+        
         self.status_label.config(text=status_text)
     
+    def check_persistence(self):
+        """Recoge los resultados del hilo de guardado y actualiza la barra de estado"""
+        # Huellas de contraseñas que faltaban, calculadas en ese hilo tras la carga
+        if self.account_manager.collect_fingerprints():
+            self.update_status_bar()
+        
+        failures = [r for r in self.persistence_worker.poll_results() if not r.ok]
+        if failures:
+            self.failed_saves.extend(failures)
+            details = "\n".join(f"• {r.description}: {r.error}" for r in failures[:10])
+            messagebox.showerror("Error al guardar",
+                                 f"No se pudieron guardar algunos cambios:\n\n{details}")
+        
+        pending = self.persistence_worker.pending_count
+        write_error = last_write_error()
+        if pending:
+            self.save_status_label.config(text=f"💾 Guardando ({pending})...", fg='#888')
+        elif self.failed_saves:
+            self.save_status_label.config(text=f"⚠️ {len(self.failed_saves)} guardado(s) fallido(s)",
+                                          fg='#d32f2f')
+        elif write_error is not None:
+            # Los cambios siguen en memoria y se reintentan en el siguiente guardado
+            self.save_status_label.config(text=f"⚠️ Error al escribir en disco: {write_error}",
+                                          fg='#d32f2f')
+        elif has_pending_writes():
+            self.save_status_label.config(text="💾 Guardando...", fg='#888')
+        else:
+            self.save_status_label.config(text="✓ Cambios guardados", fg='#888')
+        
+        self.root.after(200, self.check_persistence)
+    
+    def report_storage_errors(self):
+        """Avisa de las cuentas que no se pudieron cargar o guardar"""
+        errors = self.account_manager.last_errors
+        if not errors:
+            return
+        
+        details = "\n".join(f"• {error.platform}: {error.message}" for error in errors[:10])
+        if len(errors) > 10:
+            details += f"\n... y {len(errors) - 10} más"
+        messagebox.showwarning("Cuentas con errores",
+                               f"No se pudieron procesar {len(errors)} cuenta(s):\n\n{details}")
+    
     def update_time(self):
         """Actualiza la hora en la barra de estado"""
         current_time = datetime.now().strftime("%H:%M:%S")
@@ -987,22 +1190,62 @@ class HomeWindow:
             # Verificar cada minuto
             self.root.after(60000, self.check_session)
     
-    def logout(self):
-        """Cierra la sesión y vuelve al login"""
+    def flush_changes(self) -> bool:
+        """
+        Escribe los cambios pendientes. Si falla, pregunta si salir igualmente
+        (los cambios no escritos se perderían). Retorna True si se puede salir.
+        """
+        try:
+            self.account_manager.flush()
+            return True
+        except OSError as e:
+            return messagebox.askyesno(
+                "Error al guardar",
+                f"No se pudieron escribir los cambios en disco:\n\n{e}\n\n"
+                "Si sale ahora se perderán. ¿Salir igualmente?",
+                icon="warning")
+    
+    def release_session(self):
+        """
+        Suelta lo que la ventana guarda de la sesión: el gestor de cuentas
+        (con las contraseñas ya descifradas), su contexto de cifrado y la clave
+        """
+        self.persistence_worker.stop()
+        try:
+            self.account_manager.close()
+        except OSError:
+            # flush_changes ya avisó y el usuario eligió salir igualmente
+            pass
+        self.account_manager = None
+        self.selected_account = None
+        self.fernet_key = None
+    
+    def on_close(self):
+        """Guarda los cambios pendientes y cierra la aplicación"""
+        if not self.flush_changes():
+            return
+        self.release_session()
         self.session_manager.end_session()
         self.root.destroy()
-        
-        # Volver a mostrar login
-        from Vista.login import start_login
-        start_login(lambda u, k: HomeWindow(u, k).run())
     
-    def run(self):
-        """Ejecuta la ventana principal"""
+    def logout(self):
+        """Bloquea la sesión y vuelve al login (con desbloqueo rápido)"""
+        if not self.flush_changes():
+            return
+        self.release_session()
+        self.session_manager.lock()
+        self.locked = True
+        # run() retorna y main.py vuelve a mostrar el login
+        self.root.destroy()
+    
+    def run(self) -> bool:
+        """Ejecuta la ventana principal; retorna True si se bloqueó la sesión"""
         self.root.mainloop()
+        return self.locked
 
 
 # Función helper para iniciar la aplicación principal
-def start_home(admin_user: AdminUser, fernet_key: bytes):
-    """Inicia la ventana principal"""
-    home = HomeWindow(admin_user, fernet_key)
-    home.run()
\ No newline at end of file
+def start_home(admin_user: AdminUser, fernet_key: bytes, session_manager: SessionManager = None):
+    """Inicia la ventana principal; retorna True si se bloqueó la sesión (volver al login)"""
+    home = HomeWindow(admin_user, fernet_key, session_manager)
+    return home.run()
\ No newline at end of file
@@ -3,22 +3,42 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 import sys
 import os
+import queue
+import threading
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from core.autenticacion import autenticar_admin, verificar_2fa, obtener_codigo_2fa, generar_Admin
+from core.autenticacion import autenticar_credenciales, comprobar_password_2fa, obtener_codigo_2fa, generar_Admin
 from core.almacenamiento import load_json_data
+from core.session import SessionManager
+
+# Cada cuánto (ms) se comprueba si terminó la autenticación en segundo plano
+AUTH_POLL_MS = 50
 
 class LoginWindow:
-    def __init__(self, on_success_callback):
+    def __init__(self, session_manager: SessionManager = None):
         self.root = tk.Tk()
         self.root.title("Gestor de Contraseñas - Login")
         self.root.geometry("400x500")
         self.root.resizable(False, False)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
-        # Callback cuando el login es exitoso
-        self.on_success = on_success_callback
+        # (usuario, clave Fernet) cuando el login es exitoso; run() lo retorna
+        self.result = None
         self.current_user = None
         self.fernet_key = None
+        # Sesión (puede venir bloqueada, con desbloqueo rápido disponible)
+        self.session_manager = session_manager or SessionManager()
+        # Contraseña maestra hasta completar el 2FA (prepara el desbloqueo rápido)
+        self.master_password = None
+        
+        # Autenticación en segundo plano: bcrypt y PBKDF2 no bloquean la ventana.
+        # El resultado vuelve por una cola que se revisa con root.after
+        self.auth_results = queue.Queue()
+        self.auth_busy = False
+        # Último envío hecho mientras había otro en curso
+        self.queued_auth = None
+        self.busy_label = None
+        self.busy_bar = None
         
         # Configurar estilo
         self.setup_styles()
@@ -98,6 +118,8 @@ class LoginWindow:
                               cursor='hand2',
                               relief='flat')
         create_btn.pack(pady=30)
+        
+        self.create_busy_indicator(main_frame)
     
     def create_admin(self):
         """Crea el usuario administrador"""
@@ -109,42 +131,37 @@ class LoginWindow:
             messagebox.showerror("Error", "Todos los campos son obligatorios")
             return
         
-        # Simular la entrada para generar_Admin
-        import io
-        import contextlib
-        from unittest.mock import patch
-        
+        # bcrypt y la calibración de la derivación tardan: en segundo plano
+        self.submit_auth("Calibrando la seguridad...",
+                         self.save_new_admin, (username, password, password_2fa),
+                         self.on_admin_created)
+    
+    @staticmethod
+    def save_new_admin(username, password, password_2fa):
+        """Crea y guarda el administrador. Retorna None o el mensaje de error"""
         # Guardar directamente sin usar input/getpass
-        from core.seguridad import hash_password_bcrypt, generate_salt
-        from Modelo.models import AdminUser
-        from core.almacenamiento import save_jsonD
-        from base64 import urlsafe_b64encode
+        from core.autenticacion import crear_admin
+        from core.almacenamiento import save_jsonD, flush
         
         try:
-            # Hash de contraseñas
-            hashed_password = hash_password_bcrypt(password)
-            hashed_password_2fa = hash_password_bcrypt(password_2fa)
-            
-            # Generar salt para Fernet
-            fernet_salt_bytes = generate_salt()
-            fernet_salt_str = urlsafe_b64encode(fernet_salt_bytes).decode('utf-8')
+            # Hashes, salt, derivación calibrada y clave de datos de la bóveda
+            nuevo_admin = crear_admin(username, password, password_2fa)
             
-            # Crear usuario
-            nuevo_admin = AdminUser(
-                username=username,
-                password=hashed_password,
-                password_2fa=hashed_password_2fa,
-                fernet_key_salt=fernet_salt_str
-            )
-            
-            # Guardar
+            # Guardar (y comprobar que se escribió antes de confirmarlo)
             save_jsonD("DBusers.json", nuevo_admin.model_dump())
-            
-            messagebox.showinfo("Éxito", "Usuario administrador creado correctamente")
-            self.show_login_screen()
+            flush()
+            return None
             
         except Exception as e:
-            messagebox.showerror("Error", f"Error al crear usuario: {str(e)}")
+            return str(e)
+    
+    def on_admin_created(self, error):
+        """Recibe el resultado de save_new_admin"""
+        if error:
+            messagebox.showerror("Error", f"Error al crear usuario: {error}")
+            return
+        messagebox.showinfo("Éxito", "Usuario administrador creado correctamente")
+        self.show_login_screen()
     
     def show_login_screen(self):
         """Muestra la pantalla de login"""
@@ -183,6 +200,17 @@ class LoginWindow:
         self.password_entry = ttk.Entry(inner_frame, width=25, show="*", font=('Arial', 11))
         self.password_entry.grid(row=1, column=1, padx=(10, 0))
         
+        # Sesión bloqueada: se desbloquea sin volver a derivar la clave
+        locked_username = self.session_manager.locked_username
+        if locked_username and self.session_manager.can_quick_unlock():
+            self.username_entry.insert(0, locked_username)
+            self.password_entry.focus()
+            tk.Label(inner_frame,
+                    text="🔒 Sesión bloqueada: desbloqueo rápido",
+                    bg='#2d2d2d',
+                    fg='#14ae5c',
+                    font=('Arial', 9)).grid(row=2, column=0, columnspan=2, pady=(10, 0))
+        
         # Botón de login
         login_btn = tk.Button(main_frame,
                             text="Iniciar Sesión",
@@ -196,6 +224,20 @@ class LoginWindow:
                             relief='flat')
         login_btn.pack(pady=20)
         
+        self.create_busy_indicator(main_frame)
+        
+        if self.session_manager.is_locked:
+            tk.Button(main_frame,
+                     text="Cerrar sesión por completo",
+                     command=self.end_locked_session,
+                     bg='#d32f2f',
+                     fg='white',
+                     font=('Arial', 9),
+                     padx=10,
+                     pady=4,
+                     cursor='hand2',
+                     relief='flat').pack()
+        
         # Bind Enter key
         self.root.bind('<Return>', lambda e: self.attempt_login())
     
@@ -208,20 +250,105 @@ class LoginWindow:
             messagebox.showerror("Error", "Por favor complete todos los campos")
             return
         
-        # Simular entrada para autenticar_admin
-        from unittest.mock import patch
-        
-        with patch('builtins.input', side_effect=[username]):
-            with patch('getpass.getpass', return_value=password):
-                admin_user, fernet_key = autenticar_admin()
+        if self.session_manager.can_quick_unlock():
+            unlocked = self.session_manager.quick_unlock(username, password)
+            if unlocked:
+                # La sesión ya pasó el 2FA antes de bloquearse
+                self.result = unlocked
+                self.root.destroy()
+                return
+            if not self.session_manager.can_quick_unlock():
+                # Se agotaron los intentos: el siguiente será un login completo
+                messagebox.showerror("Error", "Usuario o contraseña incorrectos.\n"
+                                     "Debe iniciar sesión de nuevo por completo.")
+                self.show_login_screen()
+                return
+            messagebox.showerror("Error", "Usuario o contraseña incorrectos")
+            return
         
+        self.submit_auth("Verificando credenciales...",
+                         autenticar_credenciales, (username, password),
+                         lambda result: self.on_login_result(result, password))
+    
+    def on_login_result(self, result, password):
+        """Recibe (en el hilo de la interfaz) el resultado de autenticar_credenciales"""
+        admin_user, fernet_key = result
         if admin_user and fernet_key:
             self.current_user = admin_user
             self.fernet_key = fernet_key
+            self.master_password = password
             self.show_2fa_screen()
-        else:
+        elif not self.start_queued_auth():
             messagebox.showerror("Error", "Usuario o contraseña incorrectos")
     
+    def create_busy_indicator(self, parent):
+        """Crea el indicador de actividad (oculto hasta que se autentica)"""
+        self.busy_label = tk.Label(parent, text="", bg='#1e1e1e', fg='#888', font=('Arial', 9))
+        self.busy_label.pack()
+        self.busy_bar = ttk.Progressbar(parent, mode='indeterminate', length=200)
+    
+    def set_busy(self, message=None):
+        """Muestra el indicador con el mensaje dado, o lo oculta con None"""
+        if self.busy_label is None or not self.busy_label.winfo_exists():
+            return
+        if message:
+            self.busy_label.config(text=f"⏳ {message}")
+            self.busy_bar.pack(pady=5)
+            self.busy_bar.start(10)
+        else:
+            self.busy_label.config(text="")
+            self.busy_bar.stop()
+            self.busy_bar.pack_forget()
+    
+    def submit_auth(self, message, operation, args, on_done):
+        """
+        Ejecuta operation(*args) en un hilo aparte y llama a on_done(resultado)
+        en el hilo de la interfaz. Si ya hay una en curso, se guarda para
+        después (solo la última): se ejecuta si la actual falla.
+        """
+        if self.auth_busy:
+            self.queued_auth = (message, operation, args, on_done)
+            self.set_busy(f"{message} (1 intento en cola)")
+            return
+        
+        self.auth_busy = True
+        self.set_busy(message)
+        
+        def run():
+            try:
+                self.auth_results.put((on_done, operation(*args), None))
+            except Exception as e:
+                self.auth_results.put((on_done, None, e))
+        
+        threading.Thread(target=run, name="autenticacion", daemon=True).start()
+        self.root.after(AUTH_POLL_MS, self.poll_auth_result)
+    
+    def poll_auth_result(self):
+        """Recoge el resultado de la autenticación en segundo plano"""
+        try:
+            on_done, result, error = self.auth_results.get_nowait()
+        except queue.Empty:
+            self.root.after(AUTH_POLL_MS, self.poll_auth_result)
+            return
+        
+        self.auth_busy = False
+        self.set_busy(None)
+        if error is not None:
+            self.queued_auth = None
+            messagebox.showerror("Error", f"Error al autenticar: {error}")
+            return
+        on_done(result)
+        # Si el resultado cambió de pantalla, lo que quedaba en cola ya no aplica
+        self.queued_auth = None
+    
+    def start_queued_auth(self):
+        """Ejecuta el envío en cola, si lo hay. Retorna True si había uno"""
+        if self.queued_auth is None:
+            return False
+        queued, self.queued_auth = self.queued_auth, None
+        self.submit_auth(*queued)
+        return True
+    
     def show_2fa_screen(self):
         """Muestra la pantalla de 2FA"""
         self.clear_window()
@@ -258,6 +385,8 @@ class LoginWindow:
                               relief='flat')
         verify_btn.pack(pady=20)
         
+        self.create_busy_indicator(main_frame)
+        
         # Frame para el código (inicialmente oculto)
         self.code_frame = tk.Frame(main_frame, bg='#1e1e1e')
         self.code_frame.pack(pady=20)
@@ -270,16 +399,19 @@ class LoginWindow:
             messagebox.showerror("Error", "Por favor ingrese la contraseña 2FA")
             return
         
-        # Verificar contraseña 2FA
-        from unittest.mock import patch
-        
-        with patch('getpass.getpass', return_value=password_2fa):
-            if verificar_2fa(self.current_user):
-                # Generar y mostrar código
-                code = obtener_codigo_2fa()
-                self.show_code_input(code)
-            else:
-                messagebox.showerror("Error", "Contraseña 2FA incorrecta")
+        # Verificar contraseña 2FA (bcrypt, en segundo plano)
+        self.submit_auth("Verificando 2FA...",
+                         comprobar_password_2fa, (self.current_user, password_2fa),
+                         self.on_2fa_result)
+    
+    def on_2fa_result(self, valid):
+        """Recibe el resultado de la verificación de la contraseña 2FA"""
+        if valid:
+            # Generar y mostrar código
+            code = obtener_codigo_2fa()
+            self.show_code_input(code)
+        elif not self.start_queued_auth():
+            messagebox.showerror("Error", "Contraseña 2FA incorrecta")
     
     def show_code_input(self, generated_code):
         """Muestra el campo para ingresar el código"""
@@ -330,25 +462,40 @@ class LoginWindow:
         
         if entered_code == correct_code:
             messagebox.showinfo("Éxito", "¡Autenticación completa!")
+            self.session_manager.start_session(self.current_user, self.fernet_key,
+                                               self.master_password)
+            self.master_password = None
+            self.result = (self.current_user, self.fernet_key)
+            self.fernet_key = None
             self.root.destroy()
-            # Llamar al callback con los datos de sesión
-            self.on_success(self.current_user, self.fernet_key)
         else:
             messagebox.showerror("Error", "Código incorrecto")
             self.code_entry.delete(0, tk.END)
             self.code_entry.focus()
     
+    def end_locked_session(self):
+        """Descarta la sesión bloqueada: el siguiente acceso es un login completo"""
+        self.session_manager.end_session()
+        self.show_login_screen()
+    
+    def on_close(self):
+        """Cierra la ventana borrando la sesión bloqueada, si la hay"""
+        self.master_password = None
+        self.session_manager.end_session()
+        self.root.destroy()
+    
     def run(self):
-        """Ejecuta la ventana de login"""
+        """Ejecuta la ventana de login; retorna (usuario, clave Fernet) o None si se cerró"""
         self.root.mainloop()
+        return self.result
 
 
 # Función helper para iniciar el login
-def start_login(on_success_callback):
+def start_login(session_manager: SessionManager = None):
     """
-    Inicia la ventana de login
-    on_success_callback: función que se llama cuando el login es exitoso
-                        recibe (admin_user, fernet_key)
+    Inicia la ventana de login y espera a que se cierre
+    session_manager: sesión bloqueada que se puede desbloquear sin derivar la clave
+    Retorna (admin_user, fernet_key) si el login fue exitoso, o None
     """
-    login = LoginWindow(on_success_callback)
-    login.run()
\ No newline at end of file
+    login = LoginWindow(session_manager)
+    return login.run()
\ No newline at end of file
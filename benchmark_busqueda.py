@@ -0,0 +1,87 @@
+# benchmark_busqueda.py
+"""
+Mide la latencia por pulsación de la búsqueda sobre una bóveda sintética.
+
+Simula que el usuario escribe cada consulta letra a letra y, para cada
+prefijo, cronometra la búsqueda por subcadena y la aproximada (top-k).
+No toca el disco: construye el índice directamente en memoria.
+
+Uso:
+    python benchmark_busqueda.py [número de cuentas] [semilla]
+"""
+import sys
+import time
+import random
+import string
+from statistics import median
+from Modelo.models import Account
+from core.busqueda import TrigramIndex
+
+PLATFORMS = ["amazon", "netflix", "steam", "gmail", "outlook", "github", "spotify",
+             "twitch", "discord", "paypal", "dropbox", "linkedin", "epic games",
+             "battle net", "playstation", "nintendo", "disney plus", "hbo max"]
+CATEGORIES = ["videojuegos", "correo", "streaming", "productividad", "otros"]
+DOMAINS = ["gmail.com", "outlook.com", "yahoo.com", "proton.me"]
+NAMES = ["maria", "jose", "lucia", "carlos", "ana", "pedro", "sofia", "diego",
+         "elena", "miguel", "laura", "javier", "paula", "andres", "carmen", "luis"]
+# Consultas tecleadas, algunas con errores de escritura
+QUERIES = ["amazon", "netflx", "stema", "githbu", "disney", "maria42", "zzzz"]
+TOP_K = 20
+
+def _word(rng: random.Random, size: int) -> str:
+    return "".join(rng.choices(string.ascii_lowercase, k=size))
+
+def build_accounts(count: int, seed: int):
+    rng = random.Random(seed)
+    accounts = []
+    for i in range(count):
+        base = rng.choice(PLATFORMS)
+        platform = f"{base} {_word(rng, 4)}" if rng.random() < 0.7 else f"{_word(rng, 7)} {i}"
+        user = f"{rng.choice(NAMES)}{i}@{rng.choice(DOMAINS)}" if rng.random() < 0.5 else f"{_word(rng, 8)}{i}"
+        notes = " ".join(_word(rng, rng.randint(3, 8)) for _ in range(rng.randint(0, 3)))
+        accounts.append(Account.model_construct(platform=platform, email_or_username=user,
+                                                password="", category=rng.choice(CATEGORIES),
+                                                notes=notes))
+    return accounts
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def _report(name, samples):
+    ms = [sample * 1000 for sample in samples]
+    print(f"  {name:<12} mediana {median(ms):8.2f} ms | p95 {_percentile(ms, 0.95):8.2f} ms"
+          f" | máx {max(ms):8.2f} ms")
+
+def run(count: int = 100_000, seed: int = 7):
+    print(f"Generando {count} cuentas...")
+    accounts = build_accounts(count, seed)
+
+    start = time.perf_counter()
+    index = TrigramIndex(accounts)
+    print(f"Índice construido en {time.perf_counter() - start:.2f} s")
+
+    substring, fuzzy = [], []
+    for query in QUERIES:
+        for end in range(1, len(query) + 1):
+            prefix = query[:end]
+
+            start = time.perf_counter()
+            found = index.search(prefix)
+            substring.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            ranked = index.search_fuzzy(prefix, TOP_K)
+            fuzzy.append(time.perf_counter() - start)
+
+        best = ranked[0][1].platform if ranked else "-"
+        print(f"  '{query}': {len(found)} por subcadena, mejor aproximada: {best}")
+
+    print(f"Latencia por pulsación ({len(substring)} pulsaciones):")
+    _report("subcadena", substring)
+    _report("aproximada", fuzzy)
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 7
+    run(count, seed)
\ No newline at end of file
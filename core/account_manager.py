@@ -1,86 +1,848 @@
 # core/account_manager.py
-from typing import List, Optional
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Set, Tuple
 from datetime import datetime
+from pydantic import ValidationError
 from Modelo.models import Account
-from core.almacenamiento import save_accounts_data, load_accounts_data
-from core.seguridad import generate_strong_password
+from core.almacenamiento import AccountError, account_errors, platform_key
+from core.backends import StorageBackend, create_backend
+from core.busqueda import TrigramIndex
+from core.consultas import AccountQuery, QueryPlan, QuerySources, compile_query
+from core.ordenacion import SortedIndex
+from core.persistencia import PersistenceWorker
+from core.registros import AccountRecord
+from core.seguridad import generate_strong_password, CryptoContext, CryptoItemError
+
+def _to_accounts(records: Iterable[AccountRecord]) -> List[Account]:
+    """Cuentas de pydantic para entregar fuera del gestor"""
+    return [record.to_account() for record in records]
+
+def _validation_message(error: ValidationError) -> str:
+    """Resumen en una línea de los errores de pydantic"""
+    return "; ".join(f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}"
+                     for item in error.errors())
+
+# Argumentos de create_account (los cuatro primeros obligatorios)
+CREATE_FIELDS = ('platform', 'email_or_username', 'password', 'category', 'notes')
+UPDATABLE_FIELDS = ('email_or_username', 'password', 'category', 'notes')
+
+class BulkResult(NamedTuple):
+    """Resultado de un elemento de una operación en lote."""
+    index: int
+    platform: str
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+class AccountPage(NamedTuple):
+    """Página de get_accounts_page; next_cursor es None en la última."""
+    accounts: List[Account]
+    next_cursor: Optional[str]
+
+class _Transaction:
+    """Cambios hechos dentro de AccountManager.transaction(), para guardarlos o deshacerlos."""
+
+    def __init__(self):
+        # Registros creados en la transacción, por id()
+        self.created: Dict[int, AccountRecord] = {}
+        # Registros existentes modificados: id() -> (registro, copia previa)
+        self.originals: Dict[int, Tuple[AccountRecord, AccountRecord]] = {}
+        # Registros existentes eliminados, por id()
+        self.deleted: Dict[int, AccountRecord] = {}
+        # Orden de los registros antes de la primera eliminación
+        self.order: Optional[List[int]] = None
+        self.save_all = False
+
+class _FingerprintBatch(NamedTuple):
+    """Huellas calculadas para un lote de registros (None donde falló el descifrado)."""
+    records: List[AccountRecord]
+    # Contraseña cifrada que se descifró (si cambió después, la huella no vale)
+    tokens: List[str]
+    fingerprints: List[Optional[str]]
+    errors: List[CryptoItemError]
+
+def _compute_fingerprints(crypto: CryptoContext, records: List[AccountRecord]) -> _FingerprintBatch:
+    """Descifra en un lote y calcula las huellas, sin tocar los registros"""
+    tokens = [record.encrypted_password for record in records]
+    passwords, errors = crypto.decrypt_many(tokens)
+    fingerprints = [crypto.fingerprint(password) if password is not None else None
+                    for password in passwords]
+    return _FingerprintBatch(records, tokens, fingerprints, errors)
+
+class DuplicatePlatformError(ValueError):
+    """Hay más de una cuenta para la misma plataforma (sin distinguir mayúsculas)."""
+
+    def __init__(self, platform: str, accounts: List[Account]):
+        super().__init__(f"Hay {len(accounts)} cuentas para la plataforma '{platform}'")
+        self.platform = platform
+        self.accounts = accounts
 
 class AccountManager:
-    """Gestor CRUD para las cuentas de usuario"""
+    """
+    Gestor CRUD para las cuentas de usuario.
+
+    Las cuentas se guardan en memoria como registros compactos (AccountRecord);
+    los métodos públicos retornan objetos Account creados al momento, así que
+    modificarlos no cambia la bóveda: los cambios pasan por update_account.
+    """
     
-    def __init__(self, fernet_key: bytes):
+    def __init__(self, fernet_key: bytes, journaled: bool = False,
+                 compact_threshold: int = 500, crypto_workers: int = 1,
+                 storage: str = "json", backend: Optional[StorageBackend] = None,
+                 persistence_worker: Optional[PersistenceWorker] = None):
+        """
+        journaled: si es True, cada cambio se añade a la bitácora en lugar de
+        reescribir todo el archivo; la bitácora se compacta en segundo plano
+        al superar compact_threshold entradas.
+        crypto_workers: con más de 1, las bóvedas grandes se cifran/descifran
+        en paralelo (las pequeñas siguen en serie).
+        storage: almacenamiento a usar ("json", "sqlite" o "sharded") si no se
+        pasa backend. Con "sharded" cada categoría se carga al consultarla.
+        persistence_worker: si se indica, los guardados se encolan en ese hilo
+        y los métodos CRUD retornan sin esperar al cifrado ni a la escritura.
+        """
         self.fernet_key = fernet_key
-        self.accounts: List[Account] = []
+        # Contexto de cifrado de la sesión, construido una sola vez
+        self.crypto = CryptoContext(fernet_key, workers=crypto_workers)
+        if backend is None:
+            options = {}
+            if storage == "json":
+                options = {"journaled": journaled, "compact_threshold": compact_threshold}
+            backend = create_backend(storage, self.crypto, **options)
+        self.backend = backend
+        self.partial_load = getattr(backend, "supports_partial_load", False)
+        self.persistence_worker = persistence_worker
+        # Errores por cuenta de la última carga o guardado
+        self.last_errors: List[AccountError] = []
+        # Registros por id(), en orden de inserción
+        self._records: Dict[int, AccountRecord] = {}
+        # Índice plataforma (casefold) -> registros; más de uno indica duplicado
+        self._platform_index: Dict[str, List[AccountRecord]] = {}
+        # Índice categoría (lower) -> registros por id(); su tamaño es el conteo
+        self._category_index: Dict[str, Dict[int, AccountRecord]] = {}
+        self._sorted_categories: Optional[List[str]] = None
+        # Índice de trigramas para la búsqueda por texto; se construye en la
+        # primera búsqueda
+        self._search_index: Optional[TrigramIndex] = None
+        # Índices ordenados para la paginación, por orden; se construyen en
+        # la primera página pedida con ese orden
+        self._sorted_indexes: Dict[str, SortedIndex] = {}
+        # Huella de la contraseña -> registros por id(); las huellas con más
+        # de un registro son contraseñas reutilizadas
+        self._fingerprint_groups: Dict[str, Dict[int, AccountRecord]] = {}
+        self._fingerprint_of: Dict[int, str] = {}
+        self._reused_fingerprints: Set[str] = set()
+        # Registros sin huella válida (cargados de una bóveda anterior o
+        # calculada con otra clave): con persistence_worker se calculan en
+        # ese hilo al cargarlos; sin él, al consultar reutilizaciones
+        self._unfingerprinted: Dict[int, AccountRecord] = {}
+        self._fingerprints_in_progress: Set[int] = set()
+        # Lotes calculados en segundo plano pendientes de indexar
+        self._fingerprint_lock = threading.Lock()
+        self._fingerprint_batches: List[_FingerprintBatch] = []
+        self._loaded_categories: Set[str] = set()
+        self._fully_loaded = False
+        # Transacción en curso (ver transaction())
+        self._transaction: Optional[_Transaction] = None
         self.load_accounts()
     
     def load_accounts(self):
         """Carga todas las cuentas desde el almacenamiento"""
-        self.accounts = load_accounts_data(self.fernet_key)
+        if self._transaction is not None:
+            raise RuntimeError("No se pueden recargar las cuentas durante una transacción")
+        self._clear_records()
+        if self.partial_load:
+            # Las categorías se cargan la primera vez que se consultan
+            records = []
+            self._fully_loaded = False
+        else:
+            records = self.backend.load_all()
+            self._fully_loaded = True
+        self._add_records(records)
+        self.last_errors = list(self.backend.last_errors)
+        self.last_errors.extend(self._duplicate_errors(records))
+        self._schedule_fingerprints()
+    
+    def _clear_records(self):
+        """Vacía los registros en memoria y todos los índices"""
+        self._loaded_categories = set()
+        self._records = {}
+        self._platform_index = {}
+        self._category_index = {}
+        self._sorted_categories = None
+        self._search_index = None
+        self._sorted_indexes = {}
+        self._fingerprint_groups = {}
+        self._fingerprint_of = {}
+        self._reused_fingerprints = set()
+        self._unfingerprinted = {}
+        self._fingerprints_in_progress = set()
+        with self._fingerprint_lock:
+            self._fingerprint_batches = []
+    
+    def _add_records(self, records: List[AccountRecord]):
+        """Añade los registros a memoria y a los índices por plataforma, categoría, texto y orden"""
+        for record in records:
+            self._records[id(record)] = record
+            self._platform_index.setdefault(platform_key(record.platform), []).append(record)
+            self._index_category(record)
+            if self._search_index is not None:
+                self._search_index.add(record)
+            for index in self._sorted_indexes.values():
+                index.add(record)
+            self._index_fingerprint(record)
+    
+    def _index_category(self, record: AccountRecord):
+        key = record.category.lower()
+        if key not in self._category_index:
+            self._category_index[key] = {}
+            self._sorted_categories = None
+        self._category_index[key][id(record)] = record
+    
+    def _unindex_category(self, record: AccountRecord, category: str):
+        key = category.lower()
+        members = self._category_index.get(key)
+        if members is None:
+            return
+        members.pop(id(record), None)
+        if not members:
+            del self._category_index[key]
+            self._sorted_categories = None
+    
+    def _remove_record(self, record: AccountRecord):
+        """Quita un registro concreto de memoria y de los índices"""
+        del self._records[id(record)]
+        key = platform_key(record.platform)
+        matches = self._platform_index.get(key, [])
+        for i, indexed in enumerate(matches):
+            if indexed is record:
+                del matches[i]
+                break
+        if not matches:
+            self._platform_index.pop(key, None)
+        self._unindex_category(record, record.category)
+        if self._search_index is not None:
+            self._search_index.remove(record)
+        for index in self._sorted_indexes.values():
+            index.remove(record)
+        self._unindex_fingerprint(record)
+    
+    def _reindex(self, record: AccountRecord):
+        """Actualiza los índices de texto, orden y huellas tras modificar un registro"""
+        if self._search_index is not None:
+            self._search_index.update(record)
+        for index in self._sorted_indexes.values():
+            index.update(record)
+        self._unindex_fingerprint(record)
+        self._index_fingerprint(record)
+    
+    def _index_fingerprint(self, record: AccountRecord):
+        """
+        Añade el registro al grupo de su huella. Si no tiene una válida se
+        calcula cuando la contraseña ya está descifrada (cuentas nuevas o
+        editadas); si no, queda pendiente sin descifrar nada.
+        """
+        fingerprint = record.fingerprint
+        if not self.crypto.is_current_fingerprint(fingerprint):
+            fingerprint = None
+            if record.is_decrypted:
+                fingerprint = self.crypto.fingerprint(record.password)
+            record.fingerprint = fingerprint
+        if fingerprint is None:
+            self._unfingerprinted[id(record)] = record
+            return
+        
+        group = self._fingerprint_groups.setdefault(fingerprint, {})
+        group[id(record)] = record
+        self._fingerprint_of[id(record)] = fingerprint
+        if len(group) > 1:
+            self._reused_fingerprints.add(fingerprint)
+    
+    def _unindex_fingerprint(self, record: AccountRecord):
+        self._unfingerprinted.pop(id(record), None)
+        fingerprint = self._fingerprint_of.pop(id(record), None)
+        if fingerprint is None:
+            return
+        group = self._fingerprint_groups[fingerprint]
+        del group[id(record)]
+        if len(group) < 2:
+            self._reused_fingerprints.discard(fingerprint)
+        if not group:
+            del self._fingerprint_groups[fingerprint]
+    
+    def _insert_records(self, records: List[AccountRecord]):
+        """Añade registros nuevos (no cargados), anotándolos en la transacción"""
+        # Su categoría se carga antes; si no, al cargarla después estarían dos veces
+        for category in {record.category.lower() for record in records}:
+            self.ensure_category_loaded(category)
+        self._add_records(records)
+        if self._transaction is not None:
+            for record in records:
+                self._transaction.created[id(record)] = record
+    
+    def _delete_record(self, record: AccountRecord):
+        """Elimina un registro, anotándolo en la transacción"""
+        transaction = self._transaction
+        if transaction is not None:
+            if transaction.order is None:
+                transaction.order = list(self._records)
+            if transaction.created.pop(id(record), None) is None:
+                transaction.deleted[id(record)] = record
+        self._remove_record(record)
+    
+    def _duplicate_errors(self, records: List[AccountRecord]) -> List[AccountError]:
+        """Errores para los registros recién cargados cuya plataforma está repetida"""
+        keys = {platform_key(record.platform) for record in records}
+        return [AccountError(matches[0].platform,
+                             f"Plataforma duplicada ({len(matches)} cuentas)")
+                for key in sorted(keys)
+                if len(matches := self._platform_index.get(key, [])) > 1]
+    
+    def ensure_category_loaded(self, category: str):
+        """Carga las cuentas de una categoría si aún no están en memoria"""
+        key = category.lower()
+        if self._fully_loaded or key in self._loaded_categories:
+            return
+        loaded = self.backend.load_category(category)
+        self._add_records(loaded)
+        self.last_errors.extend(self._duplicate_errors(loaded))
+        self._loaded_categories.add(key)
+        self._schedule_fingerprints()
+    
+    def ensure_all_loaded(self):
+        """Carga todas las categorías pendientes"""
+        if self._fully_loaded:
+            return
+        for category in self.backend.categories():
+            self.ensure_category_loaded(category)
+        self._fully_loaded = True
+    
+    def get_all_accounts(self) -> List[Account]:
+        """Obtiene todas las cuentas (carga las categorías pendientes)"""
+        self.ensure_all_loaded()
+        return _to_accounts(self._records.values())
+    
+    def _persist(self, description: str, operation, *args):
+        """
+        Ejecuta una operación del almacenamiento, en segundo plano si hay worker.
+        Dentro de una transacción no hace nada: los cambios se guardan al salir.
+        """
+        if self._transaction is not None:
+            return
+        if self.persistence_worker is not None:
+            self.persistence_worker.submit(description, operation, *args)
+        else:
+            operation(*args)
     
     def save_all_accounts(self):
         """Guarda todas las cuentas en el almacenamiento"""
-        save_accounts_data(self.accounts, self.fernet_key)
+        if self._transaction is not None:
+            self._transaction.save_all = True
+            return
+        if self.persistence_worker is not None:
+            self._persist("guardar todas las cuentas", self.backend.save_all,
+                          list(self._records.values()))
+            return
+        self.backend.save_all(list(self._records.values()))
+        self.last_errors = self.backend.last_errors
     
-    def create_account(self, platform: str, email_or_username: str, 
-                    password: str, category: str, notes: str = "") -> Account:
-        """Crea una nueva cuenta"""
-        new_account = Account(
+    def flush(self):
+        """Escribe en disco todos los cambios pendientes (cierre de sesión o salida)"""
+        if self.persistence_worker is not None:
+            self.persistence_worker.wait_idle()
+        self.backend.flush()
+
+    def close(self):
+        """
+        Escribe los cambios pendientes y suelta la sesión: el pool de cifrado,
+        la clave y las cuentas en memoria. El gestor no se puede usar después.
+        """
+        try:
+            self.flush()
+        finally:
+            self.crypto.close()
+            backend_close = getattr(self.backend, "close", None)
+            if backend_close is not None:
+                backend_close()
+            self._clear_records()
+            self._fully_loaded = False
+            self.backend = None
+            self.crypto = None
+            self.fernet_key = None
+
+    def _after_bulk_persist(self):
+        """Recoge los errores por cuenta de un guardado en lote hecho en este hilo"""
+        if self.persistence_worker is None and self._transaction is None:
+            self.last_errors = list(self.backend.last_errors)
+    
+    def _new_account(self, platform: str, email_or_username: str,
+                     password: str, category: str, notes: str = "") -> Account:
+        """Valida los datos de una cuenta nueva (pydantic) con sus fechas"""
+        now = datetime.now().isoformat()
+        return Account(
             platform=platform,
             email_or_username=email_or_username,
             password=password,
             category=category,
             notes=notes,
-            created_at=datetime.now().isoformat(),
-            updated_at=datetime.now().isoformat()
+            created_at=now,
+            updated_at=now
         )
-        self.accounts.append(new_account)
-        self.save_all_accounts()
+    
+    def create_account(self, platform: str, email_or_username: str, 
+                    password: str, category: str, notes: str = "") -> Account:
+        """Crea una nueva cuenta"""
+        # El almacenamiento identifica las cuentas por plataforma
+        if self._records_by_platform(platform):
+            raise ValueError(f"Ya existe una cuenta para la plataforma '{platform}'")
+        
+        # Validación de pydantic en la entrada; en memoria queda el registro
+        new_account = self._new_account(platform, email_or_username, password, category, notes)
+        record = AccountRecord.from_account(new_account)
+        self._insert_records([record])
+        self._persist(f"crear '{platform}'", self.backend.put, record)
         return new_account
     
+    def create_many(self, items: Iterable[Mapping]) -> List[BulkResult]:
+        """
+        Crea varias cuentas con un solo guardado. Cada elemento tiene los
+        argumentos de create_account (platform, email_or_username, password,
+        category y opcionalmente notes). Los elementos inválidos o con una
+        plataforma ya existente (o repetida en el lote) no se crean.
+        Retorna un resultado por elemento, en el mismo orden.
+        """
+        results: List[BulkResult] = []
+        records: List[AccountRecord] = []
+        seen: Set[str] = set()
+        for index, item in enumerate(items):
+            platform = str(item.get('platform', ''))
+            missing = [field for field in CREATE_FIELDS[:4] if field not in item]
+            unknown = sorted(set(item) - set(CREATE_FIELDS))
+            if missing or unknown:
+                message = (f"Faltan campos: {', '.join(missing)}" if missing
+                           else f"Campos desconocidos: {', '.join(unknown)}")
+                results.append(BulkResult(index, platform, message))
+                continue
+            try:
+                new_account = self._new_account(**item)
+            except ValidationError as e:
+                results.append(BulkResult(index, platform, _validation_message(e)))
+                continue
+            
+            key = platform_key(new_account.platform)
+            if key in seen or self._records_by_platform(new_account.platform):
+                results.append(BulkResult(index, platform,
+                                          f"Ya existe una cuenta para la plataforma '{platform}'"))
+                continue
+            seen.add(key)
+            records.append(AccountRecord.from_account(new_account))
+            results.append(BulkResult(index, platform))
+        
+        if records:
+            self._insert_records(records)
+            self._persist(f"crear {len(records)} cuentas", self.backend.put_many, records)
+            self._after_bulk_persist()
+        return results
+    
+    def _records_by_platform(self, platform: str) -> List[AccountRecord]:
+        matches = self._platform_index.get(platform_key(platform))
+        if not matches and not self._fully_loaded:
+            # Puede estar en una categoría que todavía no se ha cargado: el
+            # almacenamiento sabe cuál sin cargar las demás
+            category = self.backend.category_of(platform)
+            if category is not None:
+                self.ensure_category_loaded(category)
+                matches = self._platform_index.get(platform_key(platform))
+        return list(matches or [])
+    
+    def _record_by_platform(self, platform: str) -> Optional[AccountRecord]:
+        matches = self._records_by_platform(platform)
+        if len(matches) > 1:
+            raise DuplicatePlatformError(platform, _to_accounts(matches))
+        return matches[0] if matches else None
+    
+    def _category_records(self, category: str) -> List[AccountRecord]:
+        self.ensure_category_loaded(category)
+        return list(self._category_index.get(category.lower(), {}).values())
+    
+    def get_accounts_by_platform(self, platform: str) -> List[Account]:
+        """Obtiene todas las cuentas de una plataforma (sin distinguir mayúsculas)"""
+        return _to_accounts(self._records_by_platform(platform))
+    
     def get_account_by_platform(self, platform: str) -> Optional[Account]:
-        """Busca una cuenta por plataforma"""
-        for account in self.accounts:
-            if account.platform.lower() == platform.lower():
-                return account
-        return None
+        """
+        Busca una cuenta por plataforma.
+        Lanza DuplicatePlatformError si hay varias cuentas para esa plataforma.
+        """
+        record = self._record_by_platform(platform)
+        return record.to_account() if record else None
+    
+    def find_duplicate_platforms(self) -> Dict[str, List[Account]]:
+        """Plataformas con más de una cuenta cargada"""
+        self.ensure_all_loaded()
+        return {matches[0].platform: _to_accounts(matches)
+                for matches in self._platform_index.values() if len(matches) > 1}
     
     def get_accounts_by_category(self, category: str) -> List[Account]:
         """Obtiene todas las cuentas de una categoría"""
-        return [acc for acc in self.accounts 
-                if acc.category.lower() == category.lower()]
+        return _to_accounts(self._category_records(category))
     
     def update_account(self, platform: str, **kwargs) -> bool:
         """Actualiza una cuenta existente"""
-        account = self.get_account_by_platform(platform)
+        account = self._record_by_platform(platform)
         if not account:
             return False
         
-        # Actualizar campos permitidos
-        updatable_fields = ['email_or_username', 'password', 'category', 'notes']
-        for field, value in kwargs.items():
-            if field in updatable_fields and value is not None:
+        self._apply_update(account, kwargs)
+        self._persist(f"actualizar '{account.platform}'", self.backend.put, account)
+        return True
+    
+    def _apply_update(self, account: AccountRecord, changes: Mapping):
+        """Aplica los campos permitidos a un registro y actualiza los índices"""
+        # Si cambia de categoría, la de destino debe estar cargada antes
+        if changes.get('category'):
+            self.ensure_category_loaded(changes['category'])
+        
+        transaction = self._transaction
+        if (transaction is not None and id(account) not in transaction.created
+                and id(account) not in transaction.originals):
+            transaction.originals[id(account)] = (account, account.copy())
+        
+        previous_category = account.category
+        for field, value in changes.items():
+            if field in UPDATABLE_FIELDS and value is not None:
                 setattr(account, field, value)
+        if account.category != previous_category:
+            self._unindex_category(account, previous_category)
+            self._index_category(account)
         
         account.updated_at = datetime.now().isoformat()
-        self.save_all_accounts()
-        return True
+        self._reindex(account)
+    
+    def update_many(self, items: Iterable[Mapping]) -> List[BulkResult]:
+        """
+        Actualiza varias cuentas con un solo guardado. Cada elemento tiene
+        'platform' y los campos a cambiar (los de update_account). Se rechazan
+        los elementos con campos desconocidos o valores que no son texto, y
+        las plataformas inexistentes o duplicadas.
+        Retorna un resultado por elemento, en el mismo orden.
+        """
+        results: List[BulkResult] = []
+        validated = []
+        for index, item in enumerate(items):
+            platform = str(item.get('platform', ''))
+            changes = {field: value for field, value in item.items() if field != 'platform'}
+            unknown = sorted(set(changes) - set(UPDATABLE_FIELDS))
+            invalid = sorted(field for field, value in changes.items()
+                             if value is not None and not isinstance(value, str))
+            if unknown or invalid:
+                message = (f"Campos no actualizables: {', '.join(unknown)}" if unknown
+                           else f"Valores no válidos en: {', '.join(invalid)}")
+                results.append(BulkResult(index, platform, message))
+                continue
+            try:
+                account = self._record_by_platform(platform)
+            except DuplicatePlatformError as e:
+                results.append(BulkResult(index, platform, str(e)))
+                continue
+            if account is None:
+                results.append(BulkResult(index, platform, "La cuenta no existe"))
+                continue
+            validated.append((account, changes))
+            results.append(BulkResult(index, platform))
+        
+        if validated:
+            # Un mismo registro puede aparecer varias veces: se guarda una sola
+            changed: Dict[int, AccountRecord] = {}
+            for account, changes in validated:
+                self._apply_update(account, changes)
+                changed[id(account)] = account
+            self._persist(f"actualizar {len(changed)} cuentas", self.backend.put_many,
+                          list(changed.values()))
+            self._after_bulk_persist()
+        return results
     
     def delete_account(self, platform: str) -> bool:
         """Elimina una cuenta"""
-        account = self.get_account_by_platform(platform)
+        account = self._record_by_platform(platform)
         if not account:
             return False
         
-        self.accounts.remove(account)
-        self.save_all_accounts()
+        self._delete_record(account)
+        self._persist(f"eliminar '{account.platform}'", self.backend.delete, account.platform)
+        return True
+    
+    def delete_many(self, platforms: Iterable[str]) -> List[BulkResult]:
+        """
+        Elimina varias cuentas con un solo guardado. Las plataformas
+        inexistentes, duplicadas o repetidas en la lista se reportan como error.
+        Retorna un resultado por plataforma, en el mismo orden.
+        """
+        results: List[BulkResult] = []
+        removed: List[AccountRecord] = []
+        seen: Set[str] = set()
+        for index, platform in enumerate(platforms):
+            try:
+                account = self._record_by_platform(platform)
+            except DuplicatePlatformError as e:
+                results.append(BulkResult(index, platform, str(e)))
+                continue
+            if account is None or platform_key(platform) in seen:
+                results.append(BulkResult(index, platform, "La cuenta no existe"))
+                continue
+            seen.add(platform_key(platform))
+            removed.append(account)
+            results.append(BulkResult(index, platform))
+        
+        if removed:
+            for account in removed:
+                self._delete_record(account)
+            self._persist(f"eliminar {len(removed)} cuentas", self.backend.delete_many,
+                          [account.platform for account in removed])
+            self._after_bulk_persist()
+        return results
+
+    def _duplicate_record(self, platform: str, position: int) -> Optional[AccountRecord]:
+        """Registro número `position` de la plataforma (orden de get_accounts_by_platform)"""
+        if self._transaction is not None:
+            raise RuntimeError("No se pueden resolver duplicados durante una transacción")
+        # Se guarda la bóveda completa: se carga antes de cambiar nada
+        self.ensure_all_loaded()
+        matches = self._records_by_platform(platform)
+        return matches[position] if 0 <= position < len(matches) else None
+
+    def _save_resolved_duplicates(self, description: str):
+        """
+        Guarda la bóveda completa: el almacenamiento identifica las cuentas
+        por plataforma y no distingue entre las repetidas.
+        """
+        self._persist(description, self.backend.save_all, list(self._records.values()))
+        self._after_bulk_persist()
+
+    def rename_duplicate(self, platform: str, position: int, new_platform: str) -> bool:
+        """
+        Cambia la plataforma de una de las cuentas repetidas de `platform`,
+        elegida por su posición en get_accounts_by_platform(platform).
+        Lanza DuplicatePlatformError si ya hay otra cuenta con el nombre nuevo.
+        """
+        account = self._duplicate_record(platform, position)
+        if account is None:
+            return False
+        new_platform = new_platform.strip()
+        if not new_platform:
+            raise ValueError("La plataforma no puede estar vacía")
+        others = [record for record in self._records_by_platform(new_platform)
+                  if record is not account]
+        if others:
+            raise DuplicatePlatformError(new_platform, _to_accounts(others))
+
+        self._remove_record(account)
+        account.platform = new_platform
+        account.updated_at = datetime.now().isoformat()
+        self._add_records([account])
+        self._save_resolved_duplicates(f"renombrar '{platform}' a '{new_platform}'")
+        return True
+
+    def delete_duplicate(self, platform: str, position: int) -> bool:
+        """
+        Elimina una de las cuentas repetidas de `platform`, elegida por su
+        posición en get_accounts_by_platform(platform).
+        """
+        account = self._duplicate_record(platform, position)
+        if account is None:
+            return False
+        self._remove_record(account)
+        self._save_resolved_duplicates(f"eliminar una cuenta repetida de '{platform}'")
         return True
+
+    @contextmanager
+    def transaction(self):
+        """
+        Agrupa cambios con un solo guardado:
+
+            with manager.transaction():
+                manager.create_account(...)
+                manager.update_account(...)
+                manager.delete_account(...)
+
+        Dentro del bloque los cambios se aplican en memoria; al salir se
+        guardan en una sola escritura (con bitácora, una sola entrada: tras
+        una escritura interrumpida no queda aplicada a medias). Si se lanza
+        una excepción, o si falla ese guardado, se deshacen todos y la bóveda
+        en disco no se toca. Al salir se espera al guardado aunque haya
+        persistence_worker. Una transacción anidada se une a la exterior,
+        que es la que guarda o deshace.
+
+        Los registros en memoria son los mismos que escribe el almacenamiento:
+        al entrar se espera a los guardados encolados y a la compactación en
+        curso, y hasta guardar o deshacer no se ejecuta ninguno en segundo
+        plano (escribirían los cambios aún sin confirmar).
+        """
+        if self._transaction is not None:
+            yield self
+            return
+
+        with self._background_paused():
+            transaction = self._transaction = _Transaction()
+            try:
+                yield self
+            except BaseException:
+                self._transaction = None
+                self._rollback(transaction)
+                raise
+            self._transaction = None
+            self._commit(transaction)
+
+    @contextmanager
+    def _background_paused(self):
+        """Espera a los guardados en segundo plano y no deja empezar otros dentro del bloque"""
+        if self.persistence_worker is None:
+            self._wait_for_compaction()
+            yield
+            return
+        with self.persistence_worker.paused():
+            self._wait_for_compaction()
+            yield
+
+    def _wait_for_compaction(self):
+        wait_for_compaction = getattr(self.backend, "wait_for_compaction", None)
+        if wait_for_compaction is not None:
+            wait_for_compaction()
+
+    def _commit(self, transaction: _Transaction):
+        """
+        Guarda los cambios de la transacción; si el guardado falla, los deshace.
+        Con persistence_worker el guardado no se encola: se hace en este hilo
+        (el worker está en pausa), para saber si falló y poder deshacerlo.
+        """
+        try:
+            if transaction.save_all:
+                self._persist_now(self.backend.save_all, list(self._records.values()))
+                return
+
+            changed = {**{key: record for key, (record, _) in transaction.originals.items()},
+                       **transaction.created}
+            puts = [record for key, record in changed.items() if key in self._records]
+            # Una cuenta reemplazada por otra con la misma plataforma se guarda
+            # con put; solo se eliminan las plataformas que ya no existen
+            put_keys = {platform_key(record.platform) for record in puts}
+            deletes = [record.platform for record in transaction.deleted.values()
+                       if platform_key(record.platform) not in put_keys]
+            if puts or deletes:
+                self._persist_now(self.backend.apply_batch, puts, deletes)
+        except Exception:
+            self._rollback(transaction)
+            raise
+
+    def _persist_now(self, operation, *args):
+        """Ejecuta una operación del almacenamiento en este hilo (con el worker en pausa)"""
+        operation(*args)
+        self.last_errors = list(self.backend.last_errors)
+
+    def _rollback(self, transaction: _Transaction):
+        """Deshace en memoria los cambios de la transacción"""
+        for record in transaction.created.values():
+            if id(record) in self._records:
+                self._remove_record(record)
+
+        for key, (record, snapshot) in transaction.originals.items():
+            if key not in self._records:
+                # Se modificó y luego se eliminó: se restaura al volver a añadirlo
+                record.restore(snapshot)
+                continue
+            if record.category != snapshot.category:
+                self._unindex_category(record, record.category)
+                record.restore(snapshot)
+                self._index_category(record)
+            else:
+                record.restore(snapshot)
+            self._reindex(record)
+
+        if transaction.deleted:
+            self._add_records(list(transaction.deleted.values()))
+            # Recuperar el orden previo; las cargadas después van al final
+            order = [key for key in transaction.order if key in self._records]
+            order_set = set(order)
+            order.extend(key for key in self._records if key not in order_set)
+            self._records = {key: self._records[key] for key in order}
+            # El índice de texto también conserva el orden: se reconstruye al buscar
+            self._search_index = None
+
+    def get_accounts_page(self, sort: str = "platform", limit: int = 50,
+                          cursor: Optional[str] = None, descending: bool = False,
+                          category: Optional[str] = None) -> AccountPage:
+        """
+        Página de cuentas ordenadas por sort ("platform", "category",
+        "created_at" o "updated_at"), opcionalmente de una sola categoría.
+        Para la siguiente se pasa el next_cursor recibido con los mismos sort
+        y descending; la página continúa tras la última cuenta vista aunque
+        haya habido cambios.
+        """
+        query = AccountQuery().sorted_by(sort, descending)
+        if category is not None:
+            query = query.in_categories(category)
+        return self.query(query, limit, cursor)
+    
+    def compile_query(self, query: AccountQuery, limit: Optional[int] = None) -> QueryPlan:
+        """Plan de ejecución de la consulta (carga las categorías que necesita)"""
+        if query.categories is None:
+            self.ensure_all_loaded()
+        else:
+            for category in query.categories:
+                self.ensure_category_loaded(category)
+        sources = QuerySources(self._records, self._category_index,
+                               self._text_index, self._sorted_index)
+        return compile_query(query, sources, limit)
+    
+    def query(self, query: AccountQuery, limit: Optional[int] = None,
+              cursor: Optional[str] = None) -> AccountPage:
+        """
+        Cuentas que cumplen la consulta, en su orden. Con limit, retorna una
+        página y el cursor de la siguiente (como get_accounts_page).
+        """
+        if limit is not None and limit < 1:
+            raise ValueError("limit debe ser mayor que 0")
+        records, next_cursor = self.compile_query(query, limit).execute(limit, cursor)
+        return AccountPage(_to_accounts(records), next_cursor)
+    
+    def _sorted_index(self, sort: str) -> SortedIndex:
+        index = self._sorted_indexes.get(sort)
+        if index is None:
+            index = self._sorted_indexes[sort] = SortedIndex(sort, self._records.values())
+        return index
+    
+    def _text_index(self) -> TrigramIndex:
+        if self._search_index is None:
+            self._search_index = TrigramIndex(self._records.values())
+        return self._search_index
     
-    def search_accounts(self, query: str) -> List[Account]:
-        """Busca cuentas por texto en plataforma o usuario/email"""
-        query = query.lower()
-        return [acc for acc in self.accounts 
-                if query in acc.platform.lower() or 
-                   query in acc.email_or_username.lower()]
+    def search_accounts(self, query: str, category: Optional[str] = None) -> List[Account]:
+        """
+        Busca cuentas por texto en plataforma o usuario/email.
+        Con category, solo dentro de esa categoría.
+        """
+        if category is not None:
+            within = self._category_records(category)
+            return _to_accounts(self._text_index().search(query, within) if query else within)
+        self.ensure_all_loaded()
+        return _to_accounts(self._text_index().search(query) if query else self._records.values())
+    
+    def fuzzy_search(self, query: str, limit: int = 20,
+                     category: Optional[str] = None) -> List[Account]:
+        """
+        Búsqueda tolerante a errores en plataforma, usuario, categoría y notas.
+        Retorna las `limit` cuentas con mejor puntuación, de mayor a menor.
+        """
+        if category is not None:
+            within = self._category_records(category)
+            results = self._text_index().search_fuzzy(query, limit, within)
+        else:
+            self.ensure_all_loaded()
+            results = self._text_index().search_fuzzy(query, limit)
+        return [record.to_account() for _, record in results]
     
     def suggest_strong_password(self, length: int = 16) -> str:
         """Sugiere una contraseña fuerte"""
@@ -94,19 +856,143 @@ class AccountManager:
     
     def get_all_categories(self) -> List[str]:
         """Obtiene todas las categorías únicas"""
-        categories = set(acc.category for acc in self.accounts)
-        return sorted(list(categories))
+        if not self._fully_loaded:
+            categories = {next(iter(members.values())).category
+                          for members in self._category_index.values()}
+            categories.update(self.backend.categories())
+            return sorted(categories)
+        if self._sorted_categories is None:
+            # Se muestra la categoría con la grafía de su primera cuenta
+            self._sorted_categories = sorted(next(iter(members.values())).category
+                                             for members in self._category_index.values())
+        return list(self._sorted_categories)
+    
+    def _fingerprint_pending(self):
+        """
+        Completa las huellas que faltan antes de consultar reutilizaciones.
+        Con persistence_worker se calculan en ese hilo al cargar y aquí solo
+        se recogen; sin él se calculan aquí, una sola vez.
+        """
+        if self.persistence_worker is not None:
+            self.collect_fingerprints()
+            return
+        self.ensure_all_loaded()
+        pending = self._take_pending_fingerprints()
+        if pending:
+            self._apply_fingerprints(_compute_fingerprints(self.crypto, pending))
+    
+    def _take_pending_fingerprints(self) -> List[AccountRecord]:
+        """Registros sin huella que aún no se están calculando (los marca como en curso)"""
+        pending = [record for key, record in self._unfingerprinted.items()
+                   if record.encrypted_password is not None
+                   and key not in self._fingerprints_in_progress]
+        self._fingerprints_in_progress.update(id(record) for record in pending)
+        return pending
+    
+    def _schedule_fingerprints(self):
+        """
+        Encola en persistence_worker el cálculo de las huellas que faltan
+        (bóvedas anteriores): descifrar toda la bóveda no bloquea la interfaz.
+        """
+        if self.persistence_worker is None:
+            return
+        pending = self._take_pending_fingerprints()
+        if pending:
+            self.persistence_worker.submit("calcular huellas de contraseñas",
+                                           self._compute_fingerprints_in_background,
+                                           self.crypto, pending)
+    
+    def _compute_fingerprints_in_background(self, crypto: CryptoContext, records: List[AccountRecord]):
+        """En el hilo de guardado: solo calcula; los índices se tocan en collect_fingerprints"""
+        batch = _compute_fingerprints(crypto, records)
+        with self._fingerprint_lock:
+            self._fingerprint_batches.append(batch)
+    
+    def collect_fingerprints(self) -> bool:
+        """
+        Añade a los índices las huellas calculadas en segundo plano (desde el
+        hilo de la interfaz). Retorna True si cambió algo (reutilizaciones o
+        errores nuevos).
+        """
+        with self._fingerprint_lock:
+            batches, self._fingerprint_batches = self._fingerprint_batches, []
+        changed = False
+        for batch in batches:
+            changed = self._apply_fingerprints(batch) or changed
+        return changed
+    
+    def _apply_fingerprints(self, batch: "_FingerprintBatch") -> bool:
+        """
+        Indexa y guarda las huellas de un lote. Los registros que no se
+        pudieron descifrar dejan de estar pendientes: el error se anota una
+        sola vez en last_errors en lugar de reintentarse en cada consulta.
+        """
+        failed = {error.index for error in batch.errors}
+        computed: List[AccountRecord] = []
+        errors = []
+        for index, (record, token, fingerprint) in enumerate(
+                zip(batch.records, batch.tokens, batch.fingerprints)):
+            self._fingerprints_in_progress.discard(id(record))
+            # Eliminado, recargado o editado mientras se calculaba
+            if self._unfingerprinted.get(id(record)) is not record \
+                    or record.encrypted_password is not token:
+                continue
+            if index in failed:
+                del self._unfingerprinted[id(record)]
+                errors.extend(error for error in batch.errors if error.index == index)
+                continue
+            # Solo la huella: la contraseña no se deja descifrada en memoria
+            record.fingerprint = fingerprint
+            self._unindex_fingerprint(record)
+            self._index_fingerprint(record)
+            computed.append(record)
+        
+        # Se guardan para que la siguiente sesión no tenga que descifrar nada;
+        # las plataformas repetidas no, el almacenamiento no las distingue
+        unique = [record for record in computed
+                  if len(self._platform_index.get(platform_key(record.platform), ())) == 1]
+        if unique:
+            self._persist(f"guardar {len(unique)} huellas", self.backend.put_many, unique)
+            self._after_bulk_persist()
+        self.last_errors.extend(account_errors(batch.records, errors))
+        return bool(computed or errors)
+    
+    def find_reused_passwords(self) -> List[List[Account]]:
+        """
+        Grupos de cuentas que comparten la misma contraseña, de mayor a menor.
+        Compara huellas HMAC: no descifra nada salvo las cuentas que aún no
+        tienen huella (una sola vez; después se guardan con la bóveda).
+        """
+        self._fingerprint_pending()
+        groups = [list(self._fingerprint_groups[fingerprint].values())
+                  for fingerprint in self._reused_fingerprints]
+        groups.sort(key=len, reverse=True)
+        return [_to_accounts(group) for group in groups]
+    
+    def get_password_reuse(self, platform: str) -> List[Account]:
+        """Otras cuentas con la misma contraseña que la de esa plataforma"""
+        record = self._record_by_platform(platform)
+        if record is None:
+            return []
+        self._fingerprint_pending()
+        fingerprint = self._fingerprint_of.get(id(record))
+        group = self._fingerprint_groups.get(fingerprint, {})
+        return _to_accounts(other for other in group.values() if other is not record)
+    
+    @property
+    def reused_password_count(self) -> int:
+        """Contraseñas (con huella) usadas en más de una cuenta"""
+        return len(self._reused_fingerprints)
     
     def get_accounts_summary(self) -> dict:
         """Obtiene un resumen de las cuentas"""
-        summary = {
-            'total': len(self.accounts),
-            'by_category': {}
-        }
-        
-        for category in self.get_all_categories():
-            summary['by_category'][category] = len(
-                self.get_accounts_by_category(category)
-            )
+        if not self._fully_loaded:
+            # El manifiesto tiene los conteos sin cargar los fragmentos
+            by_category = dict(sorted(self.backend.categories().items()))
+            return {'total': sum(by_category.values()), 'by_category': by_category}
         
-        return summary
\ No newline at end of file
+        return {
+            'total': len(self._records),
+            'by_category': {category: len(self._category_index[category.lower()])
+                            for category in self.get_all_categories()}
+        }
\ No newline at end of file
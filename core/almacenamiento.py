@@ -1,10 +1,17 @@
 # core/almacenamiento.py
 import os
 import json
-from typing import List, Dict, Optional
+import time
+import atexit
+import threading
+from struct import error as struct_error
+from typing import Callable, List, Dict, Iterable, NamedTuple, Optional, Tuple, Union
 from pathlib import Path
-from core.seguridad import encrypt_data_fernet, decrypt_data_fernet 
+from core.seguridad import CryptoContext, CryptoItemError, generate_data_key, wrap_data_key, unwrap_data_key
+from core.formato_binario import encode_vault, decode_vault, is_binary_vault, encode_header, encode_record
+from core.lector_mmap import MappedVaultReader
 from Modelo.models import Account
+from core.registros import AccountRecord, StoredAccount
 
 # Obtener directorio de AppData
 def get_appdata_dir():
@@ -20,27 +27,210 @@ def get_appdata_dir():
 # Configurar rutas
 RUTA_DBWROSER = get_appdata_dir()
 PASSWORDS_DATA_FILE = "passwords_data.json"
+BINARY_DATA_FILE = "passwords_data.vault"
+JOURNAL_FILE = "passwords_data.journal"
+
+# Operaciones válidas en la bitácora (journal) de cuentas
+JOURNAL_OPS = ("create", "update", "delete")
+# Entrada que agrupa varias operaciones: se aplican todas o ninguna
+JOURNAL_BATCH_OP = "batch"
+
+# Formatos del archivo de cuentas: "json" (legible) o "binary" (contenedor compacto).
+# Se usa para bóvedas nuevas; una existente conserva el formato detectado.
+VAULT_FORMAT_JSON = "json"
+VAULT_FORMAT_BINARY = "binary"
+DEFAULT_VAULT_FORMAT = VAULT_FORMAT_JSON
 
 def ensure_db_directory():
     """Asegura que el directorio de la base de datos exista (en AppData)"""
     RUTA_DBWROSER.mkdir(exist_ok=True)
     return True
 
-def save_jsonD(filename: str, data: dict):
+# --- Escritura atómica y agrupación de guardados
+# Los guardados pedidos dentro de esta ventana (segundos) se agrupan en una
+# sola escritura física. Con 0 se escribe inmediatamente.
+SAVE_COALESCE_WINDOW = 0.5
+
+def _write_atomic(full_path: Path, payload: bytes):
     """
-    Guarda datos en un archivo JSON en el directorio DBwroser (AppData).
+    Escribe en un archivo temporal, hace fsync y lo renombra sobre el destino.
+    Si el proceso se interrumpe, el archivo original queda intacto.
     """
+    tmp_path = full_path.with_name(full_path.name + ".tmp")
+    with open(tmp_path, "wb") as file:
+        file.write(payload)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, full_path)
+    _fsync_directory(full_path.parent)
+
+def _fsync_directory(directory: Path):
+    """Persiste las entradas del directorio tras un renombrado (no disponible en Windows)."""
+    if os.name == "posix":
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+class _CoalescingWriter:
+    """Agrupa escrituras pendientes por archivo y las vuelca tras la ventana."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[str, bytes] = {}
+        self._timer: Optional[threading.Timer] = None
+        # Error de la última escritura fallida (se limpia al escribir bien)
+        self.error: Optional[OSError] = None
+
+    def schedule(self, filename: str, payload: bytes, window: float):
+        """Registra la última versión del archivo; solo se escribe la más reciente."""
+        with self._lock:
+            self._pending[filename] = payload
+            if self._timer is None:
+                self._timer = threading.Timer(window, self._flush_in_background)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def discard(self, filename: str):
+        """Descarta un guardado pendiente que ya no debe escribirse."""
+        with self._lock:
+            self._pending.pop(filename, None)
+
+    def pending_payload(self, filename: str) -> Optional[bytes]:
+        with self._lock:
+            return self._pending.get(filename)
+
+    def has_pending(self) -> bool:
+        with self._lock:
+            return bool(self._pending)
+
+    def flush(self):
+        """
+        Escribe inmediatamente todos los archivos pendientes. Si una escritura
+        falla, lo no escrito sigue pendiente (se reintenta en el siguiente
+        flush) y se lanza el OSError.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            pending, self._pending = self._pending, {}
+
+            try:
+                for filename in list(pending):
+                    _write_payload(filename, pending[filename])
+                    del pending[filename]
+            except OSError as e:
+                self._pending = pending
+                self.error = e
+                raise
+            self.error = None
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        except OSError:
+            # Queda pendiente y registrado en self.error: el siguiente
+            # guardado o flush() lo reintenta, y flush() lanza el error
+            pass
+
+def _write_payload(filename: str, payload: bytes):
+    """Escritura física de un archivo del directorio de datos (lanza OSError si falla)."""
     ensure_db_directory()
     full_path = RUTA_DBWROSER / filename
     try:
-        with open(full_path, "w", encoding="utf-8") as file:
-            json.dump(data, file, indent=4, ensure_ascii=False)
-        print(f"✅ Datos guardados correctamente en {filename}") 
-    except IOError as e:
+        _write_atomic(full_path, payload)
+        print(f"✅ Datos guardados correctamente en {filename}")
+    except OSError as e:
         print(f"❌ Error al guardar datos en {full_path}: {e}")
+        raise
+
+_writer = _CoalescingWriter()
+
+def flush():
+    """
+    Fuerza la escritura de los guardados pendientes.
+    Debe llamarse al cerrar sesión o al salir de la aplicación.
+    Lanza OSError si algún archivo no se pudo escribir (sigue pendiente).
+    """
+    _writer.flush()
+
+def has_pending_writes() -> bool:
+    """Indica si hay guardados agrupados que aún no se han escrito."""
+    return _writer.has_pending()
+
+def last_write_error() -> Optional[OSError]:
+    """Error de la última escritura fallida, o None si la última fue bien."""
+    return _writer.error
+
+def _flush_at_exit():
+    try:
+        flush()
+    except OSError:
+        # Ya se mostró el error; no queda nadie que pueda reintentarlo
+        pass
+
+atexit.register(_flush_at_exit)
+
+def save_bytes(filename: str, payload: bytes):
+    """
+    Guarda bytes en un archivo del directorio DBwroser (AppData).
+    La escritura es atómica y se agrupa con otros guardados del mismo
+    archivo pedidos dentro de SAVE_COALESCE_WINDOW.
+    """
+    if SAVE_COALESCE_WINDOW > 0:
+        _writer.schedule(filename, payload, SAVE_COALESCE_WINDOW)
+    else:
+        _writer.flush()
+        _write_payload(filename, payload)
+
+def load_bytes(filename: str) -> Optional[bytes]:
+    """Carga el contenido crudo de un archivo, incluyendo guardados pendientes."""
+    pending = _writer.pending_payload(filename)
+    if pending is not None:
+        return pending
+
+    full_path = RUTA_DBWROSER / filename
+    if not full_path.exists():
+        return None
+    try:
+        with open(full_path, "rb") as file:
+            return file.read()
+    except IOError as e:
+        print(f"❌ Error al cargando datos de {full_path}: {e}")
+        return None
+
+def delete_file(filename: str):
+    """Elimina un archivo del directorio de datos y cualquier guardado pendiente."""
+    _writer.discard(filename)
+    full_path = RUTA_DBWROSER / filename
+    if full_path.exists():
+        full_path.unlink()
+
+def save_jsonD(filename: str, data: dict):
+    """
+    Guarda datos en un archivo JSON en el directorio DBwroser (AppData).
+    """
+    save_bytes(filename, json.dumps(data, indent=4, ensure_ascii=False).encode("utf-8"))
+
+def save_json_now(filename: str, data: dict):
+    """
+    Guarda un JSON en disco antes de retornar, sin agruparlo: primero vuelca
+    los guardados pendientes (para que uno anterior no lo pise después).
+    Para escrituras que deben estar en disco antes de la siguiente.
+    Lanza OSError si no se pudo escribir.
+    """
+    _writer.flush()
+    _write_payload(filename, json.dumps(data, indent=4, ensure_ascii=False).encode("utf-8"))
 
 def load_json_data(filename: str) -> Optional[Dict]:
     """Carga datos de un archivo JSON desde DBwroser (AppData)."""
+    # Un guardado aún no escrito es la versión más reciente
+    pending = _writer.pending_payload(filename)
+    if pending is not None:
+        return json.loads(pending.decode("utf-8"))
+
     full_path = RUTA_DBWROSER / filename
     if full_path.exists():
         try:
@@ -54,63 +244,725 @@ def load_json_data(filename: str) -> Optional[Dict]:
             return None
     return None   
 
-def save_accounts_data(accounts: List[Account], fernet_key: bytes):
+class AccountError(NamedTuple):
+    """Error al procesar una cuenta concreta de la bóveda."""
+    platform: str
+    message: str
+
+def _error_message(error: Exception) -> str:
+    """Texto del error (InvalidToken de Fernet no tiene mensaje)."""
+    return str(error) or type(error).__name__
+
+def account_errors(accounts: List[StoredAccount], crypto_errors: List[CryptoItemError]) -> List[AccountError]:
+    """Errores de un lote de cifrado/descifrado, con la plataforma de cada cuenta."""
+    return [AccountError(accounts[e.index].platform, _error_message(e.error)) for e in crypto_errors]
+
+def _report_errors(action: str, errors: List[AccountError]):
+    """Muestra los errores por cuenta cuando el llamador no los recoge."""
+    for error in errors:
+        print(f"❌ Error al {action} la cuenta {error.platform}: {error.message}")
+
+def _account_fields(account: StoredAccount) -> dict:
+    """Campos de la cuenta salvo la contraseña (con su huella, si la tiene)."""
+    if isinstance(account, AccountRecord):
+        fields = account.to_dict()
+        if account.fingerprint is not None:
+            fields['fingerprint'] = account.fingerprint
+        return fields
+    return account.model_dump(exclude={'password'})
+
+def encrypt_account(account: StoredAccount, crypto: CryptoContext) -> dict:
     """
-    Cifra y guarda los datos de las cuentas en el archivo JSON.
-    Requiere la clave Fernet activa de la sesión.
+    Serializa una cuenta con la contraseña cifrada. Si la contraseña no ha
+    cambiado desde que se cargó, se reutiliza el texto cifrado sin descifrar.
     """
-    ensure_db_directory()
-    
+    encrypted_password = account.encrypted_password
+    if encrypted_password is None:
+        password = account.password
+        encrypted_password = crypto.encrypt(password)
+        # Solo si la contraseña no cambió mientras se cifraba (guardado en segundo plano)
+        if account.password is password:
+            account._encrypted_password = encrypted_password
+
+    account_dict = _account_fields(account)
+    account_dict['password'] = encrypted_password
+    return account_dict
+
+def encrypt_accounts(accounts: List[StoredAccount], crypto: CryptoContext) -> Tuple[List[dict], List[AccountError]]:
+    """
+    Serializa las cuentas cifrando en un solo lote las contraseñas que
+    cambiaron; las demás reutilizan su texto cifrado.
+    """
+    pending = [account for account in accounts if account.encrypted_password is None]
+    passwords = [account.password for account in pending]
+    tokens, crypto_errors = crypto.encrypt_many(passwords)
+    new_tokens = {}
+    for account, password, token in zip(pending, passwords, tokens):
+        if token is None:
+            continue
+        new_tokens[id(account)] = token
+        # Con el guardado en segundo plano la contraseña puede haber cambiado
+        # mientras se cifraba: se escribe este texto cifrado, pero no se guarda
+        # en la cuenta (el siguiente guardado cifrará la nueva)
+        if account.password is password:
+            account._encrypted_password = token
+
+    errors = account_errors(pending, crypto_errors)
     encrypted_data = []
     for account in accounts:
-        try:
-            # Cifrar la contraseña
-            encrypted_password = encrypt_data_fernet(account.password, fernet_key)
-            
-            # Crear diccionario con todos los campos
-            account_dict = account.model_dump()
-            account_dict['password'] = encrypted_password
-            
-            encrypted_data.append(account_dict)
-            
-        except Exception as e:
-            print(f"❌ Error al cifrar la cuenta {account.platform}: {e}")
+        token = new_tokens.get(id(account)) or account.encrypted_password
+        if token is None:
             continue
+        account_dict = _account_fields(account)
+        account_dict['password'] = token
+        encrypted_data.append(account_dict)
+    return encrypted_data, errors
+
+def save_accounts_data(accounts: List[StoredAccount], fernet_key: Union[bytes, CryptoContext],
+                       journal_seq: Optional[int] = None,
+                       errors: Optional[List[AccountError]] = None):
+    """
+    Cifra y guarda los datos de las cuentas en el archivo de la bóveda,
+    en el formato que ya tenga (JSON o contenedor binario).
+    Requiere la clave Fernet activa de la sesión (o su CryptoContext).
+    Si se indica journal_seq, el snapshot registra hasta qué entrada de la
+    bitácora incluye, para que no se vuelva a aplicar al cargar.
+    Las cuentas que no se pudieron cifrar se añaden a `errors`; si no se
+    pasa la lista, se muestran por consola.
+    """
+    ensure_db_directory()
+    crypto = CryptoContext.of(fernet_key)
 
-    save_jsonD(PASSWORDS_DATA_FILE, {"accounts": encrypted_data})
+    encrypted_data, encrypt_errors = encrypt_accounts(accounts, crypto)
+    if errors is not None:
+        errors.extend(encrypt_errors)
+    else:
+        _report_errors("cifrar", encrypt_errors)
+
+    _write_vault(encrypted_data, journal_seq)
     print("✅ Cuentas guardadas y cifradas exitosamente.")
 
-def load_accounts_data(fernet_key: bytes) -> List[Account]:
+def _account_from_dict(encrypted_account_dict: dict, crypto: CryptoContext) -> AccountRecord:
+    """
+    Reconstruye una cuenta a partir de su diccionario cifrado.
+    La contraseña se descifra en el primer acceso.
+    """
+    if not encrypted_account_dict.get('password'):
+        raise ValueError("contraseña vacía")
+    return AccountRecord.from_encrypted(encrypted_account_dict, crypto.decrypt)
+
+def accounts_from_records(records: Iterable[dict], crypto: CryptoContext,
+                          errors: List[AccountError]) -> List[AccountRecord]:
+    """
+    Convierte diccionarios cifrados en cuentas con descifrado perezoso.
+    Los registros inválidos se añaden a `errors`.
+    """
+    accounts = []
+    for encrypted_account_dict in records:
+        try:
+            accounts.append(_account_from_dict(encrypted_account_dict, crypto))
+        except Exception as e:
+            errors.append(AccountError(encrypted_account_dict.get('platform', 'Desconocida'), _error_message(e)))
+    return accounts
+
+def _decrypt_accounts(accounts: List[AccountRecord], crypto: CryptoContext) -> Tuple[List[AccountRecord], List[AccountError]]:
+    """Descifra en lote las contraseñas; descarta las cuentas que fallen."""
+    tokens = [account.encrypted_password for account in accounts]
+    passwords, crypto_errors = crypto.decrypt_many(tokens)
+
+    decrypted_accounts = []
+    for account, password in zip(accounts, passwords):
+        if password is not None:
+            account.cache_decrypted_password(password)
+            decrypted_accounts.append(account)
+    return decrypted_accounts, account_errors(accounts, crypto_errors)
+
+class LoadedVault(NamedTuple):
+    """Resultado de load_vault."""
+    accounts: List[AccountRecord]
+    # Última secuencia de bitácora (snapshot o entradas posteriores)
+    journal_seq: int
+    # Entradas de la bitácora aún no incluidas en el snapshot
+    journal_pending: int
+
+def load_vault(fernet_key: Union[bytes, CryptoContext], lazy: bool = True,
+               errors: Optional[List[AccountError]] = None) -> LoadedVault:
     """
-    Carga y descifra los datos de las cuentas desde el archivo JSON.
-    Requiere la clave Fernet activa de la sesión.
+    Carga los datos de las cuentas desde el archivo de la bóveda (detectando
+    su formato). Después aplica las entradas de la bitácora posteriores al
+    snapshot. El archivo se lee una sola vez, también para el estado de la
+    bitácora.
+    Con lazy=True las contraseñas no se descifran hasta que se consultan;
+    con lazy=False se descifran todas al cargar, en un solo lote.
+    Requiere la clave Fernet activa de la sesión (o su CryptoContext).
+    Las cuentas que no se pudieron leer se añaden a `errors`; si no se
+    pasa la lista, se muestran por consola.
     """
     ensure_db_directory()
+    crypto = CryptoContext.of(fernet_key)
+    load_errors: List[AccountError] = []
+
+    encrypted_accounts, snapshot_seq = _read_vault()
+    journal_records = load_journal_records(after_seq=snapshot_seq)
+    last_seq = max([snapshot_seq] + [record.get("seq", 0) for record in journal_records])
+
+    if encrypted_accounts is None and not journal_records:
+        print("ℹ️  No se encontraron datos de cuentas.")
+        return LoadedVault([], last_seq, 0)
+
+    accounts = accounts_from_records(encrypted_accounts or [], crypto, load_errors)
+
+    if journal_records:
+        accounts = _replay_journal(accounts, journal_records, crypto, load_errors)
+
+    if not lazy:
+        accounts, decrypt_errors = _decrypt_accounts(accounts, crypto)
+        load_errors.extend(decrypt_errors)
+
+    if errors is not None:
+        errors.extend(load_errors)
+    else:
+        _report_errors("cargar", load_errors)
+            
+    print(f"✅ {len(accounts)} cuenta(s) cargadas exitosamente.")
+    return LoadedVault(accounts, last_seq, len(journal_records))
+
+def load_accounts_data(fernet_key: Union[bytes, CryptoContext], lazy: bool = True,
+                       errors: Optional[List[AccountError]] = None) -> List[AccountRecord]:
+    """Como load_vault, retornando solo las cuentas."""
+    return load_vault(fernet_key, lazy, errors).accounts
+
+# --- Formato del archivo de cuentas
+def _file_exists(filename: str) -> bool:
+    """Existe en disco o tiene un guardado pendiente."""
+    return _writer.pending_payload(filename) is not None or \
+        (RUTA_DBWROSER / filename).exists()
+
+def _read_prefix(filename: str, size: int) -> bytes:
+    """Lee los primeros bytes de un archivo sin cargarlo completo."""
+    pending = _writer.pending_payload(filename)
+    if pending is not None:
+        return pending[:size]
+    try:
+        with open(RUTA_DBWROSER / filename, "rb") as file:
+            return file.read(size)
+    except OSError:
+        return b""
+
+def detect_vault_format() -> Optional[str]:
+    """
+    Detecta el formato de la bóveda existente por su firma.
+    Retorna None si todavía no hay bóveda.
+    """
+    if is_binary_vault(_read_prefix(BINARY_DATA_FILE, 4)):
+        return VAULT_FORMAT_BINARY
+    if _file_exists(PASSWORDS_DATA_FILE):
+        return VAULT_FORMAT_JSON
+    return None
+
+def _vault_filename() -> Optional[str]:
+    """Nombre del archivo de la bóveda actual, o None si no existe."""
+    vault_format = detect_vault_format()
+    if vault_format == VAULT_FORMAT_BINARY:
+        return BINARY_DATA_FILE
+    if vault_format == VAULT_FORMAT_JSON:
+        return PASSWORDS_DATA_FILE
+    return None
+
+def open_vault_reader() -> Optional[MappedVaultReader]:
+    """
+    Abre la bóveda mapeada en memoria para leer cuentas sueltas bajo demanda.
+    Escribe antes los guardados pendientes. El lector debe cerrarse.
+    """
+    filename = _vault_filename()
+    if filename is None:
+        return None
+    flush()
+    try:
+        return MappedVaultReader(RUTA_DBWROSER / filename)
+    except (OSError, ValueError) as e:
+        print(f"❌ Error al mapear {filename}: {e}")
+        return None
+
+def read_account(platform: str, fernet_key: Union[bytes, CryptoContext]) -> Optional[Account]:
+    """
+    Lee una sola cuenta del snapshot sin cargar la bóveda completa.
+    No aplica la bitácora pendiente.
+    """
+    reader = open_vault_reader()
+    if reader is None:
+        return None
+    with reader:
+        return reader.account(platform, CryptoContext.of(fernet_key).decrypt)
+
+def _read_vault() -> Tuple[Optional[List[dict]], int]:
+    """
+    Lee las cuentas cifradas y la secuencia de bitácora del snapshot.
+    Para cargarlo completo se decodifica de una vez (json.load o el
+    contenedor binario): es mucho más rápido que indexarlo mapeado en
+    memoria, que solo compensa para leer cuentas sueltas (open_vault_reader).
+    Retorna (None, 0) si no hay datos.
+    """
+    filename = _vault_filename()
+    if filename is None:
+        return None, 0
+
+    if filename == BINARY_DATA_FILE:
+        try:
+            return decode_vault(load_bytes(BINARY_DATA_FILE))
+        except (ValueError, struct_error) as e:
+            print(f"❌ Error al decodificar el contenedor {BINARY_DATA_FILE}: {e}")
+            return None, 0
 
     data = load_json_data(PASSWORDS_DATA_FILE)
     if not data or "accounts" not in data:
-        print("ℹ️  No se encontraron datos de cuentas.")
+        return None, 0
+    return data["accounts"], data.get("journal_seq", 0)
+
+def _write_vault(encrypted_accounts: List[dict], journal_seq: Optional[int] = None):
+    """Escribe el snapshot en el formato actual de la bóveda."""
+    vault_format = detect_vault_format() or DEFAULT_VAULT_FORMAT
+    if vault_format == VAULT_FORMAT_BINARY:
+        save_bytes(BINARY_DATA_FILE, encode_vault(encrypted_accounts, journal_seq or 0))
+        return
+
+    data = {"accounts": encrypted_accounts}
+    if journal_seq is not None:
+        data["journal_seq"] = journal_seq
+    save_jsonD(PASSWORDS_DATA_FILE, data)
+
+def convert_vault_to_binary() -> bool:
+    """
+    Migra una bóveda JSON existente al contenedor binario.
+    No necesita la clave: los tokens cifrados se copian tal cual.
+    """
+    if detect_vault_format() != VAULT_FORMAT_JSON:
+        print("ℹ️  No hay una bóveda JSON que convertir.")
+        return False
+
+    flush()
+    data = load_json_data(PASSWORDS_DATA_FILE)
+    if data is None:
+        return False
+
+    payload = encode_vault(data.get("accounts", []), data.get("journal_seq", 0))
+    # Verificar antes de borrar el original
+    decode_vault(payload)
+    _write_payload(BINARY_DATA_FILE, payload)
+    (RUTA_DBWROSER / PASSWORDS_DATA_FILE).unlink()
+    print(f"✅ Bóveda convertida a formato binario ({len(payload)} bytes).")
+    return True
+
+# --- Bitácora (journal) de mutaciones
+def platform_key(platform: str) -> str:
+    """Clave con la que se identifican las cuentas: plataforma sin mayúsculas (casefold)."""
+    return platform.casefold()
+
+def _replay_journal(accounts: List[AccountRecord], records: List[dict], crypto: CryptoContext,
+                    errors: List[AccountError]) -> List[AccountRecord]:
+    """
+    Aplica en orden las entradas de la bitácora sobre las cuentas y retorna
+    la lista resultante. Las posiciones por plataforma se indexan una vez:
+    cada entrada cuesta lo mismo sea cual sea el tamaño de la bóveda.
+    """
+    result: List[Optional[AccountRecord]] = list(accounts)
+    # Plataforma (casefold) -> posiciones en result, en orden (la primera es
+    # la que se actualiza o elimina, como en el resto del almacenamiento)
+    positions: Dict[str, List[int]] = {}
+    for i, account in enumerate(result):
+        positions.setdefault(platform_key(account.platform), []).append(i)
+
+    for record in records:
+        for entry in _journal_entries(record):
+            op = entry.get("op")
+            try:
+                if op == "delete":
+                    matches = positions.get(platform_key(entry["platform"]))
+                    if matches:
+                        # Hueco en lugar de borrar: las demás posiciones siguen valiendo
+                        result[matches.pop(0)] = None
+                    continue
+
+                account = _account_from_dict(entry["account"], crypto)
+                matches = positions.setdefault(platform_key(account.platform), [])
+                if op == "update" and matches:
+                    result[matches[0]] = account
+                else:
+                    matches.append(len(result))
+                    result.append(account)
+            except Exception as e:
+                errors.append(AccountError(f"(bitácora #{record.get('seq')})", _error_message(e)))
+                continue
+    return [account for account in result if account is not None]
+
+def _journal_entries(record: dict) -> List[dict]:
+    """Operaciones de una entrada de la bitácora (varias si es un lote)."""
+    if record.get("op") == JOURNAL_BATCH_OP:
+        return record.get("entries", [])
+    return [record]
+
+def _append_journal(payload: str):
+    """
+    Añade líneas al final de la bitácora y hace fsync. Si la última quedó
+    incompleta (escritura interrumpida) se cierra antes con un salto de
+    línea: si no, la nueva entrada se uniría a ella y también se perdería.
+    """
+    with open(RUTA_DBWROSER / JOURNAL_FILE, "ab+") as file:
+        file.seek(0, os.SEEK_END)
+        if file.tell() > 0:
+            file.seek(-1, os.SEEK_END)
+            if file.read(1) != b"\n":
+                payload = "\n" + payload
+        file.write(payload.encode("utf-8"))
+        file.flush()
+        os.fsync(file.fileno())
+
+def append_journal_record(op: str, account: StoredAccount,
+                          fernet_key: Union[bytes, CryptoContext], seq: int):
+    """
+    Añade una entrada a la bitácora en lugar de reescribir todo el archivo.
+    Solo se cifra la contraseña de la cuenta afectada.
+    """
+    if op not in JOURNAL_OPS:
+        raise ValueError(f"Operación de bitácora no válida: {op}")
+
+    ensure_db_directory()
+    record = {"seq": seq, "op": op}
+    if op == "delete":
+        record["platform"] = account.platform
+    else:
+        record["account"] = encrypt_account(account, CryptoContext.of(fernet_key))
+
+    _append_journal(json.dumps(record, ensure_ascii=False) + "\n")
+
+def append_journal_records(entries: List[Tuple[str, StoredAccount]],
+                           fernet_key: Union[bytes, CryptoContext],
+                           seq: int) -> Tuple[int, List[AccountError]]:
+    """
+    Añade varias operaciones (op, cuenta) a la bitácora como una sola
+    entrada de lote con número de secuencia seq: una línea, así que si la
+    escritura se interrumpe no se aplica ninguna (ver load_journal_records).
+    Las contraseñas cambiadas se cifran en un lote; las cuentas que no se
+    pudieron cifrar se omiten. Retorna (operaciones escritas, errores); con
+    0 no se escribe nada ni se usa seq.
+    """
+    for op, _account in entries:
+        if op not in JOURNAL_OPS:
+            raise ValueError(f"Operación de bitácora no válida: {op}")
+
+    ensure_db_directory()
+    _, errors = encrypt_accounts([account for op, account in entries if op != "delete"],
+                                 CryptoContext.of(fernet_key))
+    batch = []
+    for op, account in entries:
+        entry = {"op": op}
+        if op == "delete":
+            entry["platform"] = account.platform
+        elif account.encrypted_password is None:
+            continue
+        else:
+            entry["account"] = _account_fields(account)
+            entry["account"]["password"] = account.encrypted_password
+        batch.append(entry)
+
+    if batch:
+        record = {"seq": seq, "op": JOURNAL_BATCH_OP, "entries": batch}
+        _append_journal(json.dumps(record, ensure_ascii=False) + "\n")
+    return len(batch), errors
+
+def load_journal_records(after_seq: int = 0) -> List[dict]:
+    """
+    Lee las entradas de la bitácora con número de secuencia mayor que after_seq.
+    Una última línea incompleta (escritura interrumpida) se ignora.
+    """
+    full_path = RUTA_DBWROSER / JOURNAL_FILE
+    if not full_path.exists():
         return []
 
-    decrypted_accounts = []
-    for encrypted_account_dict in data.get("accounts", []):
-        try:
-            # Descifrar la contraseña
-            encrypted_password = encrypted_account_dict.get('password')
-            if encrypted_password:
-                decrypted_password = decrypt_data_fernet(encrypted_password, fernet_key)
-                
-                # Reconstruir el diccionario para el modelo
-                account_data = encrypted_account_dict.copy()
-                account_data['password'] = decrypted_password
-                
-                decrypted_accounts.append(Account(**account_data))
+    records = []
+    try:
+        with open(full_path, "r", encoding="utf-8") as file:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"⚠️  Entrada de bitácora corrupta ignorada en {full_path}")
+                    continue
+                if record.get("seq", 0) > after_seq:
+                    records.append(record)
+    except IOError as e:
+        print(f"❌ Error al leer la bitácora {full_path}: {e}")
+    return records
+
+def truncate_journal(up_to_seq: int):
+    """
+    Elimina de la bitácora las entradas ya incluidas en el snapshot
+    (secuencia <= up_to_seq), conservando las posteriores.
+    """
+    full_path = RUTA_DBWROSER / JOURNAL_FILE
+    if not full_path.exists():
+        return
+
+    remaining = load_journal_records(after_seq=up_to_seq)
+    if not remaining:
+        full_path.unlink()
+        return
+
+    payload = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in remaining)
+    _write_atomic(full_path, payload.encode("utf-8"))
+
+# --- Rotación de la clave de datos
+# Estado de una rotación interrumpida; mientras exista, la rotación se reanuda
+ROTATION_STATE_FILE = "passwords_data.rotation"
+# Sufijo de los archivos ya cifrados con la clave nueva, antes del cambio
+ROTATION_SUFFIX = ".rotating"
+# Cuentas que se descifran, cifran y escriben en cada bloque
+ROTATION_CHUNK_SIZE = 1000
+
+class RotationProgress(NamedTuple):
+    """Avance de una rotación de clave."""
+    done: int
+    total: int
+    # Cuentas procesadas y segundos transcurridos en esta ejecución
+    processed: int
+    elapsed: float
+
+    @property
+    def rate(self) -> float:
+        """Cuentas por segundo en esta ejecución."""
+        return self.processed / self.elapsed if self.elapsed > 0 else 0.0
+
+def print_rotation_progress(progress: RotationProgress):
+    print(f"🔄 Rotación de clave: {progress.done}/{progress.total} cuentas "
+          f"({progress.rate:.0f} cuentas/s)")
+
+def rotation_pending() -> bool:
+    """Indica si hay una rotación de clave interrumpida."""
+    return (RUTA_DBWROSER / ROTATION_STATE_FILE).exists()
+
+def _load_rotation_state() -> Optional[dict]:
+    full_path = RUTA_DBWROSER / ROTATION_STATE_FILE
+    if not full_path.exists():
+        return None
+    with open(full_path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+def _save_rotation_state(state: dict):
+    # Escritura atómica: el estado nunca queda a medias
+    _write_atomic(RUTA_DBWROSER / ROTATION_STATE_FILE, json.dumps(state).encode("utf-8"))
+
+def _discard_rotation():
+    """Borra el estado y los archivos intermedios de la rotación."""
+    for filename in (PASSWORDS_DATA_FILE, BINARY_DATA_FILE, JOURNAL_FILE, ROTATION_STATE_FILE):
+        if filename != ROTATION_STATE_FILE:
+            filename += ROTATION_SUFFIX
+        full_path = RUTA_DBWROSER / filename
+        if full_path.exists():
+            full_path.unlink()
+
+def _source_signature(filename: str) -> dict:
+    """Identifica la versión del archivo de origen (para saber si cambió)."""
+    stat = (RUTA_DBWROSER / filename).stat()
+    return {"file": filename, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def _reencrypt_records(records: List[dict], crypto: CryptoContext,
+                       new_crypto: CryptoContext) -> List[dict]:
+    """
+    Descifra un bloque de cuentas y lo cifra con la clave nueva, con los
+    mismos pasos que load_accounts_data (lazy=False) y save_accounts_data.
+    ValueError si alguna cuenta falla: se perdería al cambiar la clave.
+    """
+    errors: List[AccountError] = []
+    accounts = accounts_from_records(records, crypto, errors)
+    accounts, decrypt_errors = _decrypt_accounts(accounts, crypto)
+    errors.extend(decrypt_errors)
+    if not errors:
+        for account in accounts:
+            password = account.password
+            # Descarta el texto cifrado con la clave anterior
+            account.password = password
+            account.fingerprint = new_crypto.fingerprint(password)
+        encrypted_data, errors = encrypt_accounts(accounts, new_crypto)
+    if errors:
+        details = ", ".join(f"{error.platform}: {error.message}" for error in errors[:5])
+        raise ValueError(f"No se pudieron rotar {len(errors)} cuenta(s) ({details})")
+    return encrypted_data
+
+def _copy_rotated_journal(journal_seq: int, crypto: CryptoContext, new_crypto: CryptoContext) -> int:
+    """
+    Escribe aparte la bitácora posterior al snapshot con las cuentas cifradas
+    con la clave nueva (son pocas: se compacta periódicamente, así que van de
+    una vez). Retorna las cuentas procesadas.
+    """
+    journal_records = load_journal_records(after_seq=journal_seq)
+    journal_accounts = [entry for record in journal_records
+                        for entry in _journal_entries(record) if "account" in entry]
+    if journal_accounts:
+        encrypted_data = _reencrypt_records([entry["account"] for entry in journal_accounts],
+                                            crypto, new_crypto)
+        for entry, account in zip(journal_accounts, encrypted_data):
+            entry["account"] = account
+    if journal_records:
+        payload = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in journal_records)
+        _write_atomic(RUTA_DBWROSER / (JOURNAL_FILE + ROTATION_SUFFIX), payload.encode("utf-8"))
+    return len(journal_accounts)
+
+def _copy_rotated_vault(state: dict, crypto: CryptoContext, new_crypto: CryptoContext,
+                        chunk_size: int, progress: Optional[Callable[[RotationProgress], None]]) -> int:
+    """
+    Escribe la bóveda cifrada con la clave nueva en un archivo aparte, por
+    bloques, guardando el avance tras cada uno. Después prepara la bitácora.
+    Retorna las cuentas procesadas en esta ejecución.
+    """
+    filename = _vault_filename()
+    if filename is None:
+        # Sin snapshot todas las cuentas están en la bitácora
+        processed = _copy_rotated_journal(0, crypto, new_crypto)
+        state.update(phase="switching", vault=None, journal_seq=0, done=processed)
+        _save_rotation_state(state)
+        return processed
+
+    signature = _source_signature(filename)
+    staging_path = RUTA_DBWROSER / (filename + ROTATION_SUFFIX)
+    if state.get("source") != signature or not staging_path.exists():
+        if state.get("done"):
+            print("⚠️  La bóveda cambió desde la rotación interrumpida: se empieza de nuevo.")
+        state.update(source=signature, done=0, offset=0)
+
+    reader = open_vault_reader()
+    if reader is None:
+        raise ValueError(f"No se pudo leer {filename}")
+    with reader, open(staging_path, "r+b" if state["offset"] else "wb") as file:
+        total = len(reader)
+        journal_seq = reader.journal_seq
+        # Lo escrito después del último bloque guardado se descarta
+        file.truncate(state["offset"])
+        file.seek(state["offset"])
+        if state["done"] == 0:
+            if reader.is_binary:
+                file.write(encode_header(journal_seq, total))
             else:
-                print(f"⚠️  Contraseña vacía para: {encrypted_account_dict.get('platform', 'Desconocida')}")
-                
-        except Exception as e:
-            print(f"❌ Error al descifrar cuenta {encrypted_account_dict.get('platform', 'Desconocida')}: {e}")
-            continue
-            
-    print(f"✅ {len(decrypted_accounts)} cuenta(s) cargadas exitosamente.")
-    return decrypted_accounts
\ No newline at end of file
+                file.write(f'{{"journal_seq": {journal_seq}, "accounts": [\n'.encode("utf-8"))
+
+        start = time.perf_counter()
+        processed = 0
+        for first in range(state["done"], total, chunk_size):
+            records = [reader.record(index) for index in range(first, min(first + chunk_size, total))]
+            encrypted_data = _reencrypt_records(records, crypto, new_crypto)
+            if reader.is_binary:
+                payload = b"".join(encode_record(record) for record in encrypted_data)
+            else:
+                payload = ",\n".join(json.dumps(record, ensure_ascii=False) for record in encrypted_data)
+                payload = (",\n" + payload if first else payload).encode("utf-8")
+            file.write(payload)
+            file.flush()
+            os.fsync(file.fileno())
+
+            state.update(done=first + len(records), offset=file.tell())
+            _save_rotation_state(state)
+            processed += len(records)
+            if progress is not None:
+                progress(RotationProgress(state["done"], total, processed, time.perf_counter() - start))
+
+        if not reader.is_binary:
+            file.write(b"\n]}")
+        file.flush()
+        os.fsync(file.fileno())
+
+    journal_processed = _copy_rotated_journal(journal_seq, crypto, new_crypto)
+    state.update(phase="switching", vault=filename, journal_seq=journal_seq,
+                 done=state["done"] + journal_processed)
+    processed += journal_processed
+    _save_rotation_state(state)
+    return processed
+
+def _switch_rotated_vault(state: dict):
+    """Sustituye los archivos por los rotados (se puede repetir sin efecto)."""
+    filename = state.get("vault")
+    if filename is not None:
+        staging_path = RUTA_DBWROSER / (filename + ROTATION_SUFFIX)
+        if staging_path.exists():
+            os.replace(staging_path, RUTA_DBWROSER / filename)
+    journal_staging = RUTA_DBWROSER / (JOURNAL_FILE + ROTATION_SUFFIX)
+    if journal_staging.exists():
+        os.replace(journal_staging, RUTA_DBWROSER / JOURNAL_FILE)
+    else:
+        # Solo quedaban entradas ya incluidas en el snapshot (con la clave anterior)
+        truncate_journal(state.get("journal_seq", 0))
+    _fsync_directory(RUTA_DBWROSER)
+
+def rotate_vault_key(fernet_key: Union[bytes, CryptoContext], new_key: Optional[bytes] = None,
+                     on_switch: Optional[Callable[[bytes], None]] = None,
+                     chunk_size: int = ROTATION_CHUNK_SIZE,
+                     progress: Optional[Callable[[RotationProgress], None]] = print_rotation_progress
+                     ) -> bytes:
+    """
+    Vuelve a cifrar la bóveda (y su bitácora) con una clave de datos nueva,
+    en streaming: las cuentas se leen del archivo mapeado en memoria y se
+    escriben por bloques de chunk_size, así que la memoria no depende del
+    tamaño de la bóveda. Tras cada bloque se guarda el avance; si la
+    rotación se interrumpe, la siguiente llamada con la clave actual la
+    reanuda (con la misma clave nueva, guardada envuelta con la actual).
+
+    Los archivos se sustituyen al final; después se llama a
+    on_switch(clave_nueva), que debe guardar la clave (p. ej. envolverla
+    con la clave maestra). Hasta entonces la bóveda en uso sigue con la
+    clave actual. No debe haber un gestor de cuentas abierto mientras tanto.
+    Solo cubre el archivo de la bóveda y su bitácora: si hay cuentas en
+    SQLite o en fragmentos no rota nada (ValueError). Retorna la clave nueva.
+    """
+    ensure_db_directory()
+    flush()
+    crypto = CryptoContext.of(fernet_key)
+
+    state = _load_rotation_state()
+    if state is not None:
+        if state["new_key_tag"] == crypto.fingerprint_tag:
+            # El cambio ya se hizo (y se guardó la clave); solo faltaba limpiar
+            _discard_rotation()
+            return crypto.fernet_key
+        if state["old_key_tag"] != crypto.fingerprint_tag:
+            raise ValueError("La rotación pendiente corresponde a otra clave")
+        new_key = unwrap_data_key(state["new_key"], crypto.fernet_key)
+        print(f"🔄 Reanudando la rotación de clave ({state.get('done', 0)} cuentas ya rotadas)")
+    else:
+        # backends importa este módulo: se importa aquí
+        from core.backends import stores_with_accounts
+        stores = stores_with_accounts()
+        if stores:
+            raise ValueError("La rotación solo cubre la bóveda en archivo y hay cuentas en: "
+                             + ", ".join(stores))
+        new_key = new_key or generate_data_key()
+        state = {
+            "phase": "copying",
+            "old_key_tag": crypto.fingerprint_tag,
+            "new_key_tag": CryptoContext(new_key).fingerprint_tag,
+            "new_key": wrap_data_key(new_key, crypto.fernet_key),
+            "done": 0,
+            "offset": 0,
+        }
+    new_crypto = CryptoContext(new_key, workers=crypto.workers, use_processes=crypto.use_processes)
+
+    start = time.perf_counter()
+    processed = 0
+    if state["phase"] == "copying":
+        try:
+            processed = _copy_rotated_vault(state, crypto, new_crypto, chunk_size, progress)
+        except ValueError:
+            _discard_rotation()
+            raise
+        finally:
+            new_crypto.close()
+    _switch_rotated_vault(state)
+    if on_switch is not None:
+        on_switch(new_key)
+    _discard_rotation()
+
+    elapsed = time.perf_counter() - start
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    print(f"✅ Clave de la bóveda rotada: {state.get('done', 0)} cuenta(s), "
+          f"{processed} en esta ejecución en {elapsed:.1f} s ({rate:.0f} cuentas/s).")
+    return new_key
\ No newline at end of file
@@ -1,10 +1,13 @@
 # core/autenticacion
 import getpass
+from concurrent.futures import ThreadPoolExecutor
 from Modelo.models import AdminUser
 # Importar las nuevas funciones de seguridad
 from core.seguridad import hash_password_bcrypt, check_password_bcrypt, generate_2fa, \
-                        generate_salt, generate_fernet_key_from_password
-from core.almacenamiento import save_jsonD, load_json_data
+                        generate_salt, derive_fernet_key, calibrate_kdf, kdf_needs_upgrade, \
+                        generate_data_key, wrap_data_key, unwrap_data_key
+from core.almacenamiento import save_jsonD, load_json_data, flush as flush_storage, \
+                        rotate_vault_key, rotation_pending, print_rotation_progress
 from base64 import urlsafe_b64encode, urlsafe_b64decode # Necesario para codificar/decodificar el salt
 
 UserPrincipal = "DBusers.json"
@@ -21,36 +24,45 @@ def generar_Admin():
         print("Creando nuevo usuario administrador...")
         nombre_admin = input("Ingrese su nombre de usuario: ")
         password = getpass.getpass("Ingrese su contraseña maestra: ")
-        
-        hashed_password = hash_password_bcrypt(password)
-        
-        # --- NUEVO: Generar y almacenar el salt para la derivación de clave Fernet ---
-        fernet_salt_bytes = generate_salt() # Genera bytes
-        # Guardamos el salt como string base64 en el JSON
-        fernet_salt_str = urlsafe_b64encode(fernet_salt_bytes).decode('utf-8')
 
         print("\n--- Configuración de Doble Verificación (2FA) ---")
         print("Esta es una contraseña adicional para generar códigos de acceso a sus contraseñas.")
         password_2fa = getpass.getpass("Ingrese una contraseña para la doble verificación (2FA): ")
-        
-        hashed_password_2fa = hash_password_bcrypt(password_2fa)
 
-        nuevo_admin = AdminUser(
-            username=nombre_admin,
-            ContresañUser=hashed_password,
-            password_2fa=hashed_password_2fa,
-            fernet_key_salt=fernet_salt_str # Guardamos el salt aquí
-        )
+        print("Calibrando la derivación de la clave...")
+        nuevo_admin = crear_admin(nombre_admin, password, password_2fa)
 
         save_jsonD(UserPrincipal, nuevo_admin.model_dump())
         print(f"Usuario administrador '{nombre_admin}' creado correctamente con 2FA y seguridad Fernet mejorada.")
     else:
         print(f"El archivo de usuario maestro ya existe.")
 
+def crear_admin(nombre_admin: str, password: str, password_2fa: str) -> AdminUser:
+    """
+    Crea (sin guardarlo) el administrador: hashes bcrypt, salt y parámetros
+    de derivación calibrados en esta máquina, y una clave de datos aleatoria
+    para la bóveda envuelta con la clave derivada de la contraseña maestra.
+    """
+    # --- NUEVO: Generar y almacenar el salt para la derivación de clave Fernet ---
+    fernet_salt_bytes = generate_salt() # Genera bytes
+    # Parámetros de derivación ajustados al tiempo objetivo en esta máquina
+    kdf_params = calibrate_kdf()
+    master_key = derive_fernet_key(password, fernet_salt_bytes, kdf_params)
+
+    return AdminUser(
+        username=nombre_admin,
+        password=hash_password_bcrypt(password),
+        password_2fa=hash_password_bcrypt(password_2fa),
+        # Guardamos el salt como string base64 en el JSON
+        fernet_key_salt=urlsafe_b64encode(fernet_salt_bytes).decode('utf-8'),
+        kdf_params=kdf_params,
+        wrapped_data_key=wrap_data_key(generate_data_key(), master_key)
+    )
+
 def autenticar_admin() -> tuple[AdminUser | None, bytes | None]:
     """
     Intenta autenticar al usuario administrador y, si tiene éxito, deriva
-    y retorna la clave Fernet para la sesión.
+    la clave maestra y retorna la clave Fernet de la bóveda para la sesión.
     Retorna una tupla (AdminUser, fernet_key_bytes) si la autenticación es exitosa,
     (None, None) en caso contrario.
     """
@@ -60,31 +72,181 @@ def autenticar_admin() -> tuple[AdminUser | None, bytes | None]:
         print("No se encontró un usuario administrador. Por favor, créelo primero.")
         return None, None
     
-    admin_user = AdminUser(**user_data)
-
     nombre_ingresado = input("Ingrese su nombre de usuario: ")
     password_ingresada = getpass.getpass("Ingrese su contraseña maestra: ")
 
-    if nombre_ingresado == admin_user.username and \
-       check_password_bcrypt(password_ingresada, admin_user.password):
+    return autenticar_credenciales(nombre_ingresado, password_ingresada, user_data)
+
+def autenticar_credenciales(nombre_ingresado: str, password_ingresada: str,
+                            user_data: dict | None = None) -> tuple[AdminUser | None, bytes | None]:
+    """
+    Autentica con credenciales ya leídas (sin pedirlas por consola); mismo
+    retorno que autenticar_admin. Si el usuario coincide, la verificación
+    bcrypt y la derivación de la clave (PBKDF2) se ejecutan a la vez en dos
+    hilos: ambas liberan el GIL, así que se espera la más lenta y no la suma.
+    La clave derivada se descarta si la contraseña no es correcta.
+
+    La clave derivada (maestra) solo desenvuelve la clave de datos de la
+    bóveda, que es la que se retorna. Los usuarios anteriores y los
+    parámetros de derivación antiguos se actualizan aquí (ver actualizar_kdf).
+    """
+    if user_data is None:
+        user_data = load_json_data(UserPrincipal)
+        if user_data is None:
+            print("No se encontró un usuario administrador. Por favor, créelo primero.")
+            return None, None
+
+    admin_user = AdminUser(**user_data)
+
+    if nombre_ingresado != admin_user.username:
+        print("Usuario o contraseña maestra incorrectos.")
+        return None, None
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        password_ok = pool.submit(check_password_bcrypt, password_ingresada, admin_user.password)
+        derived_key = pool.submit(_derivar_clave_sesion, password_ingresada, admin_user)
+
+        if not password_ok.result():
+            print("Usuario o contraseña maestra incorrectos.")
+            return None, None
         print("¡Autenticación de contraseña maestra exitosa!")
-        
+
         # --- NUEVO: Derivar la clave Fernet ---
         try:
-            # Decodificar el salt de string a bytes
-            fernet_salt_bytes = urlsafe_b64decode(admin_user.fernet_key_salt)
-            # Derivar la clave Fernet usando la contraseña ingresada y el salt guardado
-            fernet_key_for_session = generate_fernet_key_from_password(password_ingresada, fernet_salt_bytes)
+            master_key = derived_key.result()
+            fernet_key_for_session = _clave_de_datos(admin_user, master_key)
             print("Clave Fernet derivada exitosamente para la sesión.")
-            return admin_user, fernet_key_for_session
         except Exception as e:
             print(f"Error al derivar la clave Fernet: {e}")
             print("Puede que el archivo de usuario esté corrupto o el salt no sea válido.")
             return None, None
-    else:
-        print("Usuario o contraseña maestra incorrectos.")
+
+    if rotation_pending():
+        # Una rotación interrumpida se termina antes de abrir la bóveda
+        try:
+            admin_user, fernet_key_for_session = _rotar_clave(admin_user, master_key,
+                                                              fernet_key_for_session)
+        except Exception as e:
+            print(f"❌ No se pudo completar la rotación de clave pendiente: {e}")
+            return None, None
+
+    admin_user = actualizar_kdf(admin_user, password_ingresada, master_key, fernet_key_for_session)
+    return admin_user, fernet_key_for_session
+
+def _derivar_clave_sesion(password: str, admin_user: AdminUser) -> bytes:
+    # Decodificar el salt de string a bytes y derivar la clave Fernet con él
+    fernet_salt_bytes = urlsafe_b64decode(admin_user.fernet_key_salt)
+    return derive_fernet_key(password, fernet_salt_bytes, admin_user.kdf_params)
+
+def _clave_de_datos(admin_user: AdminUser, master_key: bytes) -> bytes:
+    """
+    Clave de datos de la bóveda. Los usuarios anteriores al cifrado
+    envolvente cifraron la bóveda con la clave maestra: esa pasa a ser su
+    clave de datos (así no hay que volver a cifrar nada al migrar).
+    """
+    if admin_user.wrapped_data_key is None:
+        return master_key
+    return unwrap_data_key(admin_user.wrapped_data_key, master_key)
+
+def _guardar_clave_envuelta(admin_user: AdminUser, master_password: str, data_key: bytes,
+                            kdf_params: dict, **changes) -> AdminUser:
+    """
+    Deriva la clave maestra con un salt nuevo y kdf_params, envuelve con ella
+    la clave de datos y guarda el usuario (un solo archivo: el cambio es
+    atómico y no toca la bóveda).
+    """
+    fernet_salt_bytes = generate_salt()
+    master_key = derive_fernet_key(master_password, fernet_salt_bytes, kdf_params)
+    updated_user = admin_user.model_copy(update=dict(
+        changes,
+        fernet_key_salt=urlsafe_b64encode(fernet_salt_bytes).decode('utf-8'),
+        kdf_params=kdf_params,
+        wrapped_data_key=wrap_data_key(data_key, master_key)))
+    save_jsonD(UserPrincipal, updated_user.model_dump())
+    flush_storage()
+    return updated_user
+
+def actualizar_kdf(admin_user: AdminUser, password: str, master_key: bytes,
+                   data_key: bytes) -> AdminUser:
+    """
+    Pasa al usuario a parámetros de derivación calibrados en esta máquina
+    si los suyos son antiguos, y envuelve la clave de datos si aún no lo
+    estaba. Solo se reenvuelve la clave: la bóveda no se vuelve a cifrar.
+    Si algo falla se sigue con el usuario actual (se reintenta en el
+    siguiente login).
+    """
+    try:
+        if kdf_needs_upgrade(admin_user.kdf_params):
+            print("Actualizando los parámetros de derivación de la clave...")
+            kdf_params = calibrate_kdf()
+            updated_user = _guardar_clave_envuelta(admin_user, password, data_key, kdf_params)
+            print(f"✅ Derivación de la clave actualizada a {kdf_params['algorithm']}.")
+            return updated_user
+        if admin_user.wrapped_data_key is None:
+            updated_user = admin_user.model_copy(
+                update={"wrapped_data_key": wrap_data_key(data_key, master_key)})
+            save_jsonD(UserPrincipal, updated_user.model_dump())
+            flush_storage()
+            return updated_user
+    except Exception as e:
+        print(f"⚠️ No se pudo actualizar la derivación de la clave: {e}")
+    return admin_user
+
+def _rotar_clave(admin_user: AdminUser, master_key: bytes, data_key: bytes,
+                 progress=print_rotation_progress) -> tuple[AdminUser, bytes]:
+    """Rota (o reanuda la rotación de) la clave de datos y guarda la nueva envuelta."""
+    updated = [admin_user]
+
+    def guardar_clave(new_key: bytes):
+        updated[0] = admin_user.model_copy(
+            update={"wrapped_data_key": wrap_data_key(new_key, master_key)})
+        save_jsonD(UserPrincipal, updated[0].model_dump())
+        flush_storage()
+
+    new_key = rotate_vault_key(data_key, on_switch=guardar_clave, progress=progress)
+    return updated[0], new_key
+
+def rotar_clave_datos(admin_user: AdminUser, password: str,
+                      progress=print_rotation_progress) -> tuple[AdminUser | None, bytes | None]:
+    """
+    Cambia la clave de datos de la bóveda por una nueva y vuelve a cifrar
+    todas las cuentas (en streaming y reanudable: ver rotate_vault_key).
+    Debe hacerse sin la bóveda abierta. Retorna (usuario, clave nueva) o
+    (None, None) si la contraseña no es correcta o la rotación falla (p. ej.
+    si hay cuentas en SQLite o en fragmentos, que no se pueden rotar).
+    """
+    if not check_password_bcrypt(password, admin_user.password):
+        print("La contraseña maestra no es correcta.")
+        return None, None
+    try:
+        master_key = _derivar_clave_sesion(password, admin_user)
+        data_key = _clave_de_datos(admin_user, master_key)
+        return _rotar_clave(admin_user, master_key, data_key, progress)
+    except Exception as e:
+        print(f"❌ Error al rotar la clave de la bóveda: {e}")
         return None, None
 
+def cambiar_password_maestra(admin_user: AdminUser, password_actual: str,
+                             password_nueva: str) -> AdminUser | None:
+    """
+    Cambia la contraseña maestra. La clave de datos se desenvuelve con la
+    contraseña actual y se vuelve a envolver con la nueva (salt nuevo y
+    parámetros calibrados): no depende del tamaño de la bóveda. Retorna el
+    usuario guardado, o None si la contraseña actual no es correcta.
+    """
+    if not check_password_bcrypt(password_actual, admin_user.password):
+        print("La contraseña maestra actual no es correcta.")
+        return None
+
+    data_key = _clave_de_datos(admin_user, _derivar_clave_sesion(password_actual, admin_user))
+    kdf_params = admin_user.kdf_params
+    if kdf_needs_upgrade(kdf_params):
+        kdf_params = calibrate_kdf()
+    updated_user = _guardar_clave_envuelta(admin_user, password_nueva, data_key, kdf_params,
+                                           password=hash_password_bcrypt(password_nueva))
+    print("✅ Contraseña maestra cambiada.")
+    return updated_user
+
 def verificar_2fa(admin_user: AdminUser) -> bool:
     """
     Verifica la contraseña 2FA para permitir la generación del código.
@@ -95,7 +257,14 @@ def verificar_2fa(admin_user: AdminUser) -> bool:
         return False 
 
     password_2fa_ingresada = getpass.getpass("Ingrese su contraseña para Doble Verificación (2FA): ")
-    
+    return comprobar_password_2fa(admin_user, password_2fa_ingresada)
+
+def comprobar_password_2fa(admin_user: AdminUser, password_2fa_ingresada: str) -> bool:
+    """Como verificar_2fa, con la contraseña 2FA ya leída (sin pedirla por consola)."""
+    if admin_user.password_2fa is None:
+        print("No se ha configurado una contraseña 2FA para este usuario.")
+        return False
+
     if check_password_bcrypt(password_2fa_ingresada, admin_user.password_2fa):
         print("Contraseña 2FA correcta.")
         return True
@@ -0,0 +1,791 @@
+# core/backends.py
+import bisect
+import hashlib
+import secrets
+import sqlite3
+import threading
+from typing import Dict, Iterator, List, Optional, Protocol, Set, Tuple, runtime_checkable
+from core.registros import AccountRecord
+from core.almacenamiento import RUTA_DBWROSER, AccountError, ensure_db_directory, \
+                        save_accounts_data, load_vault, save_jsonD, save_json_now, load_json_data, \
+                        delete_file, encrypt_account, encrypt_accounts, accounts_from_records, \
+                        platform_key, append_journal_record, append_journal_records, \
+                        truncate_journal, \
+                        flush as flush_storage
+from core.seguridad import CryptoContext
+
+SQLITE_DATA_FILE = "passwords_data.sqlite3"
+SHARDS_DIR = "shards"
+SHARD_MANIFEST_FILE = f"{SHARDS_DIR}/manifest.json"
+# La versión 2 del manifiesto añade el mapa plataforma -> fragmento
+SHARD_MANIFEST_VERSION = 2
+
+# --- Interfaz común de almacenamiento
+@runtime_checkable
+class StorageBackend(Protocol):
+    """
+    Operaciones que AccountManager necesita de un almacenamiento.
+    Las cuentas se identifican por plataforma, sin distinguir mayúsculas, y
+    se manejan como registros compactos (AccountRecord).
+    """
+    last_errors: List[AccountError]
+
+    def load_all(self) -> List[AccountRecord]:
+        """Carga todas las cuentas (las contraseñas se descifran al consultarlas)."""
+        ...
+
+    def get(self, platform: str) -> Optional[AccountRecord]:
+        """Busca una cuenta por plataforma."""
+        ...
+
+    def put(self, account: AccountRecord) -> None:
+        """Inserta la cuenta o reemplaza la existente con la misma plataforma."""
+        ...
+
+    def delete(self, platform: str) -> bool:
+        """Elimina la cuenta de esa plataforma. Retorna False si no existía."""
+        ...
+
+    def iter_accounts(self, category: Optional[str] = None) -> Iterator[AccountRecord]:
+        """Recorre las cuentas, opcionalmente solo las de una categoría."""
+        ...
+
+    def put_many(self, accounts: List[AccountRecord]) -> None:
+        """Como put para varias cuentas, con una sola escritura."""
+        ...
+
+    def delete_many(self, platforms: List[str]) -> int:
+        """Como delete para varias plataformas, con una sola escritura. Retorna las eliminadas."""
+        ...
+
+    def apply_batch(self, puts: List[AccountRecord], deletes: List[str]) -> int:
+        """
+        Aplica eliminaciones y luego inserciones/reemplazos con una sola
+        escritura (o transacción). Retorna las cuentas eliminadas.
+        """
+        ...
+
+    def save_all(self, accounts: List[AccountRecord]) -> None:
+        """Reemplaza todo el contenido por la lista dada."""
+        ...
+
+    def flush(self) -> None:
+        """Escribe en disco los cambios pendientes."""
+        ...
+
+# --- Archivo JSON / contenedor binario (con bitácora opcional)
+class JsonFileBackend:
+    """
+    Bóveda en un único archivo (JSON o contenedor binario, ver almacenamiento).
+
+    journaled: si es True, cada cambio se añade a la bitácora en lugar de
+    reescribir todo el archivo; la bitácora se compacta en segundo plano
+    al superar compact_threshold entradas.
+    """
+
+    def __init__(self, crypto: CryptoContext, journaled: bool = False,
+                 compact_threshold: int = 500):
+        self.crypto = crypto
+        self.journaled = journaled
+        self.compact_threshold = compact_threshold
+        self.last_errors: List[AccountError] = []
+        # Cuentas por posición (en orden) y posiciones de cada plataforma
+        # (casefold): get, put y delete no recorren la bóveda. Con plataformas
+        # repetidas, se usa la primera, como en los demás almacenamientos
+        self._accounts: Dict[int, AccountRecord] = {}
+        self._slots: Dict[str, List[int]] = {}
+        self._next_slot = 0
+        self._journal_seq = 0
+        self._journal_pending = 0
+        self._journal_lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_seq = 0
+        self._compaction_thread: Optional[threading.Thread] = None
+
+    def load_all(self) -> List[AccountRecord]:
+        """Carga todas las cuentas desde el almacenamiento (snapshot + bitácora)"""
+        self.last_errors = []
+        accounts, self._journal_seq, self._journal_pending = \
+            load_vault(self.crypto, errors=self.last_errors)
+        self._reset_accounts(accounts)
+        self._snapshot_seq = self._journal_seq - self._journal_pending
+        return accounts
+
+    def _reset_accounts(self, accounts: List[AccountRecord]):
+        """Reemplaza todas las cuentas y reconstruye el índice por plataforma"""
+        self._accounts = {}
+        self._slots = {}
+        self._next_slot = 0
+        for account in accounts:
+            self._append(account)
+
+    def _append(self, account: AccountRecord) -> int:
+        slot = self._next_slot
+        self._next_slot += 1
+        self._accounts[slot] = account
+        self._slots.setdefault(platform_key(account.platform), []).append(slot)
+        return slot
+
+    def _first_slot(self, platform: str) -> Optional[int]:
+        slots = self._slots.get(platform_key(platform))
+        return slots[0] if slots else None
+
+    def _remove_slot(self, key: str, slot: int) -> AccountRecord:
+        slots = self._slots[key]
+        slots.remove(slot)
+        if not slots:
+            del self._slots[key]
+        return self._accounts.pop(slot)
+
+    def _account_list(self) -> List[AccountRecord]:
+        return list(self._accounts.values())
+
+    def get(self, platform: str) -> Optional[AccountRecord]:
+        slot = self._first_slot(platform)
+        return self._accounts[slot] if slot is not None else None
+
+    def put(self, account: AccountRecord):
+        with self._journal_lock:
+            slot = self._first_slot(account.platform)
+            if slot is None:
+                self._append(account)
+            else:
+                self._accounts[slot] = account
+        self._persist("update", account)
+
+    def delete(self, platform: str) -> bool:
+        with self._journal_lock:
+            slot = self._first_slot(platform)
+            if slot is None:
+                return False
+            account = self._remove_slot(platform_key(platform), slot)
+        self._persist("delete", account)
+        return True
+
+    def put_many(self, accounts: List[AccountRecord]):
+        self.apply_batch(accounts, [])
+
+    def delete_many(self, platforms: List[str]) -> int:
+        return self.apply_batch([], platforms)
+
+    def apply_batch(self, puts: List[AccountRecord], deletes: List[str]) -> int:
+        # Para deshacer el lote si no se guarda: (plataforma, posición, cuenta
+        # anterior o None si la posición es nueva), sin copiar la bóveda
+        undo: List[Tuple[str, int, Optional[AccountRecord]]] = []
+        removed = []
+        with self._journal_lock:
+            for key in dict.fromkeys(platform_key(platform) for platform in deletes):
+                # Como en delete, solo la primera cuenta de cada plataforma
+                slots = self._slots.get(key)
+                if slots:
+                    slot = slots[0]
+                    account = self._remove_slot(key, slot)
+                    removed.append(account)
+                    undo.append((key, slot, account))
+            for account in puts:
+                slot = self._first_slot(account.platform)
+                if slot is None:
+                    slot = self._append(account)
+                    undo.append((platform_key(account.platform), slot, None))
+                else:
+                    undo.append((platform_key(account.platform), slot, self._accounts[slot]))
+                    self._accounts[slot] = account
+        entries = [("delete", account) for account in removed]
+        entries.extend(("update", account) for account in puts)
+        if entries:
+            try:
+                self._persist_many(entries)
+            except Exception:
+                # No se guardó: las cuentas vuelven a estar como antes del lote
+                with self._journal_lock:
+                    self._undo_batch(undo)
+                raise
+        return len(removed)
+
+    def _undo_batch(self, undo: List[Tuple[str, int, Optional[AccountRecord]]]):
+        for key, slot, previous in reversed(undo):
+            if previous is None:
+                self._remove_slot(key, slot)
+                continue
+            if slot not in self._accounts:
+                bisect.insort(self._slots.setdefault(key, []), slot)
+            self._accounts[slot] = previous
+        # Las posiciones restauradas vuelven a su lugar en el orden
+        self._accounts = dict(sorted(self._accounts.items()))
+
+    def iter_accounts(self, category: Optional[str] = None) -> Iterator[AccountRecord]:
+        for account in self._account_list():
+            if category is None or account.category.lower() == category.lower():
+                yield account
+
+    def save_all(self, accounts: List[AccountRecord]):
+        """Guarda todas las cuentas en el almacenamiento"""
+        with self._snapshot_lock, self._journal_lock:
+            self._reset_accounts(list(accounts))
+            self._write_snapshot()
+
+    def _write_snapshot(self):
+        """Reescribe el archivo con las cuentas actuales (con ambos locks tomados)"""
+        self.last_errors = []
+        save_accounts_data(self._account_list(), self.crypto,
+                           journal_seq=self._journal_seq, errors=self.last_errors)
+        if self._journal_pending:
+            # La bitácora solo se recorta con el snapshot ya escrito en
+            # disco: si la escritura falla, flush lanza el OSError y la
+            # bitácora se conserva intacta
+            flush_storage()
+            truncate_journal(self._journal_seq)
+        self._snapshot_seq = self._journal_seq
+        self._journal_pending = 0
+
+    def _rewrite(self):
+        """Sin bitácora, cada cambio reescribe el archivo completo"""
+        with self._snapshot_lock, self._journal_lock:
+            self._write_snapshot()
+
+    def _persist(self, op: str, account: AccountRecord):
+        """Persiste un cambio: en la bitácora si está activa, o reescribiendo todo"""
+        if not self.journaled:
+            self._rewrite()
+            return
+
+        with self._journal_lock:
+            self._journal_seq += 1
+            append_journal_record(op, account, self.crypto, self._journal_seq)
+            self._journal_pending += 1
+            needs_compaction = self._journal_pending >= self.compact_threshold
+
+        if needs_compaction:
+            self.compact_journal_async()
+
+    def _persist_many(self, entries: List[Tuple[str, AccountRecord]]):
+        """Persiste varios cambios con una sola escritura"""
+        if not self.journaled:
+            self._rewrite()
+            return
+
+        with self._journal_lock:
+            # Un lote es una sola entrada de la bitácora: se aplica entero o nada
+            written, self.last_errors = append_journal_records(entries, self.crypto,
+                                                               self._journal_seq + 1)
+            if written:
+                self._journal_seq += 1
+                self._journal_pending += 1
+            needs_compaction = self._journal_pending >= self.compact_threshold
+
+        if needs_compaction:
+            self.compact_journal_async()
+
+    def compact_journal_async(self) -> Optional[threading.Thread]:
+        """Integra la bitácora en el snapshot en un hilo en segundo plano"""
+        if self._compaction_thread and self._compaction_thread.is_alive():
+            return self._compaction_thread
+
+        with self._journal_lock:
+            # Copia superficial: las actualizaciones modifican los objetos originales
+            accounts_copy = [account.copy() for account in self._accounts.values()]
+            seq = self._journal_seq
+
+        self._compaction_thread = threading.Thread(
+            target=self._compact_journal,
+            args=(accounts_copy, seq)
+        )
+        self._compaction_thread.start()
+        return self._compaction_thread
+
+    def _compact_journal(self, accounts: List[AccountRecord], seq: int):
+        """Escribe el snapshot hasta seq y recorta la bitácora"""
+        try:
+            with self._snapshot_lock:
+                # Un guardado completo posterior ya incluye estos cambios
+                if seq <= self._snapshot_seq:
+                    return
+                save_accounts_data(accounts, self.crypto, journal_seq=seq)
+                # Si el snapshot no llega a disco, flush lanza el error y la
+                # bitácora no se recorta (sigue siendo la copia de los cambios)
+                flush_storage()
+                self._snapshot_seq = seq
+                with self._journal_lock:
+                    truncate_journal(seq)
+                    self._journal_pending = self._journal_seq - seq
+        except Exception as e:
+            print(f"❌ Error al compactar la bitácora: {e}")
+
+    def wait_for_compaction(self, timeout: Optional[float] = None):
+        """Espera a que termine una compactación en curso"""
+        if self._compaction_thread:
+            self._compaction_thread.join(timeout)
+
+    def flush(self):
+        self.wait_for_compaction()
+        flush_storage()
+
+# --- SQLite (una fila por cuenta)
+class SqliteBackend:
+    """
+    Bóveda en SQLite con una fila por cuenta e índices por plataforma y
+    categoría: las búsquedas puntuales y las ediciones individuales no
+    tocan el resto de la bóveda. Las contraseñas se guardan cifradas.
+    """
+
+    COLUMNS = ("platform", "email_or_username", "password", "category",
+               "notes", "created_at", "updated_at", "fingerprint")
+
+    def __init__(self, crypto: CryptoContext, filename: str = SQLITE_DATA_FILE):
+        ensure_db_directory()
+        self.crypto = crypto
+        self.last_errors: List[AccountError] = []
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(RUTA_DBWROSER / filename),
+                                     check_same_thread=False)
+        self._create_schema()
+
+    def _create_schema(self):
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS accounts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    platform TEXT NOT NULL,
+                    platform_key TEXT NOT NULL,
+                    email_or_username TEXT NOT NULL,
+                    password TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    category_key TEXT NOT NULL,
+                    notes TEXT,
+                    created_at TEXT,
+                    updated_at TEXT,
+                    fingerprint TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_accounts_platform ON accounts(platform_key);
+                CREATE INDEX IF NOT EXISTS idx_accounts_category ON accounts(category_key);
+            """)
+            # Bóvedas creadas antes de guardar las huellas de las contraseñas
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(accounts)")}
+            if "fingerprint" not in columns:
+                self._conn.execute("ALTER TABLE accounts ADD COLUMN fingerprint TEXT")
+
+    def _row_to_account(self, row) -> AccountRecord:
+        return AccountRecord.from_encrypted(dict(zip(self.COLUMNS, row)), self.crypto.decrypt)
+
+    @staticmethod
+    def _data_to_row(data: dict) -> tuple:
+        """Fila a partir del diccionario con la contraseña ya cifrada"""
+        return (data['platform'], platform_key(data['platform']),
+                data['email_or_username'], data['password'],
+                data['category'], data['category'].lower(), data['notes'],
+                data['created_at'], data['updated_at'], data.get('fingerprint'))
+
+    def _select(self, where: str = "", params: tuple = ()):
+        query = f"SELECT {', '.join(self.COLUMNS)} FROM accounts {where} ORDER BY id"
+        with self._lock:
+            return self._conn.execute(query, params).fetchall()
+
+    def load_all(self) -> List[AccountRecord]:
+        self.last_errors = []
+        return [self._row_to_account(row) for row in self._select()]
+
+    def get(self, platform: str) -> Optional[AccountRecord]:
+        rows = self._select("WHERE platform_key = ?", (platform_key(platform),))
+        return self._row_to_account(rows[0]) if rows else None
+
+    def _upsert(self, row: tuple):
+        cursor = self._conn.execute("""
+            UPDATE accounts SET platform = ?, platform_key = ?, email_or_username = ?,
+                password = ?, category = ?, category_key = ?, notes = ?,
+                created_at = ?, updated_at = ?, fingerprint = ?
+            WHERE id = (SELECT id FROM accounts WHERE platform_key = ? ORDER BY id LIMIT 1)
+        """, row + (row[1],))
+        if cursor.rowcount == 0:
+            self._conn.execute("""
+                INSERT INTO accounts (platform, platform_key, email_or_username, password,
+                    category, category_key, notes, created_at, updated_at, fingerprint)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, row)
+
+    def _delete_first(self, platform: str) -> bool:
+        cursor = self._conn.execute("""
+            DELETE FROM accounts
+            WHERE id = (SELECT id FROM accounts WHERE platform_key = ? ORDER BY id LIMIT 1)
+        """, (platform_key(platform),))
+        return cursor.rowcount > 0
+
+    def put(self, account: AccountRecord):
+        row = self._data_to_row(encrypt_account(account, self.crypto))
+        with self._lock, self._conn:
+            self._upsert(row)
+
+    def put_many(self, accounts: List[AccountRecord]):
+        self.apply_batch(accounts, [])
+
+    def delete(self, platform: str) -> bool:
+        with self._lock, self._conn:
+            return self._delete_first(platform)
+
+    def delete_many(self, platforms: List[str]) -> int:
+        return self.apply_batch([], platforms)
+
+    def apply_batch(self, puts: List[AccountRecord], deletes: List[str]) -> int:
+        # Cifrar en un lote; las cuentas que fallen no se escriben
+        encrypted_data, self.last_errors = encrypt_accounts(puts, self.crypto)
+        rows = [self._data_to_row(data) for data in encrypted_data]
+        with self._lock, self._conn:
+            removed = sum(self._delete_first(platform) for platform in deletes)
+            for row in rows:
+                self._upsert(row)
+        return removed
+
+    def iter_accounts(self, category: Optional[str] = None) -> Iterator[AccountRecord]:
+        if category is None:
+            rows = self._select()
+        else:
+            rows = self._select("WHERE category_key = ?", (category.lower(),))
+        for row in rows:
+            yield self._row_to_account(row)
+
+    def save_all(self, accounts: List[AccountRecord]):
+        # Cifrar en un lote; las cuentas que fallen no se escriben
+        encrypted_data, self.last_errors = encrypt_accounts(accounts, self.crypto)
+        rows = [self._data_to_row(data) for data in encrypted_data]
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM accounts")
+            self._conn.executemany("""
+                INSERT INTO accounts (platform, platform_key, email_or_username, password,
+                    category, category_key, notes, created_at, updated_at, fingerprint)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+
+    def flush(self):
+        # Cada operación se confirma en su propia transacción
+        pass
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+# --- Fragmentos por categoría
+class ShardedBackend:
+    """
+    Bóveda repartida en un archivo cifrado por categoría, más un manifiesto
+    con los fragmentos, su número de cuentas y en qué fragmento está cada
+    plataforma. Cada fragmento se carga la primera vez que se pide su
+    categoría (buscar una plataforma solo carga el suyo) y al guardar solo
+    se reescriben los fragmentos modificados.
+
+    Los fragmentos nunca se sobrescriben: cada guardado los escribe con un
+    nombre nuevo y el manifiesto (escrito de forma atómica) es el punto de
+    confirmación. Si el proceso se interrumpe antes, el manifiesto anterior
+    sigue apuntando a los fragmentos anteriores, intactos.
+    """
+
+    # AccountManager puede cargar las categorías de una en una
+    supports_partial_load = True
+
+    def __init__(self, crypto: CryptoContext):
+        ensure_db_directory()
+        (RUTA_DBWROSER / SHARDS_DIR).mkdir(exist_ok=True)
+        self.crypto = crypto
+        self.last_errors: List[AccountError] = []
+        self._lock = threading.RLock()
+        self._manifest = load_json_data(SHARD_MANIFEST_FILE) or \
+            {"version": SHARD_MANIFEST_VERSION, "shards": {}, "platforms": {}}
+        self._shards: Dict[str, List[AccountRecord]] = {}
+        self._dirty: Set[str] = set()
+        if "platforms" not in self._manifest:
+            self._index_platforms()
+        # Plataforma (casefold) -> fragmento; se guarda en el manifiesto
+        self._platform_shard: Dict[str, str] = self._manifest["platforms"]
+        self._remove_orphan_shards()
+
+    def _index_platforms(self):
+        """
+        Construye el mapa de plataformas de un manifiesto anterior (una sola
+        vez: hay que leer todos los fragmentos) y lo guarda.
+        """
+        platforms: Dict[str, str] = {}
+        for key in list(self._manifest["shards"]):
+            self._ensure_loaded(key)
+            for account in self._shards[key]:
+                platforms.setdefault(platform_key(account.platform), key)
+        self._manifest.update(version=SHARD_MANIFEST_VERSION, platforms=platforms)
+        save_jsonD(SHARD_MANIFEST_FILE, self._manifest)
+
+    @staticmethod
+    def _shard_file(key: str) -> str:
+        # El nombre de la categoría no se usa en la ruta: puede tener cualquier
+        # carácter. El sufijo aleatorio da un archivo nuevo en cada guardado
+        category_hash = hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+        return f"{SHARDS_DIR}/{category_hash}-{secrets.token_hex(4)}.json"
+
+    def _remove_orphan_shards(self):
+        """
+        Elimina los fragmentos que el manifiesto no referencia: los nuevos de
+        un guardado interrumpido antes del manifiesto, o los anteriores que no
+        se llegaron a borrar después.
+        """
+        referenced = {info["file"] for info in self._manifest["shards"].values()}
+        referenced.add(SHARD_MANIFEST_FILE)
+        for path in (RUTA_DBWROSER / SHARDS_DIR).iterdir():
+            filename = f"{SHARDS_DIR}/{path.name}"
+            if filename not in referenced and path.suffix in (".json", ".tmp"):
+                try:
+                    path.unlink()
+                except OSError:
+                    # Se reintenta al abrir de nuevo el almacenamiento
+                    pass
+
+    def categories(self) -> Dict[str, int]:
+        """Categorías y número de cuentas según el manifiesto, sin cargar fragmentos."""
+        with self._lock:
+            counts = {info["category"]: info["count"]
+                      for key, info in self._manifest["shards"].items()
+                      if key not in self._shards}
+            for key, accounts in self._shards.items():
+                if accounts:
+                    counts[accounts[0].category] = len(accounts)
+            return counts
+
+    def is_loaded(self, category: str) -> bool:
+        return category.lower() in self._shards
+
+    def _ensure_loaded(self, key: str):
+        if key in self._shards:
+            return
+        accounts: List[AccountRecord] = []
+        info = self._manifest["shards"].get(key)
+        if info:
+            data = load_json_data(info["file"]) or {}
+            accounts = accounts_from_records(data.get("accounts", []), self.crypto,
+                                             self.last_errors)
+        self._shards[key] = accounts
+
+    def load_category(self, category: str) -> List[AccountRecord]:
+        """Carga (si hace falta) y retorna las cuentas de una categoría."""
+        with self._lock:
+            key = category.lower()
+            self._ensure_loaded(key)
+            return list(self._shards[key])
+
+    def load_all(self) -> List[AccountRecord]:
+        with self._lock:
+            for key in list(self._manifest["shards"]):
+                self._ensure_loaded(key)
+            return [account for accounts in self._shards.values() for account in accounts]
+
+    def _find_shard(self, platform: str) -> Optional[str]:
+        """Fragmento de la plataforma (cargándolo si hace falta) o None si no existe."""
+        key = self._platform_shard.get(platform_key(platform))
+        if key is not None:
+            self._ensure_loaded(key)
+        return key
+
+    def category_of(self, platform: str) -> Optional[str]:
+        """Categoría de la cuenta de esa plataforma según el manifiesto, sin cargar fragmentos."""
+        with self._lock:
+            key = self._platform_shard.get(platform_key(platform))
+            if key is None:
+                return None
+            shard = self._shards.get(key)
+            if shard:
+                return shard[0].category
+            return self._manifest["shards"][key]["category"]
+
+    def get(self, platform: str) -> Optional[AccountRecord]:
+        with self._lock:
+            key = self._find_shard(platform)
+            if key is None:
+                return None
+            wanted = platform_key(platform)
+            return next((account for account in self._shards[key]
+                         if platform_key(account.platform) == wanted), None)
+
+    def _remove(self, key: str, wanted: str) -> Optional[AccountRecord]:
+        shard = self._shards[key]
+        for i, account in enumerate(shard):
+            if platform_key(account.platform) == wanted:
+                self._dirty.add(key)
+                return shard.pop(i)
+        return None
+
+    def put(self, account: AccountRecord):
+        with self._lock:
+            self._put_locked(account)
+            self._write_dirty()
+
+    def put_many(self, accounts: List[AccountRecord]):
+        self.apply_batch(accounts, [])
+
+    def _put_locked(self, account: AccountRecord):
+        key = account.category.lower()
+        wanted = platform_key(account.platform)
+        self._ensure_loaded(key)
+
+        # Si cambió de categoría, sale del fragmento anterior
+        previous_key = self._find_shard(account.platform)
+        if previous_key is not None and previous_key != key:
+            self._remove(previous_key, wanted)
+
+        shard = self._shards[key]
+        if previous_key == key:
+            for i, existing in enumerate(shard):
+                if platform_key(existing.platform) == wanted:
+                    shard[i] = account
+                    break
+            else:
+                shard.append(account)
+        else:
+            shard.append(account)
+        self._platform_shard[wanted] = key
+        self._dirty.add(key)
+
+    def delete(self, platform: str) -> bool:
+        with self._lock:
+            removed = self._delete_locked(platform)
+            self._write_dirty()
+            return removed
+
+    def delete_many(self, platforms: List[str]) -> int:
+        return self.apply_batch([], platforms)
+
+    def apply_batch(self, puts: List[AccountRecord], deletes: List[str]) -> int:
+        with self._lock:
+            self.last_errors = []
+            removed = sum(self._delete_locked(platform) for platform in deletes)
+            for account in puts:
+                self._put_locked(account)
+            self._write_dirty()
+            return removed
+
+    def _delete_locked(self, platform: str) -> bool:
+        key = self._find_shard(platform)
+        if key is None:
+            return False
+        wanted = platform_key(platform)
+        self._remove(key, wanted)
+        del self._platform_shard[wanted]
+        return True
+
+    def iter_accounts(self, category: Optional[str] = None) -> Iterator[AccountRecord]:
+        accounts = self.load_all() if category is None else self.load_category(category)
+        yield from accounts
+
+    def save_all(self, accounts: List[AccountRecord]):
+        with self._lock:
+            self.last_errors = []
+            old_keys = set(self._manifest["shards"]) | set(self._shards)
+            self._shards = {}
+            self._platform_shard = self._manifest["platforms"] = {}
+            for account in accounts:
+                key = account.category.lower()
+                self._shards.setdefault(key, []).append(account)
+                self._platform_shard[platform_key(account.platform)] = key
+            for key in old_keys - set(self._shards):
+                self._shards[key] = []
+            self._dirty = set(self._shards)
+            self._write_dirty()
+
+    def _write_dirty(self):
+        """
+        Escribe los fragmentos modificados con nombres nuevos, confirma el
+        cambio reemplazando el manifiesto y solo entonces borra los
+        fragmentos anteriores. Si una escritura falla (OSError) el manifiesto
+        en disco no cambia y los fragmentos siguen pendientes de guardar.
+        """
+        if not self._dirty:
+            return
+        shards_info = dict(self._manifest["shards"])
+        written: List[str] = []
+        replaced: List[str] = []
+        try:
+            for key in self._dirty:
+                shard = self._shards.get(key, [])
+                previous = shards_info.get(key)
+                if previous:
+                    replaced.append(previous["file"])
+                if not shard:
+                    shards_info.pop(key, None)
+                    continue
+
+                encrypted_data, errors = encrypt_accounts(shard, self.crypto)
+                self.last_errors.extend(errors)
+                filename = self._shard_file(key)
+                save_json_now(filename, {"category": shard[0].category, "accounts": encrypted_data})
+                written.append(filename)
+                shards_info[key] = {
+                    "category": shard[0].category,
+                    "file": filename,
+                    "count": len(encrypted_data),
+                }
+            manifest = dict(self._manifest, shards=shards_info)
+            save_json_now(SHARD_MANIFEST_FILE, manifest)
+        except OSError:
+            # Sin confirmar: los fragmentos nuevos no los referencia nadie
+            # (si no se pueden borrar, se eliminan al abrir de nuevo)
+            for filename in written:
+                try:
+                    delete_file(filename)
+                except OSError:
+                    pass
+            raise
+
+        self._manifest = manifest
+        for key in self._dirty:
+            if not self._shards.get(key):
+                self._shards.pop(key, None)
+        self._dirty = set()
+        for filename in replaced:
+            try:
+                delete_file(filename)
+            except OSError:
+                # Queda huérfano; se elimina al abrir de nuevo el almacenamiento
+                pass
+
+    def flush(self):
+        flush_storage()
+
+# --- Selección del almacenamiento
+BACKENDS = {
+    "json": JsonFileBackend,
+    "sqlite": SqliteBackend,
+    "sharded": ShardedBackend,
+}
+
+def create_backend(kind: str, crypto: CryptoContext, **options) -> StorageBackend:
+    """Crea el almacenamiento indicado ("json", "sqlite" o "sharded")."""
+    try:
+        backend_class = BACKENDS[kind]
+    except KeyError:
+        raise ValueError(f"Almacenamiento no soportado: {kind}")
+    return backend_class(crypto, **options)
+
+def stores_with_accounts() -> List[str]:
+    """
+    Almacenamientos con cuentas aparte del archivo de la bóveda ("sqlite" o
+    "sharded"). La rotación de la clave de datos solo cubre ese archivo y su
+    bitácora: las demás quedarían cifradas con la clave descartada.
+    """
+    stores = []
+    sqlite_path = RUTA_DBWROSER / SQLITE_DATA_FILE
+    if sqlite_path.exists():
+        conn = sqlite3.connect(str(sqlite_path))
+        try:
+            if conn.execute("SELECT EXISTS (SELECT 1 FROM accounts)").fetchone()[0]:
+                stores.append("sqlite")
+        except sqlite3.OperationalError:
+            # Sin tabla de cuentas: no hay nada cifrado
+            pass
+        finally:
+            conn.close()
+    manifest = load_json_data(SHARD_MANIFEST_FILE)
+    if manifest and manifest.get("shards"):
+        stores.append("sharded")
+    return stores
+
+def copy_accounts(source: StorageBackend, target: StorageBackend) -> int:
+    """
+    Copia todas las cuentas de un almacenamiento a otro (p. ej. de la bóveda
+    JSON a SQLite). Los textos cifrados se copian sin descifrar.
+    """
+    accounts = source.load_all()
+    target.save_all(accounts)
+    target.flush()
+    return len(accounts)
\ No newline at end of file
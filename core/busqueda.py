@@ -0,0 +1,419 @@
+# core/busqueda.py
+import re
+import heapq
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from core.registros import StoredAccount
+
+NGRAM_SIZE = 3
+# Campos en los que se busca y su peso en la búsqueda aproximada. La búsqueda
+# por subcadena solo usa los SUBSTRING_FIELDS primeros (plataforma y usuario).
+# La categoría no se indexa por trigramas: tiene pocos valores distintos y se
+# puntúa una vez por valor.
+FIELD_WEIGHTS = (("platform", 3.0), ("email_or_username", 2.0), ("notes", 0.5))
+CATEGORY_WEIGHT = 1.0
+SUBSTRING_FIELDS = 2
+
+# Puntuación por tipo de coincidencia dentro de un campo
+SCORE_EXACT = 1.0
+SCORE_PREFIX = 0.9
+SCORE_WORD_PREFIX = 0.8
+SCORE_SUBSTRING = 0.6
+SCORE_FUZZY_PREFIX = 0.5
+SCORE_FUZZY = 0.4
+SCORE_PER_TYPO = 0.1
+# Abreviatura (letras en orden desde el inicio de una palabra: "nfx" en
+# "netflix"); solo en los SUBSTRING_FIELDS, en textos largos casi todo coincide
+SCORE_ABBREVIATION = 0.25
+# Fracción que suman los demás campos coincidentes además del mejor
+OTHER_FIELDS_BONUS = 0.1
+# Candidatos aproximados que se puntúan por cada resultado pedido
+FUZZY_CANDIDATES_PER_RESULT = 10
+
+_WORD = re.compile(r"\w+")
+
+def _starts_word(text: str, query: str) -> bool:
+    """Indica si query aparece en text al inicio de una palabra."""
+    position = text.find(query)
+    while position > 0:
+        if not text[position - 1].isalnum():
+            return True
+        position = text.find(query, position + 1)
+    return position == 0
+
+def _ngrams(text: str) -> Set[str]:
+    return {text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)}
+
+def max_typos(query: str) -> int:
+    """Errores tolerados según la longitud de la consulta."""
+    if len(query) < NGRAM_SIZE:
+        return 0
+    return 1 if len(query) <= 5 else 2
+
+def _edit_rows(query: str, text: str, anywhere: bool) -> Iterator[List[int]]:
+    """
+    Filas de la distancia de edición entre query y los prefijos de text,
+    una por carácter de text. Es la distancia de alineamiento óptimo
+    (Damerau): dos letras contiguas intercambiadas cuentan como un error.
+    Con anywhere, la coincidencia puede empezar en cualquier posición.
+    """
+    before: Optional[List[int]] = None
+    previous = list(range(len(query) + 1))
+    previous_char = None
+    for j, char in enumerate(text, 1):
+        current = [0 if anywhere else j]
+        for i, query_char in enumerate(query, 1):
+            cost = min(previous[i] + 1, current[i - 1] + 1,
+                       previous[i - 1] + (query_char != char))
+            if before is not None and i > 1 and query_char == previous_char \
+                    and query[i - 2] == char:
+                cost = min(cost, before[i - 2] + 1)
+            current.append(cost)
+        yield current
+        before, previous, previous_char = previous, current, char
+
+def _prefix_distance(query: str, text: str, limit: int) -> int:
+    """Distancia de edición mínima entre query y algún prefijo de text."""
+    best = len(query)
+    previous_min = 0
+    for current in _edit_rows(query, text[:len(query) + limit], False):
+        best = min(best, current[-1])
+        # Una transposición mira dos filas atrás: se para cuando ambas se pasan
+        current_min = min(current)
+        if current_min > limit and previous_min > limit:
+            break
+        previous_min = current_min
+    return best
+
+def _substring_distance(query: str, text: str, limit: int) -> int:
+    """Distancia de edición mínima entre query y alguna subcadena de text."""
+    best = len(query)
+    for current in _edit_rows(query, text, True):
+        best = min(best, current[-1])
+        if best == 0:
+            break
+    return best
+
+def _abbreviates(query: str, text: str) -> bool:
+    """
+    Indica si query abrevia text: sus letras aparecen en orden y la primera
+    al inicio de una palabra (p. ej. "nfx" en "netflix").
+    """
+    position = text.find(query[0])
+    while position >= 0:
+        if position == 0 or not text[position - 1].isalnum():
+            rest = iter(text[position + 1:])
+            if all(char in rest for char in query[1:]):
+                return True
+        position = text.find(query[0], position + 1)
+    return False
+
+def score_field(query: str, text: str, typos: int, abbreviations: bool = False) -> float:
+    """
+    Puntuación (0 si no coincide) de la consulta contra un campo en minúsculas.
+    Las consultas de menos de NGRAM_SIZE caracteres solo coinciden al inicio
+    de una palabra. Con abbreviations (y typos), también como abreviatura.
+    """
+    if not text:
+        return 0.0
+    if text == query:
+        return SCORE_EXACT
+    if text.startswith(query):
+        return SCORE_PREFIX
+    if query in text:
+        if _starts_word(text, query):
+            return SCORE_WORD_PREFIX
+        return SCORE_SUBSTRING if len(query) >= NGRAM_SIZE else 0.0
+    if typos == 0:
+        return 0.0
+    distance = _prefix_distance(query, text, typos)
+    if distance <= typos:
+        return SCORE_FUZZY_PREFIX - SCORE_PER_TYPO * distance
+    distance = _substring_distance(query, text, typos)
+    if distance <= typos:
+        return SCORE_FUZZY - SCORE_PER_TYPO * distance
+    if abbreviations and " " not in query and _abbreviates(query, text):
+        return SCORE_ABBREVIATION
+    return 0.0
+
+def _combine(scores: Iterable[float]) -> float:
+    scores = [score for score in scores if score > 0]
+    if not scores:
+        return 0.0
+    best = max(scores)
+    return best + OTHER_FIELDS_BONUS * (sum(scores) - best)
+
+class TrigramIndex:
+    """
+    Índice invertido de trigramas, por campo, sobre las cuentas.
+
+    search(): subcadena exacta en plataforma o usuario/email. La consulta se
+    reduce primero a las cuentas que contienen todos sus trigramas y solo
+    esas se verifican. Las consultas más cortas recorren los textos ya
+    normalizados.
+
+    search_fuzzy(): ranking tolerante a errores en plataforma, usuario,
+    categoría y notas que premia las coincidencias al inicio. Primero se
+    puntúan las coincidencias exactas (subcadena, o inicio de palabra si la
+    consulta es corta); si no llegan a `limit`, se añaden las cuentas que más
+    trigramas comparten con la consulta y las que tienen una palabra que
+    empieza como ella (letras intercambiadas o abreviaturas no comparten
+    trigramas), comparadas con distancia de edición o como abreviatura.
+    Los mejores se eligen con un heap, sin ordenar todos los candidatos.
+
+    Debe actualizarse (update) cada vez que cambia un campo de una cuenta.
+    """
+
+    def __init__(self, accounts: Iterable[StoredAccount] = ()):
+        # Por campo: trigrama -> ids y prefijo de palabra (1-2 letras) -> ids
+        self._postings: List[Dict[str, Set[int]]] = [{} for _ in FIELD_WEIGHTS]
+        self._prefixes: List[Dict[str, Set[int]]] = [{} for _ in FIELD_WEIGHTS]
+        # Categoría en minúsculas -> ids
+        self._categories: Dict[str, Set[int]] = {}
+        # id(cuenta) -> (orden, cuenta, textos en minúsculas, categoría).
+        # El diccionario se mantiene en orden de inserción.
+        self._entries: Dict[int, Tuple[int, StoredAccount, Tuple[str, ...], str]] = {}
+        self._next_order = 0
+        for account in accounts:
+            self.add(account)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _keys(text: str) -> Tuple[Set[str], Set[str]]:
+        prefixes = set()
+        for word in _WORD.findall(text):
+            prefixes.add(word[:1])
+            prefixes.add(word[:NGRAM_SIZE - 1])
+        return _ngrams(text), prefixes
+
+    def add(self, account: StoredAccount):
+        if id(account) in self._entries:
+            return
+        self._insert(account, self._next_order)
+        self._next_order += 1
+
+    def _insert(self, account: StoredAccount, order: int):
+        account_id = id(account)
+        texts = tuple((getattr(account, field) or "").lower() for field, _ in FIELD_WEIGHTS)
+        category = (account.category or "").lower()
+        self._entries[account_id] = (order, account, texts, category)
+        for field, text in enumerate(texts):
+            grams, prefixes = self._keys(text)
+            postings, prefix_table = self._postings[field], self._prefixes[field]
+            for gram in grams:
+                postings.setdefault(gram, set()).add(account_id)
+            for prefix in prefixes:
+                prefix_table.setdefault(prefix, set()).add(account_id)
+        self._categories.setdefault(category, set()).add(account_id)
+
+    def _unpost(self, account_id: int, texts: Tuple[str, ...], category: str):
+        for field, text in enumerate(texts):
+            grams, prefixes = self._keys(text)
+            for table, keys in ((self._postings[field], grams),
+                                (self._prefixes[field], prefixes)):
+                for key in keys:
+                    ids = table.get(key)
+                    if ids is not None:
+                        ids.discard(account_id)
+                        if not ids:
+                            del table[key]
+        members = self._categories.get(category)
+        if members is not None:
+            members.discard(account_id)
+            if not members:
+                del self._categories[category]
+
+    def remove(self, account: StoredAccount):
+        entry = self._entries.pop(id(account), None)
+        if entry is not None:
+            self._unpost(id(account), entry[2], entry[3])
+
+    def update(self, account: StoredAccount):
+        """Reindexa una cuenta cuyos campos han cambiado (conserva su orden)."""
+        entry = self._entries.get(id(account))
+        if entry is None:
+            self.add(account)
+            return
+        self._unpost(id(account), entry[2], entry[3])
+        # Reasignar la clave existente conserva su posición en el diccionario
+        self._insert(account, entry[0])
+
+    def _in_order(self, matched: Set[int]) -> List[StoredAccount]:
+        if len(matched) * 8 > len(self._entries):
+            return [entry[1] for account_id, entry in self._entries.items()
+                    if account_id in matched]
+        return [self._entries[account_id][1]
+                for account_id in sorted(matched, key=lambda i: self._entries[i][0])]
+
+    # --- Búsqueda por subcadena
+    def _field_candidates(self, query: str, field: int) -> Set[int]:
+        """Cuentas con todos los trigramas de query en el campo (la consulta debe tener alguno)."""
+        postings = []
+        for gram in _ngrams(query):
+            ids = self._postings[field].get(gram)
+            if not ids:
+                return set()
+            postings.append(ids)
+        # Intersectar empezando por la lista más corta
+        postings.sort(key=len)
+        return set.intersection(*postings)
+
+    def search(self, query: str, within: Optional[Iterable[StoredAccount]] = None) -> List[StoredAccount]:
+        """
+        Cuentas cuya plataforma o usuario/email contienen query (sin distinguir
+        mayúsculas), en orden de inserción. Con within, solo entre esas cuentas
+        y en su orden.
+        """
+        query = query.lower()
+        if not query:
+            return list(within) if within is not None else \
+                   [entry[1] for entry in self._entries.values()]
+
+        matched = self._matched_ids(query)
+        if within is not None:
+            return [account for account in within if id(account) in matched]
+        return self._in_order(matched)
+
+    def _matched_ids(self, query: str) -> Set[int]:
+        if len(query) < NGRAM_SIZE:
+            candidates = self._entries.keys()
+        else:
+            candidates = set().union(*(self._field_candidates(query, field)
+                                       for field in range(SUBSTRING_FIELDS)))
+        matched = set()
+        for account_id in candidates:
+            texts = self._entries[account_id][2]
+            if query in texts[0] or query in texts[1]:
+                matched.add(account_id)
+        return matched
+
+    def matching(self, query: str) -> List[StoredAccount]:
+        """Como search (sin within) pero sin ordenar el resultado."""
+        query = query.lower()
+        if not query:
+            return [entry[1] for entry in self._entries.values()]
+        return [self._entries[account_id][1] for account_id in self._matched_ids(query)]
+
+    def estimate(self, query: str) -> int:
+        """
+        Cota superior de las cuentas que search encontraría, sin verificarlas:
+        por campo, la lista de trigramas más corta de la consulta.
+        """
+        query = query.lower()
+        if len(query) < NGRAM_SIZE:
+            return len(self._entries)
+        grams = _ngrams(query)
+        return sum(min(len(self._postings[field].get(gram, ())) for gram in grams)
+                   for field in range(SUBSTRING_FIELDS))
+
+    # --- Búsqueda aproximada con ranking
+    def _score(self, account_id: int, query: str, typos: int,
+               category_scores: Dict[str, float]) -> Tuple[float, int]:
+        order, _account, texts, category = self._entries[account_id]
+        scores = [weight * score_field(query, text, typos, field < SUBSTRING_FIELDS)
+                  for field, ((_, weight), text) in enumerate(zip(FIELD_WEIGHTS, texts))]
+        scores.append(CATEGORY_WEIGHT * category_scores.get(category, 0.0))
+        return _combine(scores), -order
+
+    def _fuzzy_candidates(self, query: str, exclude: Iterable[int], count: int,
+                          allowed: Optional[Set[int]]) -> List[int]:
+        """Las `count` cuentas (permitidas y no excluidas) que más trigramas comparten con query."""
+        grams = _ngrams(query)
+        hits = Counter()
+        for postings in self._postings:
+            for gram in grams:
+                ids = postings.get(gram)
+                if ids:
+                    hits.update(ids)
+        for account_id in exclude:
+            hits.pop(account_id, None)
+        if allowed is not None:
+            hits = Counter({account_id: count for account_id, count in hits.items()
+                            if account_id in allowed})
+        return [account_id for account_id, _ in hits.most_common(count)]
+
+    def _prefix_candidates(self, query: str, exclude: Set[int], count: int,
+                           allowed: Optional[Set[int]]) -> List[int]:
+        """
+        Hasta `count` cuentas (permitidas y no excluidas) con una palabra de
+        plataforma o usuario que empieza por las dos primeras letras de
+        query, o por la primera si es una abreviatura de ese campo.
+        """
+        found: List[int] = []
+        seen = set(exclude)
+        short_prefix = query[:NGRAM_SIZE - 1]
+        for prefix in (short_prefix, query[:1]):
+            for field in range(SUBSTRING_FIELDS):
+                for account_id in self._prefixes[field].get(prefix, ()):
+                    if account_id in seen or (allowed is not None and account_id not in allowed):
+                        continue
+                    if prefix != short_prefix and \
+                            not _abbreviates(query, self._entries[account_id][2][field]):
+                        continue
+                    seen.add(account_id)
+                    found.append(account_id)
+                    if len(found) >= count:
+                        return found
+        return found
+
+    def search_fuzzy(self, query: str, limit: int = 20,
+                     within: Optional[Iterable[StoredAccount]] = None) -> List[Tuple[float, StoredAccount]]:
+        """
+        Las `limit` cuentas que mejor coinciden con query, como (puntuación,
+        cuenta) de mayor a menor; a igual puntuación, en orden de inserción.
+        """
+        query = " ".join(query.lower().split())
+        if not query or limit <= 0:
+            return []
+        typos = max_typos(query)
+        allowed = {id(account) for account in within} if within is not None else None
+
+        # Primero las coincidencias exactas, sin calcular distancias de edición;
+        # cada cuenta solo se puntúa en los campos donde es candidata
+        best: Dict[int, float] = {}
+        total: Dict[int, float] = {}
+        entries = self._entries
+        for field, (_, weight) in enumerate(FIELD_WEIGHTS):
+            if len(query) < NGRAM_SIZE:
+                # Consulta corta: solo inicios de palabra
+                ids = self._prefixes[field].get(query, set())
+            else:
+                ids = self._field_candidates(query, field)
+            if allowed is not None:
+                ids = ids & allowed
+            for account_id in ids:
+                score = weight * score_field(query, entries[account_id][2][field], 0)
+                if score > 0:
+                    total[account_id] = total.get(account_id, 0.0) + score
+                    if score > best.get(account_id, 0.0):
+                        best[account_id] = score
+
+        # Las categorías se puntúan una vez por valor distinto
+        for category, ids in self._categories.items():
+            score = CATEGORY_WEIGHT * score_field(query, category, 0)
+            if score > 0:
+                for account_id in ids if allowed is None else ids & allowed:
+                    total[account_id] = total.get(account_id, 0.0) + score
+                    if score > best.get(account_id, 0.0):
+                        best[account_id] = score
+
+        def exact_key(item):
+            account_id, top = item
+            return top + OTHER_FIELDS_BONUS * (total[account_id] - top), -entries[account_id][0]
+
+        ranked = [(exact_key(item), item[0]) for item in
+                  heapq.nlargest(limit, best.items(), key=exact_key)]
+        if typos and len(best) < limit:
+            category_scores = {category: score_field(query, category, typos)
+                               for category in self._categories}
+            count = limit * FUZZY_CANDIDATES_PER_RESULT
+            extra = self._fuzzy_candidates(query, best.keys(), count, allowed)
+            extra += self._prefix_candidates(query, set(best).union(extra), count, allowed)
+            for account_id in extra:
+                key = self._score(account_id, query, typos, category_scores)
+                if key[0] > 0:
+                    ranked.append((key, account_id))
+            ranked = heapq.nlargest(limit, ranked)
+        return [(key[0], entries[account_id][1]) for key, account_id in ranked]
\ No newline at end of file
@@ -0,0 +1,246 @@
+# core/consultas.py
+"""
+Consultas compuestas sobre las cuentas.
+
+AccountQuery combina filtros (todos deben cumplirse): categorías, texto en
+plataforma o usuario/email, rangos de fecha de creación y de modificación y
+si tiene notas, más el orden del resultado. compile_query la convierte en un
+plan que toma los candidatos del índice más selectivo disponible y comprueba
+los demás filtros solo sobre ellos.
+"""
+from datetime import date, datetime
+from typing import Callable, Dict, FrozenSet, List, NamedTuple, Optional, Tuple, Union
+from core.busqueda import TrigramIndex
+from core.ordenacion import GREATEST, SORT_KEYS, SortedIndex, decode_cursor, encode_cursor, timestamp_key
+from core.registros import AccountRecord, datetime_to_int
+
+# Coste relativo de obtener, filtrar y ordenar un candidato frente a
+# comprobar una posición al recorrer el índice del orden pedido
+SORT_COST = 4
+
+DateValue = Union[datetime, date, str]
+# [inicio, fin) en microsegundos; None si el extremo está abierto
+DateRange = Tuple[Optional[int], Optional[int]]
+
+def _to_micros(value: Optional[DateValue]) -> Optional[int]:
+    """Fecha (datetime, date o texto ISO, sin zona horaria) en microsegundos."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            raise ValueError(f"Fecha no válida: {value!r}")
+    elif not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    if value.tzinfo is not None:
+        raise ValueError("Las fechas de las cuentas no tienen zona horaria")
+    return datetime_to_int(value)
+
+def _intersect(current: Optional[DateRange], start: Optional[int], end: Optional[int]) -> DateRange:
+    if current is None:
+        return (start, end)
+    low, high = current
+    if start is not None:
+        low = start if low is None else max(low, start)
+    if end is not None:
+        high = end if high is None else min(high, end)
+    return (low, high)
+
+class AccountQuery(NamedTuple):
+    """
+    Consulta sobre las cuentas. Cada método retorna una consulta nueva con
+    un filtro más:
+
+        AccountQuery().in_categories("correo").matching("gmail").with_notes()
+    """
+    # Categorías en minúsculas (None: todas)
+    categories: Optional[FrozenSet[str]] = None
+    text: str = ""
+    created: Optional[DateRange] = None
+    updated: Optional[DateRange] = None
+    has_notes: Optional[bool] = None
+    sort: str = "platform"
+    descending: bool = False
+
+    def in_categories(self, *categories: str) -> "AccountQuery":
+        """Solo esas categorías; sobre un filtro previo, las comunes a ambos."""
+        wanted = frozenset(category.lower() for category in categories)
+        if self.categories is not None:
+            wanted &= self.categories
+        return self._replace(categories=wanted)
+
+    def matching(self, text: str) -> "AccountQuery":
+        """Texto contenido en la plataforma o el usuario/email (reemplaza el anterior)."""
+        return self._replace(text=text)
+
+    def created_between(self, start: Optional[DateValue] = None,
+                        end: Optional[DateValue] = None) -> "AccountQuery":
+        """Creadas desde start (incluida) hasta end (excluida)."""
+        return self._replace(created=_intersect(self.created, _to_micros(start), _to_micros(end)))
+
+    def updated_between(self, start: Optional[DateValue] = None,
+                        end: Optional[DateValue] = None) -> "AccountQuery":
+        """Modificadas desde start (incluida) hasta end (excluida)."""
+        return self._replace(updated=_intersect(self.updated, _to_micros(start), _to_micros(end)))
+
+    def with_notes(self, has_notes: bool = True) -> "AccountQuery":
+        return self._replace(has_notes=has_notes)
+
+    def sorted_by(self, sort: str, descending: bool = False) -> "AccountQuery":
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Orden no soportado: {sort}")
+        return self._replace(sort=sort, descending=descending)
+
+class QuerySources(NamedTuple):
+    """Índices del gestor que puede usar un plan."""
+    records: Dict[int, AccountRecord]
+    categories: Dict[str, Dict[int, AccountRecord]]
+    text_index: Callable[[], TrigramIndex]
+    sorted_index: Callable[[str], SortedIndex]
+
+Predicate = Callable[[AccountRecord], bool]
+
+class _Access(NamedTuple):
+    """Forma de obtener los candidatos que cumplen un filtro."""
+    name: str
+    estimate: int
+    fetch: Callable[[], List[AccountRecord]]
+
+def _date_filter(field: str, bounds: DateRange) -> Predicate:
+    low, high = bounds
+    def accept(record: AccountRecord) -> bool:
+        value = getattr(record, field)
+        # Las fechas guardadas como texto (con zona horaria) no entran en rangos
+        return (isinstance(value, int) and (low is None or value >= low)
+                and (high is None or value < high))
+    return accept
+
+def _date_access(name: str, index: SortedIndex, bounds: DateRange) -> _Access:
+    low, high = bounds
+    start, stop = index.positions(timestamp_key(low) if low is not None else (1,),
+                                  timestamp_key(high) if high is not None else (1, GREATEST))
+    return _Access(name, max(0, stop - start), lambda: index.records_between(start, stop))
+
+class QueryPlan:
+    """
+    Plan de una consulta: de dónde salen los candidatos (driver), qué filtros
+    se comprueban sobre ellos y cómo se ordenan.
+    """
+
+    def __init__(self, query: AccountQuery, driver: Optional[_Access],
+                 filters: List[Tuple[str, Predicate]], order_index: SortedIndex, prefix: Tuple = ()):
+        self.query = query
+        self.driver = driver
+        self.filters = filters
+        self.order_index = order_index
+        self.prefix = prefix
+
+    def describe(self) -> str:
+        """Resumen legible del plan (para depurar y medir)."""
+        if self.driver is None:
+            source = f"recorrido del orden '{self.query.sort}'"
+            if self.prefix:
+                source += f" (solo {self.prefix[0]!r})"
+        else:
+            source = f"índice {self.driver.name} (~{self.driver.estimate} candidatas)"
+        filters = ", ".join(name for name, _ in self.filters) or "ninguno"
+        return f"{source}; filtros: {filters}; orden: {self.query.sort}"
+
+    def _accept(self) -> Optional[Predicate]:
+        predicates = [predicate for _, predicate in self.filters]
+        if not predicates:
+            return None
+        if len(predicates) == 1:
+            return predicates[0]
+        return lambda record: all(predicate(record) for predicate in predicates)
+
+    def execute(self, limit: Optional[int] = None, cursor: Optional[str] = None
+                ) -> Tuple[List[AccountRecord], Optional[str]]:
+        """
+        Registros de la consulta en orden, hasta limit, a continuación del
+        cursor. Retorna (registros, cursor de la siguiente página o None).
+        """
+        query = self.query
+        after = decode_cursor(cursor, query.sort, query.descending) if cursor else None
+        accept = self._accept()
+
+        if self.driver is None:
+            records, last_key = self.order_index.page(limit or len(self.order_index) or 1, after,
+                                                      query.descending, self.prefix, accept)
+        else:
+            candidates = self.driver.fetch()
+            if accept is not None:
+                candidates = [record for record in candidates if accept(record)]
+            # Solo se ordenan las que cumplen la consulta
+            key = self.order_index.key
+            keyed = sorted(((key(record), record) for record in candidates),
+                           key=lambda pair: pair[0], reverse=query.descending)
+            if after is not None:
+                keyed = [pair for pair in keyed
+                         if (pair[0] < after if query.descending else pair[0] > after)]
+            last_key = None
+            if limit is not None and len(keyed) > limit:
+                keyed = keyed[:limit]
+                last_key = keyed[-1][0]
+            records = [record for _, record in keyed]
+
+        next_cursor = encode_cursor(query.sort, query.descending, last_key) if last_key is not None else None
+        return records, next_cursor
+
+def compile_query(query: AccountQuery, sources: QuerySources,
+                  limit: Optional[int] = None) -> QueryPlan:
+    """
+    Elige el índice con menos candidatos y deja el resto como filtros. Si
+    quedan muchos, recorre el índice del orden pedido filtrando: no hay que
+    ordenar y, con limit, se detiene al llenar la página.
+    """
+    accesses: List[_Access] = []
+    filters: Dict[str, Predicate] = {}
+
+    if query.categories is not None:
+        members = [sources.categories.get(category, {}) for category in query.categories]
+        accesses.append(_Access("categoría", sum(map(len, members)),
+                                lambda: [record for group in members for record in group.values()]))
+        categories = query.categories
+        filters["categoría"] = lambda record: record.category.lower() in categories
+
+    if query.text:
+        text = query.text.lower()
+        index = sources.text_index()
+        accesses.append(_Access("texto", index.estimate(text), lambda: index.matching(text)))
+        filters["texto"] = lambda record: (text in record.platform.lower()
+                                           or text in (record.email_or_username or "").lower())
+
+    for name, field, bounds in (("creación", "created_at", query.created),
+                                ("modificación", "updated_at", query.updated)):
+        if bounds is not None:
+            accesses.append(_date_access(name, sources.sorted_index(field), bounds))
+            filters[name] = _date_filter(f"_{field}", bounds)
+
+    if query.has_notes is not None:
+        # Sin índice: siempre se comprueba sobre los candidatos
+        wanted = query.has_notes
+        filters["notas"] = lambda record: bool(record.notes and record.notes.strip()) == wanted
+
+    order_index = sources.sorted_index(query.sort)
+    driver = min(accesses, key=lambda access: access.estimate) if accesses else None
+    prefix: Tuple = ()
+    if driver is not None and driver.name == "categoría" and query.sort == "category" \
+            and len(query.categories) == 1:
+        # La categoría es un tramo contiguo del orden pedido: no hay que ordenar
+        prefix = (next(iter(query.categories)),)
+        driver = None
+        del filters["categoría"]
+    elif driver is not None:
+        # Posiciones a recorrer hasta reunir limit coincidencias si están repartidas
+        total = len(sources.records)
+        scan_cost = total if limit is None else min(total, limit * total // max(driver.estimate, 1))
+        if scan_cost <= driver.estimate * SORT_COST:
+            driver = None
+
+    if driver is not None:
+        del filters[driver.name]
+    # El texto es el filtro más caro de comprobar: va al final
+    ordered = sorted(filters.items(), key=lambda item: item[0] == "texto")
+    return QueryPlan(query, driver, ordered, order_index, prefix)
\ No newline at end of file
@@ -0,0 +1,123 @@
+# core/formato_binario.py
+"""
+Contenedor binario compacto para el archivo de cuentas.
+
+Estructura (little-endian):
+    Cabecera: MAGIC (4 bytes) | versión (u16) | flags (u16) |
+              journal_seq (u64) | número de registros (u32)
+    Registro: longitud del registro (u32) seguida de los campos en el orden
+              de RECORD_FIELDS. Cada campo es una longitud (u32) y sus bytes;
+              NULL_LENGTH representa None. Los textos van en UTF-8 y la
+              contraseña como bytes crudos del token Fernet (sin base64).
+
+La plataforma va primero para poder leerla sin decodificar el resto.
+Se escribe siempre la última versión; las anteriores se siguen leyendo
+con sus campos (la 1 no guardaba la huella de la contraseña).
+"""
+import struct
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from typing import List, Optional, Tuple
+
+MAGIC = b"WVLT"
+FORMAT_VERSION = 2
+
+HEADER = struct.Struct("<4sHHQI")
+LENGTH = struct.Struct("<I")
+NULL_LENGTH = 0xFFFFFFFF
+
+# Campos de los registros en cada versión del contenedor
+RECORD_FIELDS_BY_VERSION = {
+    1: ("platform", "email_or_username", "category", "notes",
+        "created_at", "updated_at", "password"),
+    2: ("platform", "email_or_username", "category", "notes",
+        "created_at", "updated_at", "password", "fingerprint"),
+}
+RECORD_FIELDS = RECORD_FIELDS_BY_VERSION[FORMAT_VERSION]
+
+class VaultFormatError(ValueError):
+    """El contenido no es un contenedor binario válido."""
+
+def is_binary_vault(payload: bytes) -> bool:
+    """Indica si los bytes empiezan con la firma del contenedor binario."""
+    return payload[:len(MAGIC)] == MAGIC
+
+def _encode_field(value: Optional[bytes]) -> bytes:
+    if value is None:
+        return LENGTH.pack(NULL_LENGTH)
+    return LENGTH.pack(len(value)) + value
+
+def encode_record(record: dict) -> bytes:
+    """Codifica un diccionario de cuenta (contraseña ya cifrada) como registro."""
+    parts = []
+    for field in RECORD_FIELDS:
+        value = record.get(field)
+        if value is None:
+            parts.append(_encode_field(None))
+        elif field == "password":
+            parts.append(_encode_field(urlsafe_b64decode(value)))
+        else:
+            parts.append(_encode_field(value.encode("utf-8")))
+    body = b"".join(parts)
+    return LENGTH.pack(len(body)) + body
+
+def decode_record(buffer, offset: int = 0, length: Optional[int] = None,
+                  version: int = FORMAT_VERSION) -> dict:
+    """
+    Decodifica el cuerpo de un registro que empieza en offset, con los
+    campos de la versión del contenedor. Acepta bytes, memoryview o mmap.
+    """
+    if length is None:
+        (length,) = LENGTH.unpack_from(buffer, offset)
+        offset += LENGTH.size
+    end = offset + length
+
+    record = {}
+    for field in RECORD_FIELDS_BY_VERSION[version]:
+        (size,) = LENGTH.unpack_from(buffer, offset)
+        offset += LENGTH.size
+        if size == NULL_LENGTH:
+            record[field] = None
+            continue
+        raw = bytes(buffer[offset:offset + size])
+        offset += size
+        if field == "password":
+            record[field] = urlsafe_b64encode(raw).decode("utf-8")
+        else:
+            record[field] = raw.decode("utf-8")
+
+    if offset != end:
+        raise VaultFormatError("Longitud de registro inconsistente")
+    return record
+
+def encode_header(journal_seq: int, count: int) -> bytes:
+    """Cabecera del contenedor (para escribirlo por partes, registro a registro)."""
+    return HEADER.pack(MAGIC, FORMAT_VERSION, 0, journal_seq, count)
+
+def encode_vault(records: List[dict], journal_seq: int = 0) -> bytes:
+    """Serializa la lista de cuentas cifradas en el contenedor binario."""
+    header = encode_header(journal_seq, len(records))
+    return header + b"".join(encode_record(record) for record in records)
+
+def read_header(buffer) -> Tuple[int, int, int]:
+    """Valida la cabecera y retorna (versión, journal_seq, número de registros)."""
+    if len(buffer) < HEADER.size:
+        raise VaultFormatError("Archivo demasiado corto para ser un contenedor")
+    magic, version, _flags, journal_seq, count = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise VaultFormatError("Firma del contenedor no reconocida")
+    if version not in RECORD_FIELDS_BY_VERSION:
+        raise VaultFormatError(f"Versión de contenedor no soportada: {version}")
+    return version, journal_seq, count
+
+def decode_vault(payload: bytes) -> Tuple[List[dict], int]:
+    """Deserializa el contenedor y retorna (cuentas cifradas, journal_seq)."""
+    version, journal_seq, count = read_header(payload)
+    view = memoryview(payload)
+    offset = HEADER.size
+    records = []
+    for _ in range(count):
+        (length,) = LENGTH.unpack_from(view, offset)
+        offset += LENGTH.size
+        records.append(decode_record(view, offset, length, version))
+        offset += length
+    return records, journal_seq
\ No newline at end of file
@@ -0,0 +1,142 @@
+# core/lector_mmap.py
+import re
+import mmap
+import json
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from Modelo.models import Account
+from core.formato_binario import HEADER, LENGTH, NULL_LENGTH, \
+                        is_binary_vault, read_header, decode_record
+
+# Un token es una cadena JSON completa (con escapes) o un delimitador de
+# objeto/lista; así las llaves dentro de los textos no alteran la profundidad.
+_JSON_TOKEN = re.compile(rb'"(?:[^"\\]|\\.)*"|[{}\[\]]')
+_JSON_INT = re.compile(rb'\s*:\s*(\d+)')
+_QUOTE = ord('"')
+
+class MappedVaultReader:
+    """
+    Lector de la bóveda mapeada en memoria (JSON o contenedor binario).
+
+    Al abrir solo se construye un índice de desplazamientos de cada cuenta;
+    los registros se decodifican de uno en uno al pedirlos, sin cargar el
+    documento completo como objetos de Python. Debe cerrarse (o usarse con
+    `with`) antes de reescribir el archivo.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # mmap no admite archivos vacíos
+            self._file.close()
+            raise
+        self.is_binary = is_binary_vault(self._mm[:HEADER.size])
+        self.journal_seq = 0
+        self._version = 0
+        self._offsets: List[Tuple[int, int]] = []
+        self._platform_index: Optional[Dict[str, int]] = None
+        if self.is_binary:
+            self._index_binary()
+        else:
+            self._index_json()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if not self._mm.closed:
+            self._mm.close()
+            self._file.close()
+
+    # --- Construcción del índice
+    def _index_binary(self):
+        self._version, self.journal_seq, count = read_header(self._mm)
+        offset = HEADER.size
+        for _ in range(count):
+            (length,) = LENGTH.unpack_from(self._mm, offset)
+            offset += LENGTH.size
+            self._offsets.append((offset, length))
+            offset += length
+
+    def _index_json(self):
+        depth = 0
+        last_key = None
+        in_accounts = False
+        record_start = 0
+        seq_position = None
+
+        for match in _JSON_TOKEN.finditer(self._mm):
+            start = match.start()
+            if self._mm[start] == _QUOTE:
+                if depth == 1:
+                    last_key = match.group()
+                    if last_key == b'"journal_seq"':
+                        seq_position = match.end()
+                continue
+
+            token = self._mm[start:start + 1]
+            if token in (b'{', b'['):
+                depth += 1
+                if depth == 2 and token == b'[' and last_key == b'"accounts"':
+                    in_accounts = True
+                elif depth == 3 and in_accounts and token == b'{':
+                    record_start = start
+            else:
+                if depth == 3 and in_accounts and token == b'}':
+                    self._offsets.append((record_start, match.end() - record_start))
+                elif depth == 2 and in_accounts:
+                    in_accounts = False
+                depth -= 1
+
+        if seq_position is not None:
+            number = _JSON_INT.match(self._mm, seq_position)
+            if number:
+                self.journal_seq = int(number.group(1))
+
+    # --- Acceso a registros
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def record(self, index: int) -> dict:
+        """Decodifica solo el registro indicado (contraseña aún cifrada)."""
+        offset, length = self._offsets[index]
+        if self.is_binary:
+            return decode_record(self._mm, offset, length, self._version)
+        return json.loads(self._mm[offset:offset + length].decode("utf-8"))
+
+    def __iter__(self) -> Iterator[dict]:
+        for index in range(len(self._offsets)):
+            yield self.record(index)
+
+    def _platform_at(self, index: int) -> str:
+        if self.is_binary:
+            # La plataforma es el primer campo: no hace falta decodificar el resto
+            offset, _length = self._offsets[index]
+            (size,) = LENGTH.unpack_from(self._mm, offset)
+            if size == NULL_LENGTH:
+                return ""
+            start = offset + LENGTH.size
+            return self._mm[start:start + size].decode("utf-8")
+        return self.record(index).get("platform") or ""
+
+    def find(self, platform: str) -> Optional[dict]:
+        """Busca una cuenta por plataforma (sin distinguir mayúsculas)."""
+        if self._platform_index is None:
+            self._platform_index = {}
+            for index in range(len(self._offsets)):
+                self._platform_index.setdefault(self._platform_at(index).casefold(), index)
+        index = self._platform_index.get(platform.casefold())
+        return self.record(index) if index is not None else None
+
+    def account(self, platform: str, decryptor: Callable[[str], str]) -> Optional[Account]:
+        """Cuenta de esa plataforma con descifrado perezoso de la contraseña."""
+        record = self.find(platform)
+        if record is None or not record.get("password"):
+            return None
+        return Account.from_encrypted(record, decryptor)
\ No newline at end of file
@@ -0,0 +1,157 @@
+# core/ordenacion.py
+import json
+import base64
+from bisect import bisect_left, bisect_right
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from core.almacenamiento import platform_key
+from core.registros import AccountRecord
+
+class _Greatest:
+    """Mayor que cualquier valor: cierra el rango de las claves con un prefijo."""
+
+    def __lt__(self, other):
+        return False
+
+    def __gt__(self, other):
+        return True
+
+GREATEST = _Greatest()
+
+def timestamp_key(value) -> Tuple:
+    """
+    Clave de una fecha guardada en el registro (enteros en microsegundos).
+    Sin fecha van primero y las que se conservaron como texto, al final.
+    """
+    if value is None:
+        return (0, 0)
+    if isinstance(value, int):
+        return (1, value)
+    return (2, value)
+
+# Orden -> clave del registro (la plataforma desempata; después, el orden de
+# inserción en el índice)
+SORT_KEYS: Dict[str, Callable[[AccountRecord], Tuple]] = {
+    "platform": lambda record: (platform_key(record.platform),),
+    "category": lambda record: (record.category.lower(), platform_key(record.platform)),
+    "created_at": lambda record: timestamp_key(record._created_at) + (platform_key(record.platform),),
+    "updated_at": lambda record: timestamp_key(record._updated_at) + (platform_key(record.platform),),
+}
+
+def encode_cursor(sort: str, descending: bool, key: Tuple) -> str:
+    """Cursor opaco que apunta justo después de la clave dada."""
+    payload = json.dumps([sort, descending, list(key)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str, sort: str, descending: bool) -> Tuple:
+    """Clave del cursor; ValueError si no es válido para este orden."""
+    try:
+        cursor_sort, cursor_descending, key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Cursor no válido: {e}")
+    if cursor_sort != sort or cursor_descending != descending:
+        raise ValueError("El cursor corresponde a otro orden")
+    return tuple(key)
+
+class SortedIndex:
+    """
+    Registros ordenados por una de las claves de SORT_KEYS, en listas
+    paralelas de claves y registros que se mantienen con bisect. Una página
+    cuesta una búsqueda binaria más lo que se recorre, sin ordenar la bóveda.
+
+    Debe actualizarse (update) cada vez que cambia un campo de la clave.
+    """
+
+    def __init__(self, sort: str, records: Iterable[AccountRecord] = ()):
+        self.sort = sort
+        self._key_func = SORT_KEYS[sort]
+        self._next_serial = 0
+        # id(registro) -> clave vigente
+        self._key_of: Dict[int, Tuple] = {}
+        pairs = []
+        for record in records:
+            key = self._new_key(record)
+            self._key_of[id(record)] = key
+            pairs.append((key, record))
+        pairs.sort(key=lambda pair: pair[0])
+        self._keys: List[Tuple] = [key for key, _ in pairs]
+        self._records: List[AccountRecord] = [record for _, record in pairs]
+
+    def _new_key(self, record: AccountRecord, serial: Optional[int] = None) -> Tuple:
+        if serial is None:
+            serial = self._next_serial
+            self._next_serial += 1
+        return self._key_func(record) + (serial,)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def key(self, record: AccountRecord) -> Tuple:
+        """Clave vigente del registro en el índice."""
+        return self._key_of[id(record)]
+
+    def positions(self, low: Tuple, high: Tuple) -> Tuple[int, int]:
+        """Posiciones [inicio, fin) de las claves con low <= clave < high."""
+        return bisect_left(self._keys, low), bisect_left(self._keys, high)
+
+    def records_between(self, start: int, stop: int) -> List[AccountRecord]:
+        return self._records[start:stop]
+
+    def add(self, record: AccountRecord):
+        key = self._new_key(record)
+        self._key_of[id(record)] = key
+        position = bisect_right(self._keys, key)
+        self._keys.insert(position, key)
+        self._records.insert(position, record)
+
+    def remove(self, record: AccountRecord):
+        key = self._key_of.pop(id(record), None)
+        if key is None:
+            return
+        position = bisect_left(self._keys, key)
+        del self._keys[position]
+        del self._records[position]
+
+    def update(self, record: AccountRecord):
+        """Recoloca el registro si cambió su clave (conserva el desempate)."""
+        old_key = self._key_of.get(id(record))
+        if old_key is None:
+            return
+        key = self._new_key(record, old_key[-1])
+        if key == old_key:
+            return
+        self.remove(record)
+        self._key_of[id(record)] = key
+        position = bisect_right(self._keys, key)
+        self._keys.insert(position, key)
+        self._records.insert(position, record)
+
+    def page(self, limit: int, after: Optional[Tuple] = None, descending: bool = False,
+             prefix: Tuple = (), accept: Optional[Callable[[AccountRecord], bool]] = None
+             ) -> Tuple[List[AccountRecord], Optional[Tuple]]:
+        """
+        Hasta `limit` registros a continuación de la clave `after` (o desde el
+        principio). prefix limita a las claves que empiezan así (por ejemplo,
+        una categoría en el orden "category") y accept filtra los demás casos.
+        Retorna (registros, clave del último) o (registros, None) si no hay más.
+        """
+        low = bisect_left(self._keys, prefix) if prefix else 0
+        high = bisect_left(self._keys, prefix + (GREATEST,)) if prefix else len(self._keys)
+        if descending:
+            start = min(high, bisect_left(self._keys, after)) if after is not None else high
+            positions = range(start - 1, low - 1, -1)
+        else:
+            start = max(low, bisect_right(self._keys, after)) if after is not None else low
+            positions = range(start, high)
+
+        found: List[AccountRecord] = []
+        last_key = None
+        for position in positions:
+            record = self._records[position]
+            if accept is not None and not accept(record):
+                continue
+            if len(found) == limit:
+                # Queda al menos uno más: la página tiene continuación
+                return found, last_key
+            found.append(record)
+            last_key = self._keys[position]
+        return found, None
\ No newline at end of file
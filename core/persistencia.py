@@ -0,0 +1,97 @@
+# core/persistencia.py
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Callable, List, NamedTuple, Optional
+
+class PersistenceResult(NamedTuple):
+    """Resultado de una operación de guardado ejecutada en segundo plano."""
+    description: str
+    error: Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+class PersistenceWorker:
+    """
+    Hilo dedicado que ejecuta en orden las operaciones de guardado (cifrado
+    y escritura), para que el hilo de la interfaz no se bloquee.
+
+    Los resultados se acumulan en una cola; la interfaz los recoge con
+    poll_results() desde su propio hilo (p. ej. con root.after), ya que
+    Tkinter no debe tocarse desde otros hilos.
+    """
+
+    def __init__(self):
+        self._tasks: "queue.Queue" = queue.Queue()
+        self._results: "queue.Queue[PersistenceResult]" = queue.Queue()
+        self._lock = threading.Lock()
+        # Se toma para ejecutar cada operación; paused() lo retiene
+        self._run_lock = threading.Lock()
+        self._pending = 0
+        self._thread = threading.Thread(target=self._run, name="persistencia", daemon=True)
+        self._thread.start()
+
+    def submit(self, description: str, operation: Callable, *args, **kwargs):
+        """Encola una operación; retorna de inmediato."""
+        with self._lock:
+            self._pending += 1
+        self._tasks.put((description, operation, args, kwargs))
+
+    def _run(self):
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                self._tasks.task_done()
+                return
+
+            description, operation, args, kwargs = task
+            with self._run_lock:
+                try:
+                    operation(*args, **kwargs)
+                    result = PersistenceResult(description)
+                except Exception as e:
+                    print(f"❌ Error en guardado en segundo plano ({description}): {e}")
+                    result = PersistenceResult(description, e)
+
+            with self._lock:
+                self._pending -= 1
+            self._results.put(result)
+            self._tasks.task_done()
+
+    @property
+    def pending_count(self) -> int:
+        """Operaciones encoladas o en curso."""
+        with self._lock:
+            return self._pending
+
+    def poll_results(self) -> List[PersistenceResult]:
+        """Retorna (sin bloquear) los resultados terminados desde la última llamada."""
+        results = []
+        while True:
+            try:
+                results.append(self._results.get_nowait())
+            except queue.Empty:
+                return results
+
+    def wait_idle(self):
+        """Bloquea hasta que todas las operaciones encoladas hayan terminado."""
+        self._tasks.join()
+
+    @contextmanager
+    def paused(self):
+        """
+        Espera a que terminen las operaciones encoladas y no ejecuta ninguna
+        más hasta salir del bloque (las que se encolen mientras, esperan).
+        Dentro del bloque no se debe llamar a wait_idle si se encoló algo.
+        """
+        self.wait_idle()
+        with self._run_lock:
+            yield
+
+    def stop(self):
+        """Termina el hilo después de procesar lo que quede en la cola."""
+        if self._thread.is_alive():
+            self._tasks.put(None)
+            self._thread.join()
\ No newline at end of file
@@ -0,0 +1,180 @@
+# core/registros.py
+"""
+Representación compacta de las cuentas en memoria.
+
+AccountRecord guarda lo mismo que Modelo.models.Account con __slots__ (sin
+__dict__ ni la maquinaria de pydantic por objeto), las categorías internadas
+y las fechas como enteros (microsegundos desde 1970, sin zona horaria).
+Es la forma en que el gestor y los almacenamientos guardan las cuentas;
+los objetos Account solo se crean al entregarlas fuera del gestor.
+
+Expone los mismos atributos que Account (incluido el descifrado perezoso de
+`password`), así que el código de almacenamiento acepta ambos.
+"""
+from sys import intern
+from datetime import datetime, timedelta
+from typing import Callable, Optional, Union
+from Modelo.models import Account
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+def datetime_to_int(moment: datetime) -> int:
+    """Microsegundos desde 1970 de una fecha sin zona horaria."""
+    return (moment - _EPOCH) // _MICROSECOND
+
+def timestamp_to_int(value: Optional[str]) -> Union[int, str, None]:
+    """
+    Convierte una fecha ISO sin zona horaria en microsegundos desde 1970.
+    Las que no se pueden reconstruir exactamente se conservan como texto.
+    """
+    if value is None:
+        return None
+    try:
+        moment = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return value
+    if moment.tzinfo is not None or moment.isoformat() != value:
+        return value
+    return datetime_to_int(moment)
+
+def int_to_timestamp(value: Union[int, str, None]) -> Optional[str]:
+    """Inversa de timestamp_to_int."""
+    if isinstance(value, int):
+        return (_EPOCH + value * _MICROSECOND).isoformat()
+    return value
+
+class AccountRecord:
+    """Cuenta compacta; ver la documentación del módulo."""
+
+    __slots__ = ("platform", "email_or_username", "_category", "notes",
+                 "_created_at", "_updated_at", "_password",
+                 "_encrypted_password", "_decryptor", "fingerprint")
+
+    def __init__(self, platform: str, email_or_username: str, category: str,
+                 notes: Optional[str] = None, created_at: Optional[str] = None,
+                 updated_at: Optional[str] = None, password: Optional[str] = None,
+                 encrypted_password: Optional[str] = None,
+                 decryptor: Optional[Callable[[str], str]] = None,
+                 fingerprint: Optional[str] = None):
+        self.platform = platform
+        self.email_or_username = email_or_username
+        self.category = category
+        self.notes = notes
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self._password = password
+        self._encrypted_password = encrypted_password
+        self._decryptor = decryptor
+        # Huella HMAC de la contraseña (CryptoContext.fingerprint), o None
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def from_encrypted(cls, data: dict, decryptor: Callable[[str], str]) -> "AccountRecord":
+        """Crea el registro desde el diccionario guardado, sin descifrar la contraseña."""
+        return cls(data.get('platform', ''), data.get('email_or_username', ''),
+                   data.get('category', ''), data.get('notes'), data.get('created_at'), data.get('updated_at'),
+                   encrypted_password=data['password'], decryptor=decryptor,
+                   fingerprint=data.get('fingerprint'))
+
+    @classmethod
+    def from_account(cls, account: Account) -> "AccountRecord":
+        """Convierte una cuenta de pydantic conservando su estado de cifrado."""
+        record = cls(account.platform, account.email_or_username, account.category,
+                     account.notes, account.created_at, account.updated_at,
+                     encrypted_password=account.encrypted_password,
+                     decryptor=account._decryptor)
+        if account.is_decrypted or account.encrypted_password is None:
+            record._password = account.password
+        return record
+
+    def to_dict(self) -> dict:
+        """Campos de la cuenta salvo la contraseña, como en Account.model_dump."""
+        return {
+            'platform': self.platform,
+            'email_or_username': self.email_or_username,
+            'category': self.category,
+            'notes': self.notes,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+        }
+
+    def to_account(self) -> Account:
+        """Crea la cuenta de pydantic que se entrega fuera del gestor."""
+        fields = self.to_dict()
+        if self._password is not None:
+            return Account.model_construct(password=self._password, **fields)
+        # El descifrado se hace (y se guarda) en el registro
+        fields['password'] = self._encrypted_password
+        return Account.from_encrypted(fields, lambda _token: self.password)
+
+    def copy(self) -> "AccountRecord":
+        duplicate = AccountRecord.__new__(AccountRecord)
+        for name in self.__slots__:
+            setattr(duplicate, name, getattr(self, name))
+        return duplicate
+
+    def restore(self, snapshot: "AccountRecord"):
+        """Vuelve a los valores de una copia hecha con copy()."""
+        for name in self.__slots__:
+            setattr(self, name, getattr(snapshot, name))
+
+    # --- Campos con representación compacta
+    @property
+    def category(self) -> str:
+        return self._category
+
+    @category.setter
+    def category(self, value: str):
+        self._category = intern(value) if isinstance(value, str) else value
+
+    @property
+    def created_at(self) -> Optional[str]:
+        return int_to_timestamp(self._created_at)
+
+    @created_at.setter
+    def created_at(self, value: Optional[str]):
+        self._created_at = timestamp_to_int(value)
+
+    @property
+    def updated_at(self) -> Optional[str]:
+        return int_to_timestamp(self._updated_at)
+
+    @updated_at.setter
+    def updated_at(self, value: Optional[str]):
+        self._updated_at = timestamp_to_int(value)
+
+    # --- Contraseña con descifrado perezoso (igual que Account)
+    @property
+    def password(self) -> str:
+        if self._password is None and self._decryptor is not None:
+            self._password = self._decryptor(self._encrypted_password)
+        return self._password
+
+    @password.setter
+    def password(self, value: str):
+        # El texto cifrado guardado y la huella ya no corresponden a la contraseña
+        self._password = value
+        self._encrypted_password = None
+        self._decryptor = None
+        self.fingerprint = None
+
+    def cache_decrypted_password(self, password: str):
+        """Guarda la contraseña ya descifrada sin invalidar el texto cifrado."""
+        self._password = password
+
+    @property
+    def is_decrypted(self) -> bool:
+        """Indica si la contraseña en texto plano está en memoria."""
+        return self._password is not None
+
+    @property
+    def encrypted_password(self) -> Optional[str]:
+        """Contraseña cifrada vigente, o None si hay que volver a cifrarla."""
+        return self._encrypted_password
+
+    def __repr__(self) -> str:
+        return f"AccountRecord(platform={self.platform!r}, category={self.category!r})"
+
+# Lo que aceptan las funciones de almacenamiento
+StoredAccount = Union[Account, AccountRecord]
\ No newline at end of file
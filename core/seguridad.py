@@ -1,11 +1,23 @@
 import os
+import sys
+import ast
+import hmac
 import bcrypt
+import time
 import random
+import hashlib
+import threading
+import multiprocessing
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
 from cryptography.hazmat.backends import default_backend
 from base64 import urlsafe_b64encode, urlsafe_b64decode
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
 
 RUTA_DBWROSER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "DBwroser")
 
@@ -30,7 +42,8 @@ def _ensure_db_directory_exists():
         os.makedirs(RUTA_DBWROSER)
 
 # --- Derivación de Clave Fernet usando PBKDF2HMAC
-def generate_fernet_key_from_password(master_password: str, salt: bytes) -> bytes:
+def generate_fernet_key_from_password(master_password: str, salt: bytes,
+                                      iterations: int = 480000) -> bytes:
     """
     Deriva una clave Fernet a partir de una contraseña maestra y un salt usando PBKDF2HMAC.
     """
@@ -38,12 +51,84 @@ def generate_fernet_key_from_password(master_password: str, salt: bytes) -> byte
         algorithm=hashes.SHA256(),
         length=32,  # Fernet keys are 32 bytes (256 bits)
         salt=salt,
-        iterations=480000, 
+        iterations=iterations,
         backend=default_backend()
     )
     key = urlsafe_b64encode(kdf.derive(master_password.encode('utf-8')))
     return key
 
+# --- Parámetros de derivación (KDF), guardados con el usuario en DBusers.json
+KdfParams = Dict[str, Union[str, int]]
+
+PBKDF2_ALGORITHM = "pbkdf2-sha256"
+SCRYPT_ALGORITHM = "scrypt"
+# Algoritmo de las cuentas nuevas y al que se actualizan las anteriores
+DEFAULT_KDF_ALGORITHM = SCRYPT_ALGORITHM
+# Usuarios creados antes de guardar los parámetros
+LEGACY_KDF_PARAMS: KdfParams = {"algorithm": PBKDF2_ALGORITHM, "iterations": 480000}
+# Tiempo de desbloqueo que busca la calibración en esta máquina
+KDF_TARGET_SECONDS = 0.5
+# Mínimos: una máquina lenta no baja el coste de aquí
+MIN_PBKDF2_ITERATIONS = 480000
+MIN_SCRYPT_N = 2 ** 15
+# n = 2**20 con r = 8 usa 1 GiB de memoria
+MAX_SCRYPT_N = 2 ** 20
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+def derive_fernet_key(master_password: str, salt: bytes, kdf_params: Optional[KdfParams] = None) -> bytes:
+    """
+    Deriva la clave Fernet con el algoritmo y los parámetros guardados
+    (LEGACY_KDF_PARAMS si no hay). ValueError si el algoritmo no se conoce.
+    """
+    params = kdf_params or LEGACY_KDF_PARAMS
+    algorithm = params.get("algorithm")
+    if algorithm == PBKDF2_ALGORITHM:
+        return generate_fernet_key_from_password(master_password, salt, int(params["iterations"]))
+    if algorithm == SCRYPT_ALGORITHM:
+        kdf = Scrypt(salt=salt, length=32, n=int(params["n"]), r=int(params["r"]),
+                     p=int(params["p"]), backend=default_backend())
+        return urlsafe_b64encode(kdf.derive(master_password.encode('utf-8')))
+    raise ValueError(f"Algoritmo de derivación no soportado: {algorithm}")
+
+def _time_derivation(params: KdfParams) -> float:
+    start = time.perf_counter()
+    derive_fernet_key("calibracion", os.urandom(16), params)
+    return time.perf_counter() - start
+
+def calibrate_kdf(algorithm: str = DEFAULT_KDF_ALGORITHM,
+                  target_seconds: float = KDF_TARGET_SECONDS) -> KdfParams:
+    """
+    Elige los parámetros para que derivar la clave tarde unos target_seconds
+    en esta máquina (sin bajar de los mínimos). Mide con el coste mínimo y
+    escala: el tiempo crece en proporción a las iteraciones o a n.
+    """
+    if algorithm == PBKDF2_ALGORITHM:
+        sample = {"algorithm": PBKDF2_ALGORITHM, "iterations": 100000}
+        elapsed = _time_derivation(sample)
+        iterations = int(sample["iterations"] * target_seconds / max(elapsed, 1e-6))
+        # Redondeado a decenas de millar
+        iterations = max(MIN_PBKDF2_ITERATIONS, iterations // 10000 * 10000)
+        return {"algorithm": PBKDF2_ALGORITHM, "iterations": iterations}
+    if algorithm == SCRYPT_ALGORITHM:
+        # n debe ser potencia de 2: se dobla mientras quepa en el objetivo
+        n = MIN_SCRYPT_N
+        elapsed = _time_derivation({"algorithm": SCRYPT_ALGORITHM, "n": n, "r": SCRYPT_R, "p": SCRYPT_P})
+        while n < MAX_SCRYPT_N and elapsed * 2 <= target_seconds:
+            n *= 2
+            elapsed *= 2
+        return {"algorithm": SCRYPT_ALGORITHM, "n": n, "r": SCRYPT_R, "p": SCRYPT_P}
+    raise ValueError(f"Algoritmo de derivación no soportado: {algorithm}")
+
+def kdf_needs_upgrade(kdf_params: Optional[KdfParams]) -> bool:
+    """
+    Indica si los parámetros son de una versión anterior: sin guardar, de
+    otro algoritmo o por debajo de los mínimos actuales.
+    """
+    if not kdf_params or kdf_params.get("algorithm") != DEFAULT_KDF_ALGORITHM:
+        return True
+    return int(kdf_params.get("n", 0)) < MIN_SCRYPT_N or int(kdf_params.get("r", 0)) < SCRYPT_R
+
 def generate_salt(length: int = 16) -> bytes:
     """
     Genera un salt aleatorio para PBKDF2HMAC. Este salt debe ser almacenado
@@ -68,6 +153,210 @@ def decrypt_data_fernet(encrypted_data: str, fernet_key: bytes) -> str:
     cipher = Fernet(fernet_key)
     return cipher.decrypt(encrypted_data.encode('utf-8')).decode('utf-8')
 
+# --- Cifrado envolvente: las cuentas se cifran con una clave de datos
+# aleatoria, guardada cifrada (envuelta) con la clave derivada de la
+# contraseña maestra. Cambiar la contraseña o la derivación solo la reenvuelve.
+def generate_data_key() -> bytes:
+    """Genera una clave de datos (clave Fernet aleatoria) para la bóveda."""
+    return Fernet.generate_key()
+
+def wrap_data_key(data_key: bytes, master_key: bytes) -> str:
+    """Cifra la clave de datos con la clave maestra (token Fernet en texto)."""
+    return Fernet(master_key).encrypt(data_key).decode('utf-8')
+
+def unwrap_data_key(wrapped_data_key: str, master_key: bytes) -> bytes:
+    """Descifra la clave de datos; InvalidToken si la clave maestra no es la correcta."""
+    return Fernet(master_key).decrypt(wrapped_data_key.encode('utf-8'))
+
+# --- Huellas de contraseñas (detección de contraseñas reutilizadas)
+FINGERPRINT_LABEL = b"huella-contrasena-v1"
+# Bytes del HMAC que se conservan en cada huella
+FINGERPRINT_BYTES = 16
+
+def derive_fingerprint_key(fernet_key: bytes) -> bytes:
+    """
+    Subclave HMAC para las huellas de contraseñas, derivada de la clave Fernet
+    de la sesión con una etiqueta fija (la clave de cifrado no se usa directamente).
+    """
+    return hmac.new(urlsafe_b64decode(fernet_key), FINGERPRINT_LABEL, hashlib.sha256).digest()
+
+# --- Contexto de cifrado reutilizable para la sesión
+# Por debajo de este número de elementos un lote se procesa siempre en serie.
+# Medido: Fernet cuesta ~9 µs por elemento en serie; el pool añade ~1 µs por
+# elemento (envío de los bloques) y arrancarlo cuesta 15-30 ms. Por debajo de
+# 20000 elementos la ruta serie tarda menos de 0,2 s y no compensa.
+PARALLEL_MIN_ITEMS = 20000
+# Tamaño mínimo de cada bloque enviado a un worker
+PARALLEL_MIN_CHUNK = 500
+
+class CryptoItemError(NamedTuple):
+    """Error al cifrar/descifrar un elemento de un lote."""
+    index: int
+    error: Exception
+
+def _run_chunk(fernet_key: bytes, operation: str, values: List[str]):
+    """Procesa un bloque en un proceso worker (debe ser una función de módulo)."""
+    context = CryptoContext(fernet_key)
+    return context._apply_many(getattr(context, operation), values)
+
+def _main_module_is_guarded() -> bool:
+    """
+    Indica si el script principal se puede volver a importar sin efectos:
+    con "spawn" cada worker importa de nuevo el módulo __main__, y sin un
+    `if __name__ == "__main__":` a nivel de módulo se ejecutaría el script
+    entero en cada worker. Sin archivo (intérprete interactivo o -c) no hay
+    nada que reimportar; si no se puede leer el archivo, se asume que no.
+    """
+    main_file = getattr(sys.modules.get("__main__"), "__file__", None)
+    if main_file is None:
+        return True
+    try:
+        with open(main_file, "r", encoding="utf-8") as file:
+            tree = ast.parse(file.read())
+    except (OSError, SyntaxError, UnicodeDecodeError, ValueError):
+        return False
+    for node in tree.body:
+        if isinstance(node, ast.If) and isinstance(node.test, ast.Compare):
+            names = [node.test.left, *node.test.comparators]
+            if any(isinstance(n, ast.Name) and n.id == "__name__" for n in names) and \
+               any(isinstance(n, ast.Constant) and n.value == "__main__" for n in names):
+                return True
+    return False
+
+class CryptoContext:
+    """
+    Contexto de cifrado de la sesión: el objeto Fernet se construye una sola
+    vez a partir de la clave derivada y se reutiliza en todas las operaciones.
+
+    Con workers > 1 los lotes grandes se dividen en bloques y se procesan en
+    un pool de procesos (o de hilos con use_processes=False). El pool se crea
+    con el primer lote grande y se reutiliza hasta close(); los procesos se
+    inician con "spawn" (no se duplica con fork un proceso con hilos, como la
+    interfaz). El orden de los resultados y el formato de los errores son los
+    mismos que en serie.
+
+    "spawn" importa de nuevo el script principal en cada worker, así que el
+    script que use el pool de procesos debe tener su código dentro de
+    `if __name__ == "__main__":` (como main.py). Si no lo tiene, el pool se
+    crea con hilos en lugar de procesos.
+    """
+
+    def __init__(self, fernet_key: bytes, workers: int = 1, use_processes: bool = True):
+        self.fernet_key = fernet_key
+        self.workers = max(1, workers or 1)
+        self.use_processes = use_processes
+        self._pool: Optional[Executor] = None
+        self._pool_lock = threading.Lock()
+        self._cipher = Fernet(fernet_key)
+        self._fingerprint_key = derive_fingerprint_key(fernet_key)
+        # Identifica la clave con la que se calculó una huella guardada
+        self.fingerprint_tag = hmac.new(self._fingerprint_key, b"tag", hashlib.sha256).hexdigest()[:8]
+
+    @classmethod
+    def of(cls, key_or_context: Union[bytes, "CryptoContext"]) -> "CryptoContext":
+        """Acepta una clave Fernet o un contexto ya construido."""
+        if isinstance(key_or_context, cls):
+            return key_or_context
+        return cls(key_or_context)
+
+    def encrypt(self, data: str) -> str:
+        """Cifra una cadena y retorna el token (base64)."""
+        return self._cipher.encrypt(data.encode('utf-8')).decode('utf-8')
+
+    def decrypt(self, encrypted_data: str) -> str:
+        """Descifra un token y retorna la cadena original."""
+        return self._cipher.decrypt(encrypted_data.encode('utf-8')).decode('utf-8')
+
+    def fingerprint(self, password: str) -> str:
+        """
+        Huella HMAC de una contraseña con la clave de la sesión: dos huellas
+        coinciden solo si las contraseñas son iguales, y sin la clave no se
+        puede comprobar una contraseña contra ella.
+        """
+        digest = hmac.new(self._fingerprint_key, password.encode('utf-8'), hashlib.sha256).hexdigest()
+        return f"{self.fingerprint_tag}:{digest[:FINGERPRINT_BYTES * 2]}"
+
+    def is_current_fingerprint(self, fingerprint: Optional[str]) -> bool:
+        """Indica si la huella se calculó con la clave de esta sesión."""
+        return bool(fingerprint) and fingerprint.startswith(self.fingerprint_tag + ":")
+
+    def close(self):
+        """Cierra el pool de workers, si se llegó a crear."""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+    def _executor(self) -> Executor:
+        """Pool de la sesión; se crea la primera vez que se necesita."""
+        with self._pool_lock:
+            if self._pool is None:
+                if self.use_processes and not _main_module_is_guarded():
+                    print("ℹ️ El script principal no tiene `if __name__ == \"__main__\":`; "
+                          "el cifrado en paralelo usa hilos.")
+                    self.use_processes = False
+                if self.use_processes:
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+                else:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def encrypt_many(self, values: Iterable[str]) -> Tuple[List[Optional[str]], List[CryptoItemError]]:
+        """
+        Cifra un lote de cadenas. Retorna (resultados, errores): los resultados
+        conservan el orden de entrada, con None en las posiciones que fallaron.
+        """
+        return self._run_batch("encrypt", values)
+
+    def decrypt_many(self, values: Iterable[str]) -> Tuple[List[Optional[str]], List[CryptoItemError]]:
+        """Descifra un lote de tokens; mismo formato de retorno que encrypt_many."""
+        return self._run_batch("decrypt", values)
+
+    def _run_batch(self, operation: str, values: Iterable[str]) -> Tuple[List[Optional[str]], List[CryptoItemError]]:
+        """Elige entre la ruta serie y la paralela según el tamaño del lote."""
+        values = list(values)
+        if self.workers <= 1 or len(values) < PARALLEL_MIN_ITEMS:
+            return self._apply_many(getattr(self, operation), values)
+
+        chunk_size = max(PARALLEL_MIN_CHUNK, -(-len(values) // (self.workers * 4)))
+        chunks = [values[i:i + chunk_size] for i in range(0, len(values), chunk_size)]
+
+        pool = self._executor()
+        if self.use_processes:
+            try:
+                parts = list(pool.map(_run_chunk, repeat(self.fernet_key),
+                                      repeat(operation), chunks))
+            except BrokenProcessPool:
+                # Un worker murió: se descarta el pool y el lote se hace en serie
+                print("⚠️ El pool de cifrado dejó de responder; se continúa en serie.")
+                self.close()
+                return self._apply_many(getattr(self, operation), values)
+        else:
+            parts = list(pool.map(
+                lambda chunk: self._apply_many(getattr(self, operation), chunk), chunks))
+
+        # map() conserva el orden de los bloques; solo hay que desplazar los índices
+        results: List[Optional[str]] = []
+        errors: List[CryptoItemError] = []
+        for chunk_index, (chunk_results, chunk_errors) in enumerate(parts):
+            offset = chunk_index * chunk_size
+            results.extend(chunk_results)
+            errors.extend(CryptoItemError(offset + e.index, e.error) for e in chunk_errors)
+        return results, errors
+
+    @staticmethod
+    def _apply_many(operation, values: Iterable[str]) -> Tuple[List[Optional[str]], List[CryptoItemError]]:
+        results: List[Optional[str]] = []
+        errors: List[CryptoItemError] = []
+        for index, value in enumerate(values):
+            try:
+                results.append(operation(value))
+            except Exception as e:
+                results.append(None)
+                errors.append(CryptoItemError(index, e))
+        return results, errors
+
 # --- Generación de Contraseñas Fuertes
 def generate_strong_password(length: int = 12,
                              use_uppercase: bool = True,
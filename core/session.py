@@ -1,27 +1,207 @@
 # core/session.py
+import secrets
+import threading
+from base64 import urlsafe_b64encode
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
 from Modelo.models import AdminUser
 
+# Tiempo sin actividad tras el bloqueo en el que se puede desbloquear sin
+# volver a derivar la clave (después se borra y hace falta el login completo)
+QUICK_UNLOCK_TIMEOUT = timedelta(minutes=5)
+# Intentos fallidos de desbloqueo rápido antes de descartarlo
+QUICK_UNLOCK_MAX_ATTEMPTS = 3
+# scrypt de la clave de envoltura: ~40 ms y 16 MiB por intento (la
+# derivación de la clave de la bóveda está calibrada a ~0,5 s)
+QUICK_UNLOCK_SCRYPT_N = 2 ** 14
+QUICK_UNLOCK_SCRYPT_R = 8
+QUICK_UNLOCK_SCRYPT_P = 1
+
+def _zeroize(buffer: Optional[bytearray]):
+    """Sobrescribe con ceros un secreto guardado en un bytearray."""
+    if buffer is not None:
+        buffer[:] = bytes(len(buffer))
+
 class SessionManager:
-    def __init__(self):
+    """
+    Sesión del administrador con desbloqueo rápido: al bloquear (lock) la
+    clave Fernet se guarda en memoria cifrada con una clave de envoltura que
+    sale de un scrypt pequeño de usuario y contraseña con una sal aleatoria
+    de la sesión. Desbloquear dentro de QUICK_UNLOCK_TIMEOUT cuesta ~40 ms,
+    en lugar de bcrypt y la derivación calibrada de la clave de la bóveda.
+
+    Contrapartida: la sal y la clave envuelta están en el mismo proceso, así
+    que con un volcado de memoria tomado durante el bloqueo se pueden probar
+    contraseñas contra la clave envuelta al coste de este scrypt, menor que
+    el de la derivación calibrada (pero con memoria, no un HMAC). Quien no
+    acepte ese riesgo puede desactivarlo iniciando la sesión sin
+    master_password: el bloqueo exige entonces el login completo.
+
+    end_session es el cierre completo: borra la clave y los secretos del
+    desbloqueo rápido. Los bytearray se sobrescriben con ceros; las copias en
+    objetos inmutables (bytes) solo se sueltan.
+    """
+
+    def __init__(self, quick_unlock_timeout: timedelta = QUICK_UNLOCK_TIMEOUT):
         self.current_user: Optional[AdminUser] = None
         self.fernet_key: Optional[bytes] = None
         self.session_start: Optional[datetime] = None
         self.session_timeout: timedelta = timedelta(minutes=30)
-        
-    def start_session(self, user: AdminUser, fernet_key: bytes):
-        self.current_user = user
-        self.fernet_key = fernet_key
-        self.session_start = datetime.now()
-        
+        self.quick_unlock_timeout = quick_unlock_timeout
+
+        self._lock = threading.Lock()
+        # Sal aleatoria de la sesión y clave de envoltura (mientras está abierta)
+        self._unlock_salt: Optional[bytes] = None
+        self._unlock_key: Optional[bytearray] = None
+        # Estado del bloqueo: usuario, clave envuelta, hora e intentos fallidos
+        self._locked_user: Optional[AdminUser] = None
+        self._wrapped_key: Optional[bytes] = None
+        self.locked_at: Optional[datetime] = None
+        self._failed_attempts = 0
+        self._expiry_timer: Optional[threading.Timer] = None
+
+    def start_session(self, user: AdminUser, fernet_key: bytes, master_password: Optional[str] = None):
+        """
+        Inicia la sesión. Con master_password se prepara el desbloqueo rápido
+        (la contraseña no se guarda, solo la clave de envoltura derivada).
+        """
+        with self._lock:
+            self._discard_quick_unlock()
+            self.current_user = user
+            self.fernet_key = fernet_key
+            self.session_start = datetime.now()
+            if master_password is not None:
+                self._unlock_salt = secrets.token_bytes(16)
+                self._unlock_key = self._derive_unlock_key(user.username, master_password)
+
     def is_session_valid(self) -> bool:
         if not self.session_start:
             return False
         return datetime.now() - self.session_start < self.session_timeout
-        
-    def end_session(self):
+
+    @property
+    def is_locked(self) -> bool:
+        return self._wrapped_key is not None
+
+    def _derive_unlock_key(self, username: str, password: str) -> bytearray:
+        message = username.encode('utf-8') + b"\x00" + password.encode('utf-8')
+        kdf = Scrypt(salt=self._unlock_salt, length=32, n=QUICK_UNLOCK_SCRYPT_N,
+                     r=QUICK_UNLOCK_SCRYPT_R, p=QUICK_UNLOCK_SCRYPT_P)
+        return bytearray(kdf.derive(message))
+
+    @staticmethod
+    def _cipher(unlock_key: bytearray) -> Fernet:
+        return Fernet(urlsafe_b64encode(bytes(unlock_key)))
+
+    def lock(self) -> bool:
+        """
+        Bloquea la sesión conservando la clave envuelta para el desbloqueo
+        rápido. Retorna False si no estaba preparado (hará falta el login
+        completo); en ese caso la sesión se cierra igualmente.
+        """
+        with self._lock:
+            if self.fernet_key is None or self._unlock_key is None:
+                self._end_session()
+                return False
+            self._wrapped_key = self._cipher(self._unlock_key).encrypt(self.fernet_key)
+            self._locked_user = self.current_user
+            _zeroize(self._unlock_key)
+            self._unlock_key = None
+            self.current_user = None
+            self.fernet_key = None
+            self.session_start = None
+            self.locked_at = datetime.now()
+            self._failed_attempts = 0
+
+            # Pasado el tiempo de inactividad se borra aunque nadie lo intente
+            self._expiry_timer = threading.Timer(self.quick_unlock_timeout.total_seconds(), self._expire)
+            self._expiry_timer.daemon = True
+            self._expiry_timer.start()
+            return True
+
+    def can_quick_unlock(self) -> bool:
+        """Indica si hay una sesión bloqueada que aún se puede desbloquear."""
+        with self._lock:
+            if self._wrapped_key is None:
+                return False
+            if datetime.now() - self.locked_at >= self.quick_unlock_timeout:
+                self._discard_quick_unlock()
+                return False
+            return True
+
+    @property
+    def locked_username(self) -> Optional[str]:
+        user = self._locked_user
+        return user.username if user is not None and self._wrapped_key is not None else None
+
+    def quick_unlock(self, username: str, password: str) -> Optional[Tuple[AdminUser, bytes]]:
+        """
+        Desbloquea la sesión bloqueada con las credenciales del administrador.
+        Retorna (usuario, clave Fernet) o None si no coinciden o el desbloqueo
+        rápido ya no está disponible (expiró o se agotaron los intentos).
+        """
+        with self._lock:
+            if self._wrapped_key is None:
+                return None
+            if datetime.now() - self.locked_at >= self.quick_unlock_timeout:
+                self._discard_quick_unlock()
+                return None
+
+            unlock_key = self._derive_unlock_key(username, password)
+            try:
+                fernet_key = self._cipher(unlock_key).decrypt(self._wrapped_key)
+            except InvalidToken:
+                _zeroize(unlock_key)
+                self._failed_attempts += 1
+                if self._failed_attempts >= QUICK_UNLOCK_MAX_ATTEMPTS:
+                    print("⚠️ Demasiados intentos fallidos: se requiere el login completo.")
+                    self._discard_quick_unlock()
+                return None
+
+            user = self._locked_user
+            self._cancel_expiry()
+            self._wrapped_key = None
+            self._locked_user = None
+            self.locked_at = None
+            # La misma clave de envoltura sirve para el próximo bloqueo
+            self._unlock_key = unlock_key
+            self.current_user = user
+            self.fernet_key = fernet_key
+            self.session_start = datetime.now()
+            return user, fernet_key
+
+    def _cancel_expiry(self):
+        if self._expiry_timer is not None:
+            self._expiry_timer.cancel()
+            self._expiry_timer = None
+
+    def _expire(self):
+        with self._lock:
+            self._expiry_timer = None
+            if self._wrapped_key is not None:
+                self._discard_quick_unlock()
+
+    def _discard_quick_unlock(self):
+        """Borra la clave envuelta y los secretos del desbloqueo rápido."""
+        self._cancel_expiry()
+        _zeroize(self._unlock_key)
+        self._unlock_key = None
+        self._unlock_salt = None
+        self._wrapped_key = None
+        self._locked_user = None
+        self.locked_at = None
+        self._failed_attempts = 0
+
+    def _end_session(self):
+        self._discard_quick_unlock()
         self.current_user = None
         self.fernet_key = None
-        self.session_start = None
\ No newline at end of file
+        self.session_start = None
+
+    def end_session(self):
+        """Cierre completo: descarta la sesión y el desbloqueo rápido."""
+        with self._lock:
+            self._end_session()
\ No newline at end of file
@@ -5,18 +5,30 @@ import os
 # Agregar el directorio raíz al path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+import gc
+
 from Vista.login import start_login
 from Vista.home import start_home
+from core.session import SessionManager
+
+def run_session(session_manager: SessionManager) -> bool:
+    """
+    Login y ventana principal de una sesión. Retorna True si la sesión se
+    bloqueó (hay que volver al login) y False si se cerró la aplicación.
+    """
+    credentials = start_login(session_manager)
+    if credentials is None:
+        return False
+    admin_user, fernet_key = credentials
+    return start_home(admin_user, fernet_key, session_manager)
 
 def main():
     """Función principal que inicia la aplicación"""
-    # Callback que se ejecuta cuando el login es exitoso
-    def on_login_success(admin_user, fernet_key):
-        # Iniciar la ventana principal
-        start_home(admin_user, fernet_key)
-    
-    # Iniciar con la ventana de login
-    start_login(on_login_success)
+    session_manager = SessionManager()
+    # Cada sesión corre en su propia llamada: mientras está bloqueada, la
+    # ventana principal, el gestor de cuentas y la clave ya no están en la pila
+    while run_session(session_manager):
+        gc.collect()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
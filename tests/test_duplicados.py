@@ -0,0 +1,104 @@
+# tests/test_duplicados.py
+"""
+Bóvedas con plataformas repetidas (que solo difieren en mayúsculas): las
+cuentas se pueden renombrar o eliminar una a una.
+"""
+import os
+import sys
+import shutil
+import tempfile
+
+# La carpeta de datos se fija al importar core: se apunta a una temporal
+os.environ["APPDATA"] = tempfile.mkdtemp()
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from cryptography.fernet import Fernet
+
+from core.account_manager import AccountManager, DuplicatePlatformError
+from core.almacenamiento import RUTA_DBWROSER, flush
+from core.registros import AccountRecord
+from Modelo.models import Account
+
+STORAGES = [("json", {}), ("json", {"journaled": True}), ("sqlite", {}), ("sharded", {})]
+
+@pytest.fixture(autouse=True)
+def empty_data_dir():
+    flush()
+    shutil.rmtree(RUTA_DBWROSER, ignore_errors=True)
+    RUTA_DBWROSER.mkdir()
+    yield
+    flush()
+
+def _vault_with_duplicates(storage: str, options: dict) -> bytes:
+    """Guarda una bóveda con 'Gmail' y 'gmail' y retorna su clave"""
+    fernet_key = Fernet.generate_key()
+    manager = AccountManager(fernet_key, storage=storage, **options)
+    records = [AccountRecord.from_account(Account(platform=platform, email_or_username=user,
+                                                  password=password, category="correo"))
+               for platform, user, password in (("Gmail", "ana", "pw-ana"),
+                                                ("gmail", "luis", "pw-luis"),
+                                                ("Steam", "ana", "pw-steam"))]
+    manager.backend.save_all(records)
+    manager.flush()
+    return fernet_key
+
+def _reload(fernet_key: bytes, storage: str, options: dict) -> AccountManager:
+    return AccountManager(fernet_key, storage=storage, **options)
+
+@pytest.mark.parametrize("storage, options", STORAGES)
+def test_duplicates_block_platform_operations(storage, options):
+    manager = _reload(_vault_with_duplicates(storage, options), storage, options)
+    assert list(manager.find_duplicate_platforms()) == ["Gmail"]
+    with pytest.raises(DuplicatePlatformError):
+        manager.update_account("gmail", notes="x")
+    with pytest.raises(DuplicatePlatformError):
+        manager.delete_account("GMAIL")
+
+@pytest.mark.parametrize("storage, options", STORAGES)
+def test_rename_duplicate(storage, options):
+    fernet_key = _vault_with_duplicates(storage, options)
+    manager = _reload(fernet_key, storage, options)
+    position = [account.email_or_username for account in
+                manager.get_accounts_by_platform("gmail")].index("luis")
+
+    with pytest.raises(DuplicatePlatformError):
+        manager.rename_duplicate("gmail", position, "steam")
+    assert manager.rename_duplicate("gmail", position, "Gmail (luis)")
+    assert not manager.rename_duplicate("gmail", 5, "otro")
+    manager.flush()
+
+    manager = _reload(fernet_key, storage, options)
+    assert manager.find_duplicate_platforms() == {}
+    assert manager.get_account_by_platform("gmail").email_or_username == "ana"
+    assert manager.get_account_by_platform("Gmail (luis)").password == "pw-luis"
+    # Ya se puede editar y eliminar por plataforma
+    assert manager.update_account("gmail", notes="principal")
+    assert manager.delete_account("Gmail (luis)")
+    manager.flush()
+
+    manager = _reload(fernet_key, storage, options)
+    assert sorted(account.platform for account in manager.get_all_accounts()) == ["Gmail", "Steam"]
+    assert manager.get_account_by_platform("gmail").notes == "principal"
+
+@pytest.mark.parametrize("storage, options", STORAGES)
+def test_delete_duplicate(storage, options):
+    fernet_key = _vault_with_duplicates(storage, options)
+    manager = _reload(fernet_key, storage, options)
+    position = [account.email_or_username for account in
+                manager.get_accounts_by_platform("Gmail")].index("ana")
+
+    assert manager.delete_duplicate("Gmail", position)
+    manager.flush()
+
+    manager = _reload(fernet_key, storage, options)
+    assert manager.find_duplicate_platforms() == {}
+    accounts = manager.get_accounts_by_platform("gmail")
+    assert [(account.email_or_username, account.password) for account in accounts] == [("luis", "pw-luis")]
+    assert manager.get_account_by_platform("Steam").password == "pw-steam"
+
+def test_resolve_duplicate_rejected_inside_transaction():
+    manager = _reload(_vault_with_duplicates("json", {}), "json", {})
+    with pytest.raises(RuntimeError):
+        with manager.transaction():
+            manager.delete_duplicate("gmail", 0)
\ No newline at end of file